@@ -1,14 +1,25 @@
 import streamlit as st
 import json
+import sys
 from pathlib import Path
+
+# h5p_common lives at the repository root; set up here, once, before anything imports it
+_REPO_ROOT = str(Path(__file__).resolve().parent.parent)
+if _REPO_ROOT not in sys.path:
+    sys.path.append(_REPO_ROOT)
+
 import booklet_generator_iframe as booklet_generator
 import utils_booklet_iframe as utils_booklet
+from h5p_common import metrics
 
 # Setup
 PROJECT_ROOT = Path(__file__).parent
 TEMPLATES_DIR = PROJECT_ROOT / "templates"
 TEMPLATE_ZIP_PATH = TEMPLATES_DIR / "template.zip"
 
+# Prometheus metrics, when H5P_METRICS_PORT or H5P_METRICS_TEXTFILE is set (see h5p_common/metrics.py)
+metrics.enable_from_env()
+
 st.set_page_config(page_title="H5P Generator (Annual Review)", page_icon="📚", layout="wide")
 
 def main():
@@ -168,18 +179,18 @@ def main():
                     mentimeter_urls=(menti_url_6, menti_url_7)
                 )
                 
-                # Convert to string (ensuring ss replacement happened in generator)
-                content_json_str = json.dumps(content_structure, ensure_ascii=False, indent=None)
+                # Serialise to compact bytes (replaces 'ß' with 'ss' while serialising)
+                content_json = utils_booklet.serialize_content_json(content_structure)
                 
                 # C. Generate H5P Definition (h5p.json)
                 full_book_title = f"Jahresrückblick SRF 2025 Teil {roman_number}"
                 h5p_json_dict = booklet_generator.generate_h5p_json_dict(full_book_title)
-                h5p_json_str = json.dumps(h5p_json_dict, ensure_ascii=False, indent=2)
+                h5p_json = utils_booklet.serialize_json(h5p_json_dict)
 
                 # D. Create ZIP Package
                 pkg_bytes = utils_booklet.create_h5p_package(
-                    content_json_str, 
-                    h5p_json_str, 
+                    content_json, 
+                    h5p_json, 
                     str(TEMPLATE_ZIP_PATH), 
                     extra_files_to_zip
                 )
@@ -1,10 +1,13 @@
 import uuid
-import zipfile
 import io
 import logging
 import json
 from pathlib import Path
-from PIL import Image  # Requires: pip install Pillow
+
+from h5p_common import ir, lazy, packaging, serialization, timing
+
+# Loaded once an image actually needs compressing
+Image = lazy.module("PIL.Image")  # Requires: pip install Pillow
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -29,6 +32,11 @@ def compress_image_if_needed(image_data_bytes: bytes, original_filename: str) ->
 
     logger.info(f"Compressing image {original_filename} (Current: {len(image_data_bytes)/1024:.2f} KB)...")
 
+    with timing.span("compress") as span:
+        span.bytes = len(image_data_bytes)
+        return _compress_image(image_data_bytes, original_filename)
+
+def _compress_image(image_data_bytes: bytes, original_filename: str) -> bytes:
     try:
         # Load image from bytes
         img = Image.open(io.BytesIO(image_data_bytes))
@@ -83,19 +91,17 @@ def compress_image_if_needed(image_data_bytes: bytes, original_filename: str) ->
         return image_data_bytes
 
 # --- Text Processing ---
-def recursive_replace_ss(data):
+def serialize_json(data, pretty: bool = False) -> bytes:
+    """UTF-8 JSON bytes for content.json/h5p.json, compact unless pretty (see h5p_common/serialization.py)."""
+    return serialization.dumps(data, pretty=pretty)
+
+def serialize_content_json(content_structure: dict, pretty: bool = False) -> bytes:
     """
-    Recursively traverses a dictionary or list.
-    If a string is found, replaces 'ß' with 'ss'.
+    Serialises content.json and replaces German 'ß' with 'ss' in the same step.
+    'ß' is never part of JSON syntax and is not escaped in the output,
+    so one replace on the encoded bytes covers every string without copying the tree.
     """
-    if isinstance(data, str):
-        return data.replace("ß", "ss")
-    elif isinstance(data, dict):
-        return {k: recursive_replace_ss(v) for k, v in data.items()}
-    elif isinstance(data, list):
-        return [recursive_replace_ss(i) for i in data]
-    else:
-        return data
+    return serialize_json(content_structure, pretty).replace("ß".encode('utf-8'), b"ss")
 
 # --- H5P Mapping Utils ---
 def parse_copyright_info(copyright_input):
@@ -130,10 +136,19 @@ def parse_copyright_info(copyright_input):
 def create_image_param(image_path_or_data):
     """
     Standardizes image parameter generation.
+    Accepts a path, a {"path", "mime", "copyright"} dict or a parsed ir.Image.
     """
     if not image_path_or_data:
         return None
 
+    if isinstance(image_path_or_data, ir.Image):
+        return {
+            "path": image_path_or_data.path,
+            "mime": image_path_or_data.mime,
+            "copyright": parse_copyright_info(image_path_or_data.copyright),
+            "width": 50, "height": 50
+        }
+
     # Default values
     path = ""
     mime = "image/png"
@@ -159,41 +174,39 @@ def create_image_param(image_path_or_data):
         "width": 50, "height": 50
     }
 
-def map_drag_text_to_h5p(task_data):
-    full_text = task_data.get("text_content", "")
-    distractors = task_data.get("distractors", "")
+def map_drag_text_to_h5p(task: ir.ClozeTask):
     return {
         "library": "H5P.DragText 1.10",
         "subContentId": generate_uuid(),
-        "metadata": {"contentType": "Drag the Words", "license": "U", "title": task_data.get("description", "Cloze")},
+        "metadata": {"contentType": "Drag the Words", "license": "U", "title": task.title},
         "params": {
-            "taskDescription": f"<p>{task_data.get('description', '')}</p>",
-            "textField": full_text,
-            "distractors": distractors,
+            "taskDescription": f"<p>{task.description}</p>",
+            "textField": task.text,
+            "distractors": task.distractors,
             "behaviour": {"enableRetry": True, "enableSolutionsButton": False, "enableCheckButton": True, "instantFeedback": False},
             "checkAnswer": "Überprüfen", "submitAnswer": "Absenden", "tryAgain": "Wiederholen", "showSolution": "Lösung anzeigen",
             "scoreBarLabel": "Du hast :num von :total Punkten erreicht."
         }
     }
 
-def map_questions_to_h5p_array(questions_in):
+def map_questions_to_h5p_array(questions_in: list):
+    """Maps parsed ir.Question objects to H5P question objects."""
     out = []
     for q in questions_in:
-        q_type = q.get("type")
-        if q_type == "multichoice":
+        if q.kind == "multichoice":
             out.append(map_mc_question(q))
-        elif q_type == "truefalse":
+        elif q.kind == "truefalse":
             out.append(map_tf_question(q))
     return out
 
-def map_mc_question(q):
+def map_mc_question(q: ir.Question):
     answers = []
-    for a in q.get("answers", []):
+    for a in q.answers:
         answers.append({
-            "text": a.get("text"),
-            "correct": a.get("correct"),
+            "text": a.text,
+            "correct": a.correct,
             "tipsAndFeedback": {
-                "chosenFeedback": f"<div>{a.get('feedback','')}</div>",
+                "chosenFeedback": f"<div>{a.feedback}</div>",
                 "notChosenFeedback": ""
             }
         })
@@ -202,7 +215,7 @@ def map_mc_question(q):
         "subContentId": generate_uuid(),
         "metadata": {"contentType": "Multiple Choice", "license": "U", "title": "MC"},
         "params": {
-            "question": f"<p>{q.get('question')}</p>",
+            "question": f"<p>{q.text}</p>",
             "answers": answers,
             "behaviour": {"singleAnswer": True, "enableRetry": False, "enableCheckButton": True},
             "UI": {
@@ -212,61 +225,43 @@ def map_mc_question(q):
         }
     }
 
-def map_tf_question(q):
+def map_tf_question(q: ir.Question):
     return {
         "library": "H5P.TrueFalse 1.8",
         "subContentId": generate_uuid(),
         "metadata": {"contentType": "True/False", "license": "U", "title": "TF"},
         "params": {
-            "question": f"<p>{q.get('question')}</p>",
-            "correct": "true" if q.get("correct") else "false",
+            "question": f"<p>{q.text}</p>",
+            "correct": "true" if q.correct else "false",
             "behaviour": {
-                "feedbackOnCorrect": q.get("feedback_correct", ""),
-                "feedbackOnWrong": q.get("feedback_wrong", "")
+                "feedbackOnCorrect": q.feedback_correct,
+                "feedbackOnWrong": q.feedback_wrong
             },
             "l10n": {"trueText": "Wahr", "falseText": "Falsch"}
         }
     }
 
 # --- Packaging ---
-def create_h5p_package(content_json_str: str, h5p_json_str: str, template_zip_path: str, extra_files: list = None):
+def create_h5p_package(content_json_str: str | bytes, h5p_json_str: str | bytes, template_zip_path: str, extra_files: list = None,
+                       prune_libraries: bool = False, keep_editor_libraries: bool = True,
+                       use_base_package: bool = True, reproducible: bool = False):
     """
     extra_files: list of tuples/dicts -> [{"filename": "images/title.png", "data": bytes_obj}, ...]
+    Byte-identical media files are stored once and content.json paths point to that copy.
+    prune_libraries: only ship template libraries the book needs (opt-in).
+    keep_editor_libraries: when pruning, keep their editor libraries too. The H5P importer
+    checks editorDependencies, so turning this off can make the import fail on an LMS without them.
+    use_base_package: append the book to the precompiled template base (compiled on first use).
+    reproducible: fixed timestamps and entry order, so identical input gives identical bytes.
     """
     if extra_files is None: extra_files = []
     
     try:
-        with open(template_zip_path, 'rb') as f_template:
-            template_bytes = f_template.read()
-        
-        in_memory_zip = io.BytesIO()
-        
-        with zipfile.ZipFile(in_memory_zip, 'w', zipfile.ZIP_DEFLATED) as new_zip:
-            # 1. Copy template files (excluding content.json and h5p.json)
-            with zipfile.ZipFile(io.BytesIO(template_bytes), 'r') as template_zip_obj:
-                for item in template_zip_obj.infolist():
-                    if item.filename.lower() in ['content/content.json', 'h5p.json']:
-                        continue
-                    new_zip.writestr(item, template_zip_obj.read(item.filename))
-            
-            # 2. Write new JSONs
-            new_zip.writestr('content/content.json', content_json_str.encode('utf-8'))
-            new_zip.writestr('h5p.json', h5p_json_str.encode('utf-8'))
-
-            # 3. Write extra files (images)
-            for file_info in extra_files:
-                filename = file_info["filename"]
-                data = file_info["data"]
-                # Ensure it sits in content/ folder if not specified
-                if not filename.startswith("content/"):
-                    target_path = f"content/{filename}"
-                else:
-                    target_path = filename
-                
-                new_zip.writestr(target_path, data)
-
-        in_memory_zip.seek(0)
-        return in_memory_zip.getvalue()
+        # Ensure it sits in content/ folder if not specified (handled by packaging)
+        files = [(file_info["filename"], file_info["data"]) for file_info in extra_files]
+        return packaging.build_package(content_json_str, h5p_json_str, template_zip_path, files,
+                                       prune=prune_libraries, keep_editor_libraries=keep_editor_libraries,
+                                       use_base=use_base_package, reproducible=reproducible)
     except Exception as e:
         logger.error(f"Error zipping: {e}")
         return None
\ No newline at end of file
@@ -1,16 +1,19 @@
 import json
 import logging
 import utils_booklet_iframe as utils_booklet
+from h5p_common import ids, ir, render
+from h5p_common.serialization import Fragment
 
 # --- Constants & L10N ---
-DEFAULT_BEHAVIOUR = {
+# Serialised once and spliced into every content.json (see h5p_common/serialization.py)
+DEFAULT_BEHAVIOUR = Fragment({
     "baseColor": "#002f6c", 
     "defaultTableOfContents": False, 
     "progressIndicators": True,
     "progressAuto": True, 
     "displaySummary": True, 
     "enableRetry": True
-}
+})
 
 BOOK_L10N = {
     "read": "Öffnen", "displayTOC": "Inhaltsverzeichnis anzeigen", "hideTOC": "Inhaltsverzeichnis ausblenden",
@@ -61,6 +64,8 @@ def generate_h5p_json_dict(title: str):
     }
 
 # --- Content Generators ---
+# Each emitter renders one parsed chapter (see h5p_common/ir.py) and is registered for its type
+RENDERERS = render.Registry()
 
 def create_hardcoded_introduction(roman_number: str):
     intro_html = f"""<h2><strong>Willkommen zum Jahresrückblick 2025, Teil {roman_number}</strong></h2><p>Gemeinsam blicken wir zurück auf bewegende, spannende und teils tragische Ereignisse aus Politik, Gesellschaft und Kultur, die das Jahr 2025 geprägt haben.&nbsp;</p><h3>Lernziele</h3><p>Sie können …</p><ul><li><strong>zentrale Ereignisse des Jahres 2025 beschreiben</strong> und deren Bedeutung erklären.</li><li><strong>Zusammenhänge zwischen verschiedenen Entwicklungen erkennen</strong> und reflektieren.</li><li>eigene Meinungen zu den Geschehnissen formulieren und begründen.</li></ul><h3>Ablauf</h3><ol><li><strong>Memory-Spiel:</strong> Spielen Sie eine Runde Memory, in der Sie Gesichter und Beschreibungen von Personen, die das Jahr 2025 geprägt haben, zuordnen.</li><li><strong>SRF-Beitrag:</strong> Schauen Sie den SRF-Rückblick auf die Ereignisse des Jahres und beantworten Sie die Verständnisfragen.</li><li><strong>Reflexion:</strong> Nutzen Sie Mentimeter, um Ihre Gedanken zu den Geschehnissen zu teilen und mögliche Schlagzeilen für 2026 zu formulieren.</li></ol>"""
@@ -82,44 +87,22 @@ def create_hardcoded_introduction(roman_number: str):
         }
     }
 
-def create_memory_game(data):
-    raw_cards_list = data.get("cards", [])
+@RENDERERS.register(ir.MemoryGame)
+def create_memory_game(game: ir.MemoryGame):
     cards_h5p = []
-
-    for i in range(0, len(raw_cards_list), 2):
-        if i + 1 >= len(raw_cards_list):
-            break 
-
-        item_a = raw_cards_list[i].get("image", {})
-        item_b = raw_cards_list[i+1].get("image", {})
-
-        # --- Handle String vs Dict inputs ---
-        if isinstance(item_a, str):
-            image_alt = ""
-            description = ""
-        else:
-            image_alt = item_a.get("imageAlt", "")
-            description = item_a.get("description", "")
-
-        if isinstance(item_b, str):
-            match_alt = ""
-        else:
-            match_alt = item_b.get("matchAlt", "")
-        # ------------------------------------
-
-        pair = {
-            "image": utils_booklet.create_image_param(item_a),
-            "match": utils_booklet.create_image_param(item_b),
-            "imageAlt": image_alt,
-            "matchAlt": match_alt,
-            "description": description
-        }
-        cards_h5p.append(pair)
+    for pair in game.pairs:
+        cards_h5p.append({
+            "image": utils_booklet.create_image_param(pair.image),
+            "match": utils_booklet.create_image_param(pair.match),
+            "imageAlt": pair.image_alt,
+            "matchAlt": pair.match_alt,
+            "description": pair.description
+        })
 
     memory_content = {
         "subContentId": utils_booklet.generate_uuid(),
         "library": "H5P.MemoryGame 1.3",
-        "metadata": {"contentType": "Memory Game", "license": "U", "title": data.get("title", "Memory")},
+        "metadata": {"contentType": "Memory Game", "license": "U", "title": "Memory" if game.title is None else game.title},
         "params": {
             "cards": cards_h5p,
             "behaviour": {
@@ -128,8 +111,8 @@ def create_memory_game(data):
                 "numCardsToUse": 4  # <--- UPDATED: Limit to 4 cards
             },
             "lookNFeel": {
-                "themeColor": data.get("themeColor", "#002f6c"),
-                "cardBack": utils_booklet.create_image_param(data.get("card_back_image", "images/card_back.png"))
+                "themeColor": game.theme_color,
+                "cardBack": utils_booklet.create_image_param(game.card_back)
             },
             "l10n": {
                 "cardTurns": "Züge", "timeSpent": "Benötigte Zeit", "feedback": "Gut gemacht!",
@@ -146,7 +129,7 @@ def create_memory_game(data):
         "content": {
             "subContentId": utils_booklet.generate_uuid(),
             "library": "H5P.AdvancedText 1.1",
-            "params": {"text": f"<p><strong>{data.get('instruction', '')}</strong></p>"},
+            "params": {"text": f"<p><strong>{game.instruction}</strong></p>"},
             "metadata": {"contentType": "Text", "license": "U", "title": "Instruction"}
         }
     }
@@ -154,54 +137,70 @@ def create_memory_game(data):
     return {
         "subContentId": utils_booklet.generate_uuid(),
         "library": "H5P.Column 1.18",
-        "metadata": {"contentType": "Column", "license": "U", "title": data.get("title")},
+        "metadata": {"contentType": "Column", "license": "U", "title": game.title},
         "params": {"content": [instruction_text, {"useSeparator": "auto", "content": memory_content}]}
     }
 
-def create_accordion(accordion_data):
+def create_accordion(accordion: ir.Accordion):
     panels = []
-    for item in accordion_data:
+    for panel in accordion.panels:
         panels.append({
-            "title": item.get("title", ""),
+            "title": panel.title,
             "content": {
                 "subContentId": utils_booklet.generate_uuid(),
                 "library": "H5P.AdvancedText 1.1",
                 "metadata": {"contentType": "Text", "license": "U", "title": "Text"},
-                "params": {"text": item.get("text", "")}
+                "params": {"text": panel.text}
             }
         })
 
     return {
         "subContentId": utils_booklet.generate_uuid(),
         "library": "H5P.Accordion 1.0",
-        "metadata": {"contentType": "Accordion", "license": "U", "title": "Zusammenfassung"},
+        "metadata": {"contentType": "Accordion", "license": "U", "title": accordion.title},
         "params": {"panels": panels, "hTag": "h2"}
     }
 
-def create_video_page(data):
+def overlay_accordion(accordion: dict) -> dict:
+    """
+    Shallow clone of a rendered accordion with new subContentIds.
+    Only the dicts holding an id are copied; metadata and panel texts are shared with the original.
+    """
+    panels = [
+        {**panel, "content": {**panel["content"], "subContentId": utils_booklet.generate_uuid()}}
+        for panel in accordion["params"]["panels"]
+    ]
+    return {
+        **accordion,
+        "subContentId": utils_booklet.generate_uuid(),
+        "params": {**accordion["params"], "panels": panels}
+    }
+
+@RENDERERS.register(ir.VideoPage)
+def create_video_page(page: ir.VideoPage):
     title_text = {
         "useSeparator": "auto",
         "content": {
             "subContentId": utils_booklet.generate_uuid(),
             "library": "H5P.AdvancedText 1.1",
             "metadata": {"contentType": "Text", "license": "U", "title": "Title"},
-            "params": {"text": f"<h2>{data.get('title', '')}</h2>"}
+            "params": {"text": f"<h2>{page.title or ''}</h2>"}
         }
     }
 
-    vid_data = data.get("video", {})
+    video = page.video
     iframe_obj = {
         "useSeparator": "auto",
         "content": {
             "subContentId": utils_booklet.generate_uuid(),
             "library": "H5P.IFrameEmbed 1.0",
-            "metadata": {"contentType": "Iframe Embedder", "license": "U", "title": "Video"},
+            "metadata": {"contentType": "Iframe Embedder", "license": "U", "title": video.title},
             "params": {
-                "source": vid_data.get("url"),
-                "width": str(vid_data.get("width", 800)),
-                "height": str(vid_data.get("height", 400)),
+                "source": video.source,
+                "width": video.width,
+                "height": video.height,
                 "resizeSupported": True,
-                "minWidth": "300"
+                "minWidth": video.min_width
             }
         }
     }
@@ -212,30 +211,29 @@ def create_video_page(data):
             "subContentId": utils_booklet.generate_uuid(),
             "library": "H5P.AdvancedText 1.1",
             "metadata": {"contentType": "Text", "license": "U", "title": "Link"},
-            "params": {"text": f"<p>❗ Falls die Meldung 'Ihr Webbrowser wird nicht unterstützt' kommt, 👉 Seite neu laden löst meistens das Problem.</p><p>Link zum Video 👉 <a href='{vid_data.get('url')}' target='_blank'>SRF</a></p>"}
+            "params": {"text": f"<p>❗ Falls die Meldung 'Ihr Webbrowser wird nicht unterstützt' kommt, 👉 Seite neu laden löst meistens das Problem.</p><p>Link zum Video 👉 <a href='{video.source}' target='_blank'>SRF</a></p>"}
         }
     }
 
-    accordion_obj = create_accordion(data.get("summary_accordion", []))
+    accordion_obj = create_accordion(page.summary)
     accordion_wrapper = {"useSeparator": "auto", "content": accordion_obj}
 
     return {
         "subContentId": utils_booklet.generate_uuid(),
         "library": "H5P.Column 1.18",
-        "metadata": {"contentType": "Column", "license": "U", "title": data.get("title")},
+        "metadata": {"contentType": "Column", "license": "U", "title": page.title},
         "params": {"content": [title_text, iframe_obj, warning_text, accordion_wrapper]},
         "_reusable_accordion": accordion_obj
     }
 
-def create_question_set(data, is_drag_text=False, forced_pool_size=None):
-    intro_screen = data.get("intro_screen", {})
+@RENDERERS.register(ir.ClozeSet)
+def create_question_set(question_set: ir.QuestionSet | ir.ClozeSet, forced_pool_size=None):
+    is_drag_text = isinstance(question_set, ir.ClozeSet)
     
-    questions_h5p = []
     if is_drag_text:
-        for task in data.get("tasks", []):
-            questions_h5p.append(utils_booklet.map_drag_text_to_h5p(task))
+        questions_h5p = [utils_booklet.map_drag_text_to_h5p(task) for task in question_set.tasks]
     else:
-        questions_h5p = utils_booklet.map_questions_to_h5p_array(data.get("questions", []))
+        questions_h5p = utils_booklet.map_questions_to_h5p_array(question_set.questions)
 
     # --- POOL SIZE LOGIC ---
     # Default: Use all questions
@@ -250,9 +248,9 @@ def create_question_set(data, is_drag_text=False, forced_pool_size=None):
         "introPage": {
             "showIntroPage": True,
             "startButtonText": "Quiz starten",
-            "title": intro_screen.get("title", "Quiz"),
-            "introduction": f"<p style='text-align:center'>{intro_screen.get('text','')}</p>",
-            "backgroundImage": utils_booklet.create_image_param(intro_screen.get("background_image"))
+            "title": question_set.intro_title,
+            "introduction": f"<p style='text-align:center'>{question_set.intro_text}</p>",
+            "backgroundImage": utils_booklet.create_image_param(question_set.background_image)
         },
         "progressType": "dots" if is_drag_text else "textual",
         "passPercentage": 50,
@@ -272,36 +270,38 @@ def create_question_set(data, is_drag_text=False, forced_pool_size=None):
     qset_content = {
         "subContentId": utils_booklet.generate_uuid(),
         "library": "H5P.QuestionSet 1.20",
-        "metadata": {"contentType": "Question Set", "license": "U", "title": data.get("title")},
+        "metadata": {"contentType": "Question Set", "license": "U", "title": question_set.title},
         "params": qset_params
     }
 
     return {
         "subContentId": utils_booklet.generate_uuid(),
         "library": "H5P.Column 1.18",
-        "metadata": {"contentType": "Column", "license": "U", "title": data.get("title")},
+        "metadata": {"contentType": "Column", "license": "U", "title": question_set.title},
         "params": {"content": [{"useSeparator": "auto", "content": qset_content}]}
     }
 
-def create_iframe_page(data, reused_accordion=None):
+@RENDERERS.register(ir.QuestionSet)
+def create_quiz(question_set: ir.QuestionSet):
+    # --- FIX: Set forced_pool_size=5 for the Quiz ---
+    return create_question_set(question_set, forced_pool_size=5)
+
+def create_iframe_page(page: ir.IFramePage, reused_accordion=None):
     column_content = []
 
-    if data.get("top_text"):
+    if page.top_text:
         column_content.append({
             "useSeparator": "auto",
             "content": {
                 "subContentId": utils_booklet.generate_uuid(),
                 "library": "H5P.AdvancedText 1.1",
                 "metadata": {"contentType": "Text", "license": "U", "title": "Intro"},
-                "params": {"text": data.get("top_text")}
+                "params": {"text": page.top_text}
             }
         })
 
-    if data.get("include_accordion_ref") and reused_accordion:
-        import copy
-        acc_clone = copy.deepcopy(reused_accordion)
-        acc_clone["subContentId"] = utils_booklet.generate_uuid()
-        column_content.append({"useSeparator": "auto", "content": acc_clone})
+    if page.include_video_summary and reused_accordion:
+        column_content.append({"useSeparator": "auto", "content": overlay_accordion(reused_accordion)})
         
         column_content.append({
             "useSeparator": "auto",
@@ -309,23 +309,23 @@ def create_iframe_page(data, reused_accordion=None):
                 "subContentId": utils_booklet.generate_uuid(),
                 "library": "H5P.AdvancedText 1.1",
                 "metadata": {"contentType": "Text", "license": "U", "title": "Link"},
-                "params": {"text": f"<p><a href='{data.get('embed', {}).get('source')}' target='_blank'>Direkter Link</a></p>"}
+                "params": {"text": f"<p><a href='{page.embed.source}' target='_blank'>Direkter Link</a></p>"}
             }
         })
 
-    embed_data = data.get("embed", {})
+    embed = page.embed
     column_content.append({
         "useSeparator": "enabled",
         "content": {
             "subContentId": utils_booklet.generate_uuid(),
             "library": "H5P.IFrameEmbed 1.0",
-            "metadata": {"contentType": "Iframe Embedder", "license": "U", "title": data.get("title")},
+            "metadata": {"contentType": "Iframe Embedder", "license": "U", "title": embed.title},
             "params": {
-                "source": embed_data.get("source"),
-                "width": str(embed_data.get("width", "100%")),
-                "height": str(embed_data.get("height", "600")),
+                "source": embed.source,
+                "width": embed.width,
+                "height": embed.height,
                 "resizeSupported": True,
-                "minWidth": str(embed_data.get("minWidth", "300"))
+                "minWidth": embed.min_width
             }
         }
     })
@@ -333,7 +333,7 @@ def create_iframe_page(data, reused_accordion=None):
     return {
         "subContentId": utils_booklet.generate_uuid(),
         "library": "H5P.Column 1.18",
-        "metadata": {"contentType": "Column", "license": "U", "title": data.get("title")},
+        "metadata": {"contentType": "Column", "license": "U", "title": page.title},
         "params": {"content": column_content}
     }
 
@@ -341,51 +341,29 @@ def create_mentimeter_page(url: str, title: str, top_text: str = "", accordion:
     """
     Simpler helper to create steps 6 and 7 without full JSON
     """
-    data = {
-        "title": title,
-        "type": "iframe_page",
-        "top_text": top_text,
-        "embed": {
-            "source": url, 
-            "width": "800", 
-            "height": height,
-            "minWidth": min_width
-        },
-        "include_accordion_ref": True if accordion else False
-    }
-    return create_iframe_page(data, reused_accordion=accordion)
+    page = ir.IFramePage(
+        title,
+        ir.IFrameEmbed(url, "800", height, min_width, title),
+        top_text,
+        include_video_summary=bool(accordion)
+    )
+    return create_iframe_page(page, reused_accordion=accordion)
 
 
 def create_booklet_content_json_structure(user_input_list: list, roman_number: str, months_text: str, 
                                             cover_image_name: str = "images/title_2025.png",
-                                            mentimeter_urls: tuple = (None, None)) -> dict:
+                                            mentimeter_urls: tuple = (None, None),
+                                            id_namespace: str | None = None) -> dict:
     
     # 1. Start with Introduction
     chapters = [create_hardcoded_introduction(roman_number)]
     reusable_accordion = None
 
-    # 2. Process User Input List (Memory, Video, Questions, Cloze)
-    for chapter_data in user_input_list:
-        if not isinstance(chapter_data, dict):
-            logging.warning(f"Skipping invalid chapter data: {chapter_data}")
-            continue
-
-        c_type = chapter_data.get("type")
-        
-        if c_type == "memory_game":
-            chapters.append(create_memory_game(chapter_data))
-            
-        elif c_type == "video_page":
-            result = create_video_page(chapter_data)
-            reusable_accordion = result.pop("_reusable_accordion", None)
-            chapters.append(result)
-            
-        elif c_type == "question_set":
-            # --- FIX: Set forced_pool_size=5 for the Quiz ---
-            chapters.append(create_question_set(chapter_data, is_drag_text=False, forced_pool_size=5))
-            
-        elif c_type == "cloze_set":
-            chapters.append(create_question_set(chapter_data, is_drag_text=True))
+    # 2. Process User Input List (Memory, Video, Questions, Cloze), parsed by h5p_common.ir
+    for result in RENDERERS.render(ir.parse_chapter_list(user_input_list)):
+        # The video page hands its summary accordion on to the reflection page
+        reusable_accordion = result.pop("_reusable_accordion", reusable_accordion)
+        chapters.append(result)
 
     # 3. Add Steps 6 and 7 (Mentimeters)
     url_1, url_2 = mentimeter_urls
@@ -435,8 +413,9 @@ def create_booklet_content_json_structure(user_input_list: list, roman_number: s
         "behaviour": DEFAULT_BEHAVIOUR,
         **BOOK_L10N
     }
-    
-    # 5. Global text replacement for German 'ß' -> 'ss'
-    final_structure = utils_booklet.recursive_replace_ss(content_structure)
 
-    return final_structure
\ No newline at end of file
+    if id_namespace is not None:
+        ids.assign_deterministic_ids(content_structure, id_namespace)
+
+    # 5. German 'ß' -> 'ss' is applied by utils_booklet.serialize_content_json
+    return content_structure
\ No newline at end of file
@@ -2,22 +2,44 @@ import streamlit as st
 import json
 import tempfile
 import shutil
+import sys
 from pathlib import Path
 
+# h5p_common lives at the repository root; set up here, once, before anything imports it
+_REPO_ROOT = str(Path(__file__).resolve().parent.parent)
+if _REPO_ROOT not in sys.path:
+    sys.path.append(_REPO_ROOT)
+
 import booklet_generator_iframe as booklet_generator
 import utils_booklet_iframe as utils_booklet
 # NEU: Importiere den Generator
 import utils_image_gen 
+from h5p_common import metrics, resources
 
 # ... (Setup Code bleibt gleich) ...
 PROJECT_ROOT = Path(__file__).parent
 TEMPLATES_DIR = PROJECT_ROOT / "templates"
 TEMPLATE_ZIP_PATH = TEMPLATES_DIR / "template.zip"
 
+# Prometheus metrics, when H5P_METRICS_PORT or H5P_METRICS_TEXTFILE is set (see h5p_common/metrics.py)
+metrics.enable_from_env()
+
 st.set_page_config(page_title="H5P Generator (Annual Review)", page_icon="📚", layout="wide")
 
 def main():
     st.title("H5P Annual Review Generator")
+
+    # Cached templates and resources survive reruns (see h5p_common/resources.py)
+    if st.sidebar.button("🔄 Reload templates & caches"):
+        resources.clear_all()
+        st.sidebar.success("Caches cleared.")
+    # Opt-in: without a namespace every build gets random subContentIds (see h5p_common/ids.py)
+    id_namespace = st.sidebar.text_input(
+        "Stable ID namespace (optional)",
+        help="Derive subContentIds from this name instead of random UUIDs, so reruns reuse unchanged chapters. "
+             "Use a name unique to this book: books sharing a namespace share their ids, which mixes up "
+             "H5P user state and xAPI tracking."
+    ).strip() or None
     
     # --- NEW: Google Gem Link ---
     st.info("🤖 **Need help generating content?** Use this specialized Google Gem to create the JSONs: [**Click here to open Gem**](https://gemini.google.com/gem/f2f793ed47f4)")
@@ -206,11 +228,12 @@ def main():
                     roman_number=roman_number, 
                     months_text=months_text,
                     cover_image_name=cover_filename_param,
-                    mentimeter_urls=(menti_url_6, menti_url_7)
+                    mentimeter_urls=(menti_url_6, menti_url_7),
+                    id_namespace=id_namespace
                 )
                 
-                content_json = json.dumps(content_structure, ensure_ascii=False)
-                h5p_json = json.dumps(booklet_generator.generate_h5p_json_dict(f"Jahresrückblick {roman_number}"), ensure_ascii=False)
+                content_json = utils_booklet.serialize_content_json(content_structure)
+                h5p_json = utils_booklet.serialize_json(booklet_generator.generate_h5p_json_dict(f"Jahresrückblick {roman_number}"))
 
                 pkg_bytes = utils_booklet.create_h5p_package(
                     content_json, h5p_json, str(TEMPLATE_ZIP_PATH), extra_files_to_zip
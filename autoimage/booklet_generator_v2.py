@@ -1,16 +1,19 @@
 import json
 import logging
 import utils_booklet_iframe as utils_booklet
+from h5p_common import ids, ir, render
+from h5p_common.serialization import Fragment
 
 # --- Constants & L10N ---
-DEFAULT_BEHAVIOUR = {
+# Serialised once and spliced into every content.json (see h5p_common/serialization.py)
+DEFAULT_BEHAVIOUR = Fragment({
     "baseColor": "#002f6c", 
     "defaultTableOfContents": False, 
     "progressIndicators": True,
     "progressAuto": True, 
     "displaySummary": True, 
     "enableRetry": True
-}
+})
 
 BOOK_L10N = {
     "read": "Öffnen", "displayTOC": "Inhaltsverzeichnis anzeigen", "hideTOC": "Inhaltsverzeichnis ausblenden",
@@ -61,32 +64,29 @@ def generate_h5p_json_dict(title: str):
     }
 
 # --- Content Generators ---
+# Each emitter renders one parsed chapter (see h5p_common/ir.py) and is registered for its type
+RENDERERS = render.Registry()
 
-def create_custom_introduction(intro_data: dict):
+@RENDERERS.register(ir.Introduction)
+def create_custom_introduction(intro: ir.Introduction):
     """
     Create a customized introduction based on AI-generated content
-    
-    intro_data should contain:
-    - title: str
-    - welcome_text: str
-    - learning_objectives: list[str]
-    - workflow: list[str]
     """
     
     # Build learning objectives HTML
     objectives_html = "<ul>"
-    for obj in intro_data.get("learning_objectives", []):
+    for obj in intro.objectives:
         objectives_html += f"<li>{obj}</li>"
     objectives_html += "</ul>"
     
     # Build workflow HTML
     workflow_html = "<ol>"
-    for step in intro_data.get("workflow", []):
+    for step in intro.workflow:
         workflow_html += f"<li>{step}</li>"
     workflow_html += "</ol>"
     
-    intro_html = f"""<h2><strong>{intro_data.get('title', 'Willkommen')}</strong></h2>
-<p>{intro_data.get('welcome_text', '')}</p>
+    intro_html = f"""<h2><strong>{intro.title}</strong></h2>
+<p>{intro.welcome_text}</p>
 <h3>Lernziele</h3>
 {objectives_html}
 <h3>Ablauf</h3>
@@ -109,44 +109,22 @@ def create_custom_introduction(intro_data: dict):
         }
     }
 
-def create_memory_game(data):
-    raw_cards_list = data.get("cards", [])
+@RENDERERS.register(ir.MemoryGame)
+def create_memory_game(game: ir.MemoryGame):
     cards_h5p = []
-
-    for i in range(0, len(raw_cards_list), 2):
-        if i + 1 >= len(raw_cards_list):
-            break 
-
-        item_a = raw_cards_list[i].get("image", {})
-        item_b = raw_cards_list[i+1].get("image", {})
-
-        # --- Handle String vs Dict inputs ---
-        if isinstance(item_a, str):
-            image_alt = ""
-            description = ""
-        else:
-            image_alt = item_a.get("imageAlt", "")
-            description = item_a.get("description", "")
-
-        if isinstance(item_b, str):
-            match_alt = ""
-        else:
-            match_alt = item_b.get("matchAlt", "")
-        # ------------------------------------
-
-        pair = {
-            "image": utils_booklet.create_image_param(item_a),
-            "match": utils_booklet.create_image_param(item_b),
-            "imageAlt": image_alt,
-            "matchAlt": match_alt,
-            "description": description
-        }
-        cards_h5p.append(pair)
+    for pair in game.pairs:
+        cards_h5p.append({
+            "image": utils_booklet.create_image_param(pair.image),
+            "match": utils_booklet.create_image_param(pair.match),
+            "imageAlt": pair.image_alt,
+            "matchAlt": pair.match_alt,
+            "description": pair.description
+        })
 
     memory_content = {
         "subContentId": utils_booklet.generate_uuid(),
         "library": "H5P.MemoryGame 1.3",
-        "metadata": {"contentType": "Memory Game", "license": "U", "title": data.get("title", "Memory")},
+        "metadata": {"contentType": "Memory Game", "license": "U", "title": "Memory" if game.title is None else game.title},
         "params": {
             "cards": cards_h5p,
             "behaviour": {
@@ -155,8 +133,8 @@ def create_memory_game(data):
                 "numCardsToUse": 4  # Show only 4 cards (2 pairs)
             },
             "lookNFeel": {
-                "themeColor": data.get("themeColor", "#002f6c"),
-                "cardBack": utils_booklet.create_image_param(data.get("card_back_image", "images/card_back.png"))
+                "themeColor": game.theme_color,
+                "cardBack": utils_booklet.create_image_param(game.card_back)
             },
             "l10n": {
                 "cardTurns": "Züge", "timeSpent": "Benötigte Zeit", "feedback": "Gut gemacht!",
@@ -173,7 +151,7 @@ def create_memory_game(data):
         "content": {
             "subContentId": utils_booklet.generate_uuid(),
             "library": "H5P.AdvancedText 1.1",
-            "params": {"text": f"<p><strong>{data.get('instruction', '')}</strong></p>"},
+            "params": {"text": f"<p><strong>{game.instruction}</strong></p>"},
             "metadata": {"contentType": "Text", "license": "U", "title": "Instruction"}
         }
     }
@@ -181,54 +159,55 @@ def create_memory_game(data):
     return {
         "subContentId": utils_booklet.generate_uuid(),
         "library": "H5P.Column 1.18",
-        "metadata": {"contentType": "Column", "license": "U", "title": data.get("title")},
+        "metadata": {"contentType": "Column", "license": "U", "title": game.title},
         "params": {"content": [instruction_text, {"useSeparator": "auto", "content": memory_content}]}
     }
 
-def create_accordion(accordion_data):
+def create_accordion(accordion: ir.Accordion):
     panels = []
-    for item in accordion_data:
+    for panel in accordion.panels:
         panels.append({
-            "title": item.get("title", ""),
+            "title": panel.title,
             "content": {
                 "subContentId": utils_booklet.generate_uuid(),
                 "library": "H5P.AdvancedText 1.1",
                 "metadata": {"contentType": "Text", "license": "U", "title": "Text"},
-                "params": {"text": item.get("text", "")}
+                "params": {"text": panel.text}
             }
         })
 
     return {
         "subContentId": utils_booklet.generate_uuid(),
         "library": "H5P.Accordion 1.0",
-        "metadata": {"contentType": "Accordion", "license": "U", "title": "Zusammenfassung"},
+        "metadata": {"contentType": "Accordion", "license": "U", "title": accordion.title},
         "params": {"panels": panels, "hTag": "h2"}
     }
 
-def create_video_page(data):
+@RENDERERS.register(ir.VideoPage)
+def create_video_page(page: ir.VideoPage):
     title_text = {
         "useSeparator": "auto",
         "content": {
             "subContentId": utils_booklet.generate_uuid(),
             "library": "H5P.AdvancedText 1.1",
             "metadata": {"contentType": "Text", "license": "U", "title": "Title"},
-            "params": {"text": f"<h2>{data.get('title', '')}</h2>"}
+            "params": {"text": f"<h2>{page.title or ''}</h2>"}
         }
     }
 
-    vid_data = data.get("video", {})
+    video = page.video
     iframe_obj = {
         "useSeparator": "auto",
         "content": {
             "subContentId": utils_booklet.generate_uuid(),
             "library": "H5P.IFrameEmbed 1.0",
-            "metadata": {"contentType": "Iframe Embedder", "license": "U", "title": "Video"},
+            "metadata": {"contentType": "Iframe Embedder", "license": "U", "title": video.title},
             "params": {
-                "source": vid_data.get("url"),
-                "width": str(vid_data.get("width", 800)),
-                "height": str(vid_data.get("height", 400)),
+                "source": video.source,
+                "width": video.width,
+                "height": video.height,
                 "resizeSupported": True,
-                "minWidth": "300"
+                "minWidth": video.min_width
             }
         }
     }
@@ -239,30 +218,28 @@ def create_video_page(data):
             "subContentId": utils_booklet.generate_uuid(),
             "library": "H5P.AdvancedText 1.1",
             "metadata": {"contentType": "Text", "license": "U", "title": "Link"},
-            "params": {"text": f"<p>❗ Falls das Video nicht lädt, versuchen Sie die Seite neu zu laden.</p><p>Link zum Video 👉 <a href='{vid_data.get('url')}' target='_blank'>Video öffnen</a></p>"}
+            "params": {"text": f"<p>❗ Falls das Video nicht lädt, versuchen Sie die Seite neu zu laden.</p><p>Link zum Video 👉 <a href='{video.source}' target='_blank'>Video öffnen</a></p>"}
         }
     }
 
-    accordion_obj = create_accordion(data.get("summary_accordion", []))
+    accordion_obj = create_accordion(page.summary)
     accordion_wrapper = {"useSeparator": "auto", "content": accordion_obj}
 
     return {
         "subContentId": utils_booklet.generate_uuid(),
         "library": "H5P.Column 1.18",
-        "metadata": {"contentType": "Column", "license": "U", "title": data.get("title")},
-        "params": {"content": [title_text, iframe_obj, warning_text, accordion_wrapper]},
-        "_reusable_accordion": accordion_obj
+        "metadata": {"contentType": "Column", "license": "U", "title": page.title},
+        "params": {"content": [title_text, iframe_obj, warning_text, accordion_wrapper]}
     }
 
-def create_question_set(data, is_drag_text=False, forced_pool_size=None):
-    intro_screen = data.get("intro_screen", {})
+@RENDERERS.register(ir.ClozeSet)
+def create_question_set(question_set: ir.QuestionSet | ir.ClozeSet, forced_pool_size=None):
+    is_drag_text = isinstance(question_set, ir.ClozeSet)
     
-    questions_h5p = []
     if is_drag_text:
-        for task in data.get("tasks", []):
-            questions_h5p.append(utils_booklet.map_drag_text_to_h5p(task))
+        questions_h5p = [utils_booklet.map_drag_text_to_h5p(task) for task in question_set.tasks]
     else:
-        questions_h5p = utils_booklet.map_questions_to_h5p_array(data.get("questions", []))
+        questions_h5p = utils_booklet.map_questions_to_h5p_array(question_set.questions)
 
     # Pool size logic
     pool_size = len(questions_h5p)
@@ -273,9 +250,9 @@ def create_question_set(data, is_drag_text=False, forced_pool_size=None):
         "introPage": {
             "showIntroPage": True,
             "startButtonText": "Quiz starten",
-            "title": intro_screen.get("title", "Quiz"),
-            "introduction": f"<p style='text-align:center'>{intro_screen.get('text','')}</p>",
-            "backgroundImage": utils_booklet.create_image_param(intro_screen.get("background_image"))
+            "title": question_set.intro_title,
+            "introduction": f"<p style='text-align:center'>{question_set.intro_text}</p>",
+            "backgroundImage": utils_booklet.create_image_param(question_set.background_image)
         },
         "progressType": "dots" if is_drag_text else "textual",
         "passPercentage": 50,
@@ -295,52 +272,34 @@ def create_question_set(data, is_drag_text=False, forced_pool_size=None):
     qset_content = {
         "subContentId": utils_booklet.generate_uuid(),
         "library": "H5P.QuestionSet 1.20",
-        "metadata": {"contentType": "Question Set", "license": "U", "title": data.get("title")},
+        "metadata": {"contentType": "Question Set", "license": "U", "title": question_set.title},
         "params": qset_params
     }
 
     return {
         "subContentId": utils_booklet.generate_uuid(),
         "library": "H5P.Column 1.18",
-        "metadata": {"contentType": "Column", "license": "U", "title": data.get("title")},
+        "metadata": {"contentType": "Column", "license": "U", "title": question_set.title},
         "params": {"content": [{"useSeparator": "auto", "content": qset_content}]}
     }
 
+@RENDERERS.register(ir.QuestionSet)
+def create_quiz(question_set: ir.QuestionSet):
+    # For quiz, limit to 5 random questions from pool
+    return create_question_set(question_set, forced_pool_size=5)
+
 def create_booklet_content_json_structure(chapters_data: list, video_title: str, 
-                                            cover_image_name: str = "images/default_cover.png") -> dict:
+                                            cover_image_name: str = "images/default_cover.png",
+                                            id_namespace: str | None = None) -> dict:
     """
     Create the complete H5P Interactive Book structure
     
-    chapters_data: list of chapter definitions with type and data
+    chapters_data: list of chapter definitions with type and data, parsed by h5p_common.ir.parse_chapter_list
+    id_namespace: book name for reproducible subContentIds (see h5p_common/ids.py), random if None
     """
     
-    chapters = []
-    
-    # Process each chapter
-    for chapter_info in chapters_data:
-        if not isinstance(chapter_info, dict):
-            logging.warning(f"Skipping invalid chapter data: {chapter_info}")
-            continue
-
-        c_type = chapter_info.get("type")
-        
-        if c_type == "introduction":
-            # Custom introduction
-            chapters.append(create_custom_introduction(chapter_info.get("data", {})))
-            
-        elif c_type == "memory_game":
-            chapters.append(create_memory_game(chapter_info))
-            
-        elif c_type == "video_page":
-            result = create_video_page(chapter_info)
-            chapters.append(result)
-            
-        elif c_type == "question_set":
-            # For quiz, limit to 5 random questions from pool
-            chapters.append(create_question_set(chapter_info, is_drag_text=False, forced_pool_size=5))
-            
-        elif c_type == "cloze_set":
-            chapters.append(create_question_set(chapter_info, is_drag_text=True))
+    # Render each chapter with its registered emitter
+    chapters = RENDERERS.render(ir.parse_chapter_list(chapters_data))
 
     # Define cover
     cover_image_file = utils_booklet.create_image_param(cover_image_name)
@@ -363,8 +322,9 @@ def create_booklet_content_json_structure(chapters_data: list, video_title: str,
         "behaviour": DEFAULT_BEHAVIOUR,
         **BOOK_L10N
     }
-    
-    # Global text replacement for German 'ß' -> 'ss'
-    final_structure = utils_booklet.recursive_replace_ss(content_structure)
 
-    return final_structure
\ No newline at end of file
+    if id_namespace is not None:
+        ids.assign_deterministic_ids(content_structure, id_namespace)
+
+    # German 'ß' -> 'ss' is applied by utils_booklet.serialize_content_json
+    return content_structure
\ No newline at end of file
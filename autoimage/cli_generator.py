@@ -2,36 +2,58 @@
 """
 CLI version of H5P Generator
 Usage: python cli_generator.py --transcript transcript.txt --video-url "https://..." --title "My Video"
+Add --import-profile to print the import time of each module on exit,
+--report to print the duration of each stage as JSON (see h5p_common/timing.py).
+Add --llm fake --llm-fixtures answers.json to replay recorded answers instead of
+calling Gemini (see h5p_common/llm.py).
 """
 
 import argparse
+import atexit
 import json
 import os
 import sys
 from pathlib import Path
-from dotenv import load_dotenv
-import google.generativeai as genai
 
-import booklet_generator_v2 as booklet_generator
+# h5p_common lives at the repository root; set up before any import so the profiler sees them all
+_REPO_ROOT = str(Path(__file__).resolve().parent.parent)
+if _REPO_ROOT not in sys.path:
+    sys.path.append(_REPO_ROOT)
+from h5p_common import lazy
+
+# Checked before argparse runs, so the imports below are profiled too
+if "--import-profile" in sys.argv:
+    _import_profiler = lazy.ImportProfiler().start()
+    atexit.register(lambda: print(_import_profiler.report(), file=sys.stderr))
+
+from dotenv import load_dotenv
 import utils_booklet_iframe as utils_booklet
+from h5p_common import llm, timing
+import booklet_generator_v2 as booklet_generator
 import utils_image_gen
 
 # Load environment
 load_dotenv()
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
-if not GEMINI_API_KEY:
-    print("❌ Error: GEMINI_API_KEY not found in .env file")
-    sys.exit(1)
-
-genai.configure(api_key=GEMINI_API_KEY)
-
 PROJECT_ROOT = Path(__file__).parent
 TEMPLATES_DIR = PROJECT_ROOT / "templates"
 TEMPLATE_ZIP_PATH = TEMPLATES_DIR / "template.zip"
 
 # --- Gemini Functions (same as orchestrator_v2.py) ---
 
+# Set by configure_llm()
+llm_backend = None
+
+def configure_llm(backend: str = None, fixtures: str = None, latency: float = None, record: str = None) -> bool:
+    """
+    Selects the LLM backend (default: H5P_LLM_BACKEND, else Gemini with GEMINI_API_KEY).
+    Returns False if Gemini is selected and the key is not set.
+    """
+    global llm_backend
+    llm_backend = llm.create_backend(backend, GEMINI_API_KEY, fixtures, latency, record)
+    return llm_backend is not None
+
 def clean_json_response(text: str) -> str:
     """Remove markdown code blocks from Gemini response"""
     text = text.strip()
@@ -41,6 +63,13 @@ def clean_json_response(text: str) -> str:
         text = text.split("```")[1].split("```")[0].strip()
     return text
 
+def generate_json(prompt: str, model_name: str, section: str):
+    """Runs prompt and parses the JSON answer, timed as stage llm.<section>."""
+    with timing.span(f"llm.{section}") as span:
+        response = llm_backend.generate(prompt, model_name, section)
+        span.bytes = len(response.text.encode("utf-8"))
+    return json.loads(clean_json_response(response.text))
+
 def generate_intro_content(transcript: str, video_title: str, video_url: str, model_name: str = "gemini-flash-latest") -> dict:
     prompt = f"""Analyze this video transcript and create an engaging introduction for an H5P Interactive Book.
 
@@ -60,9 +89,7 @@ Generate a JSON object with:
 
 Make it engaging and specific to the video content. Use German language."""
 
-    model = genai.GenerativeModel(model_name)
-    response = model.generate_content(prompt)
-    return json.loads(clean_json_response(response.text))
+    return generate_json(prompt, model_name, "intro")
 
 def generate_memory_prompts(transcript: str, model_name: str = "gemini-flash-latest") -> list:
     prompt = f"""Analyze this transcript and identify 6 key concepts, people, or events that learners should remember BEFORE watching the video.
@@ -80,9 +107,7 @@ Generate a JSON array with 6 objects:
 
 Focus on visual, memorable elements. Return ONLY the JSON array."""
 
-    model = genai.GenerativeModel(model_name)
-    response = model.generate_content(prompt)
-    return json.loads(clean_json_response(response.text))
+    return generate_json(prompt, model_name, "memory")
 
 def generate_video_summary(transcript: str, model_name: str = "gemini-flash-latest") -> list:
     prompt = f"""Analyze this transcript and create a structured summary as an accordion with 5-7 main points.
@@ -100,9 +125,7 @@ Generate a JSON array:
 
 Return ONLY the JSON array."""
 
-    model = genai.GenerativeModel(model_name)
-    response = model.generate_content(prompt)
-    return json.loads(clean_json_response(response.text))
+    return generate_json(prompt, model_name, "summary")
 
 def generate_quiz_questions(transcript: str, model_name: str = "gemini-flash-latest") -> list:
     prompt = f"""Create 10 assessment questions based on this transcript: 6 Multiple Choice and 4 True/False.
@@ -124,9 +147,7 @@ Generate JSON:
 
 Return ONLY the JSON array with exactly 10 questions."""
 
-    model = genai.GenerativeModel(model_name)
-    response = model.generate_content(prompt)
-    return json.loads(clean_json_response(response.text))
+    return generate_json(prompt, model_name, "quiz")
 
 def generate_cloze_tasks(transcript: str, model_name: str = "gemini-flash-latest") -> list:
     prompt = f"""Create 2 cloze exercises (drag text) based on this transcript.
@@ -145,17 +166,21 @@ Generate JSON:
 
 Return ONLY the JSON array with exactly 2 tasks."""
 
-    model = genai.GenerativeModel(model_name)
-    response = model.generate_content(prompt)
-    return json.loads(clean_json_response(response.text))
+    return generate_json(prompt, model_name, "cloze")
 
 # --- Main Generation Pipeline ---
 
-def generate_h5p_package(transcript: str, video_title: str, video_url: str, 
-                         output_path: str, cover_image_path: str = None,
-                         model_name: str = "gemini-flash-latest"):
+def build_h5p_package(transcript: str, video_title: str, video_url: str,
+                      cover_image_path: str = None, model_name: str = "gemini-flash-latest",
+                      id_namespace: str = None, reproducible: bool = False,
+                      work_dir: str = "./temp_generation") -> bytes | None:
     """
-    Complete pipeline to generate H5P package from transcript
+    Complete pipeline to generate H5P package from transcript. Expects configure_llm() to have run.
+
+    id_namespace: derive subContentIds from this name instead of random UUIDs
+    reproducible: fixed zip timestamps and entry order (see h5p_common/packaging.py)
+    work_dir: folder for the downloaded memory images
+    returns: Bytes of the H5P package, or None if packaging failed
     """
     
     print("🚀 Starting H5P generation pipeline...")
@@ -173,8 +198,8 @@ def generate_h5p_package(transcript: str, video_title: str, video_url: str,
     print(f"   ✓ Generated {len(memory_prompts)} pairs")
     
     print("   🎨 Downloading images from Wikimedia...")
-    temp_dir = Path("./temp_generation")
-    temp_dir.mkdir(exist_ok=True)
+    temp_dir = Path(work_dir)
+    temp_dir.mkdir(parents=True, exist_ok=True)
     
     h5p_memory_cards, image_files = utils_image_gen.generate_memory_assets(
         memory_prompts, temp_dir, use_collage=False, collage_count=4
@@ -238,17 +263,29 @@ def generate_h5p_package(transcript: str, video_title: str, video_url: str,
             extra_files.append({"filename": f"images/{img_path.name}", "data": f.read()})
     
     # Generate structure
-    content_structure = booklet_generator.create_booklet_content_json_structure(
-        chapters_data, video_title=video_title, cover_image_name=cover_param
-    )
+    with timing.span("content_build"):
+        content_structure = booklet_generator.create_booklet_content_json_structure(
+            chapters_data, video_title=video_title, cover_image_name=cover_param,
+            id_namespace=id_namespace
+        )
     
-    content_json = json.dumps(content_structure, ensure_ascii=False)
-    h5p_json = json.dumps(booklet_generator.generate_h5p_json_dict(video_title), ensure_ascii=False)
+    content_json = utils_booklet.serialize_content_json(content_structure)
+    h5p_json = utils_booklet.serialize_json(booklet_generator.generate_h5p_json_dict(video_title))
     
     # Create package
-    pkg_bytes = utils_booklet.create_h5p_package(
-        content_json, h5p_json, str(TEMPLATE_ZIP_PATH), extra_files
+    return utils_booklet.create_h5p_package(
+        content_json, h5p_json, str(TEMPLATE_ZIP_PATH), extra_files, reproducible=reproducible
     )
+
+def generate_h5p_package(transcript: str, video_title: str, video_url: str, 
+                         output_path: str, cover_image_path: str = None,
+                         model_name: str = "gemini-flash-latest", id_namespace: str = None,
+                         reproducible: bool = False):
+    """
+    Runs build_h5p_package() and saves the package to output_path. Returns True on success.
+    """
+    pkg_bytes = build_h5p_package(transcript, video_title, video_url, cover_image_path,
+                                  model_name, id_namespace, reproducible)
     
     if pkg_bytes:
         with open(output_path, "wb") as f:
@@ -305,8 +342,72 @@ def main():
         help="Gemini model to use (default: gemini-flash-latest)"
     )
     
+    parser.add_argument(
+        "--llm",
+        choices=llm.BACKENDS,
+        help="LLM backend (default: H5P_LLM_BACKEND, else gemini); fake replays recorded answers offline"
+    )
+    
+    parser.add_argument(
+        "--llm-fixtures",
+        metavar="PATH",
+        help="JSON file of recorded answers for --llm fake (default: H5P_LLM_FIXTURES)"
+    )
+    
+    parser.add_argument(
+        "--llm-latency",
+        type=float,
+        metavar="SECONDS",
+        help="Delay of each answer of --llm fake (default: H5P_LLM_LATENCY or 0)"
+    )
+    
+    parser.add_argument(
+        "--llm-record",
+        metavar="PATH",
+        help="Save every LLM answer to PATH, as fixtures for --llm fake"
+    )
+    
+    parser.add_argument(
+        "--deterministic-ids",
+        nargs="?",
+        const="",
+        metavar="NAMESPACE",
+        help="Derive subContentIds from NAMESPACE (default: the title) instead of random UUIDs, "
+             "so identical content gives an identical content.json"
+    )
+    
+    parser.add_argument(
+        "--reproducible",
+        action="store_true",
+        help="Byte-identical .h5p for identical content: fixed zip timestamps (SOURCE_DATE_EPOCH or 1980) "
+             "and entry order; implies --deterministic-ids"
+    )
+    
+    parser.add_argument(
+        "--report",
+        nargs="?",
+        const="-",
+        metavar="PATH",
+        help="Write a JSON run report (stage durations, bytes, cache hit rates) to PATH, or print it"
+    )
+    
+    parser.add_argument(
+        "--import-profile",
+        action="store_true",
+        help="Print the import time of each module to stderr on exit"
+    )
+    
     args = parser.parse_args()
     
+    try:
+        configured = configure_llm(args.llm, args.llm_fixtures, args.llm_latency, args.llm_record)
+    except (llm.LLMError, OSError, ValueError) as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
+    if not configured:
+        print("❌ Error: GEMINI_API_KEY not found in .env file")
+        sys.exit(1)
+    
     # Read transcript
     if not Path(args.transcript).exists():
         print(f"❌ Error: Transcript file not found: {args.transcript}")
@@ -324,14 +425,23 @@ def main():
         sys.exit(1)
     
     # Generate
-    success = generate_h5p_package(
-        transcript=transcript,
-        video_title=args.title,
-        video_url=args.video_url,
-        output_path=args.output,
-        cover_image_path=args.cover,
-        model_name=args.model
-    )
+    with timing.run("transcript") as report:
+        success = generate_h5p_package(
+            transcript=transcript,
+            video_title=args.title,
+            video_url=args.video_url,
+            output_path=args.output,
+            cover_image_path=args.cover,
+            model_name=args.model,
+            id_namespace=(args.deterministic_ids or args.title) if args.deterministic_ids is not None or args.reproducible else None,
+            reproducible=args.reproducible
+        )
+    
+    if args.report == "-":
+        print(report.to_json())
+    elif args.report:
+        Path(args.report).write_text(report.to_json(), encoding="utf-8")
+        print(f"📊 Run report saved to: {args.report}")
     
     sys.exit(0 if success else 1)
 
@@ -2,28 +2,46 @@ import streamlit as st
 import json
 import tempfile
 import os
+import sys
 from pathlib import Path
 from dotenv import load_dotenv
-import google.generativeai as genai
+
+# h5p_common lives at the repository root; set up here, once, before anything imports it
+_REPO_ROOT = str(Path(__file__).resolve().parent.parent)
+if _REPO_ROOT not in sys.path:
+    sys.path.append(_REPO_ROOT)
 
 import booklet_generator_v2 as booklet_generator
 import utils_booklet_iframe as utils_booklet
 import utils_image_gen
+from h5p_common import llm, metrics, resources, timing
 
 # Load environment variables
 load_dotenv()
 
-# Configure Gemini
+# One backend per process rather than per rerun. Gemini unless H5P_LLM_BACKEND=fake (see h5p_common/llm.py)
+@resources.cache_resource
+def llm_backend():
+    return llm.create_backend(api_key=GEMINI_API_KEY)
+
+def generate_text(prompt: str, model_name: str, section: str):
+    """Runs prompt on the shared backend, timed as stage llm.<section> (see h5p_common/timing.py)."""
+    with timing.span(f"llm.{section}") as span:
+        response = llm_backend().generate(prompt, model_name, section)
+        span.bytes = len(response.text.encode("utf-8"))
+    return response
+
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
-else:
+if not GEMINI_API_KEY and os.getenv("H5P_LLM_BACKEND") != "fake":
     st.error("⚠️ GEMINI_API_KEY not found in .env file!")
 
 PROJECT_ROOT = Path(__file__).parent
 TEMPLATES_DIR = PROJECT_ROOT / "templates"
 TEMPLATE_ZIP_PATH = TEMPLATES_DIR / "template.zip"
 
+# Prometheus metrics, when H5P_METRICS_PORT or H5P_METRICS_TEXTFILE is set (see h5p_common/metrics.py)
+metrics.enable_from_env()
+
 st.set_page_config(page_title="H5P Transcript Generator", page_icon="📚", layout="wide")
 
 # --- Gemini Prompts ---
@@ -68,8 +86,7 @@ Make it engaging and specific to the video content. Use German language.
 Return ONLY the JSON, nothing else."""
 
     try:
-        model = genai.GenerativeModel(model_name)
-        response = model.generate_content(prompt)
+        response = generate_text(prompt, model_name, "intro")
         cleaned_text = clean_json_response(response.text)
         
         if not cleaned_text:
@@ -103,8 +120,7 @@ Focus on visual, memorable elements. The 'prompt' will be used to search for ima
 Return EXACTLY 6 objects in the array, nothing else."""
 
     try:
-        model = genai.GenerativeModel(model_name)
-        response = model.generate_content(prompt)
+        response = generate_text(prompt, model_name, "memory")
         cleaned_text = clean_json_response(response.text)
         
         if not cleaned_text:
@@ -143,8 +159,7 @@ You MUST respond with ONLY a valid JSON array (no markdown, no explanation):
 Follow the chronological order of the transcript. Return ONLY the JSON array, nothing else."""
 
     try:
-        model = genai.GenerativeModel(model_name)
-        response = model.generate_content(prompt)
+        response = generate_text(prompt, model_name, "summary")
         cleaned_text = clean_json_response(response.text)
         
         if not cleaned_text:
@@ -195,8 +210,7 @@ You MUST respond with ONLY a valid JSON array (no markdown, no explanation):
 Return EXACTLY 10 questions (6 MC first, then 4 TF), nothing else."""
 
     try:
-        model = genai.GenerativeModel(model_name)
-        response = model.generate_content(prompt)
+        response = generate_text(prompt, model_name, "quiz")
         cleaned_text = clean_json_response(response.text)
         
         if not cleaned_text:
@@ -248,8 +262,7 @@ You MUST respond with ONLY a valid JSON array (no markdown, no explanation):
 Return EXACTLY 2 tasks in the array, nothing else."""
 
     try:
-        model = genai.GenerativeModel(model_name)
-        response = model.generate_content(prompt)
+        response = generate_text(prompt, model_name, "cloze")
         cleaned_text = clean_json_response(response.text)
         
         if not cleaned_text:
@@ -280,6 +293,12 @@ Return EXACTLY 2 tasks in the array, nothing else."""
 # --- Streamlit UI ---
 def main():
     st.title("🎥 H5P Interactive Book Generator")
+
+    # Cached templates and resources survive reruns (see h5p_common/resources.py)
+    if st.sidebar.button("🔄 Reload templates & caches"):
+        resources.clear_all()
+        st.sidebar.success("Caches cleared.")
+
     st.markdown("Generate an interactive H5P learning module from any video transcript using AI.")
     
     # Initialize session state
@@ -317,7 +336,7 @@ def main():
     
     with col_gen1:
         if st.button("🤖 Generate All Content", type="primary", disabled=not transcript):
-            if not GEMINI_API_KEY:
+            if llm_backend() is None:
                 st.error("❌ Gemini API key not configured!")
                 return
                 
@@ -529,10 +548,9 @@ def main():
                     cover_image_name=cover_filename_param
                 )
                 
-                content_json = json.dumps(content_structure, ensure_ascii=False)
-                h5p_json = json.dumps(
-                    booklet_generator.generate_h5p_json_dict(video_title), 
-                    ensure_ascii=False
+                content_json = utils_booklet.serialize_content_json(content_structure)
+                h5p_json = utils_booklet.serialize_json(
+                    booklet_generator.generate_h5p_json_dict(video_title)
                 )
                 
                 # Create package
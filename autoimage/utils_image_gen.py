@@ -1,40 +1,74 @@
 # ================================================
 # FILE: JR/utils_image_gen.py
 # ================================================
+import importlib.util
 import os
-import requests
-import cv2
-import numpy as np
 import json
 import textwrap
 import re
 import logging
-from PIL import Image, ImageDraw, ImageFont
 from pathlib import Path
+from h5p_common import lazy, resources, timing
+
+# Heavy dependencies, imported on first use (see h5p_common/lazy.py)
+requests = lazy.module("requests")
+cv2 = lazy.module("cv2")
+np = lazy.module("numpy")
+Image = lazy.module("PIL.Image")
+ImageDraw = lazy.module("PIL.ImageDraw")
+ImageFont = lazy.module("PIL.ImageFont")
 
 # Setup Logger
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Optional: German Hyphenation
-try:
-    import pyphen
-    dic = pyphen.Pyphen(lang='de')
-    HAS_PYPHEN = True
-except ImportError:
-    HAS_PYPHEN = False
+# Optional: German Hyphenation (dictionary loaded by hyphenator() when first needed)
+HAS_PYPHEN = importlib.util.find_spec("pyphen") is not None
 
 # --- Configuration Constants ---
 IMAGE_SIZE = 1080
 MAX_FONT_SIZE = 140
 MIN_FONT_SIZE = 60
 PADDING = 40
+FONT_NAME = "arial.ttf"
+HTTP_HEADERS = {"User-Agent": "MyBot/1.0"}
+# Point at a local stand-in (python -m benchmarks.wikimedia_standin) to run without network access
+WIKIMEDIA_API_URL = os.environ.get("WIKIMEDIA_API_URL", "https://commons.wikimedia.org/w/api.php")
+HTML_TAG_RE = re.compile('<.*?>')
+
+# --- Cached resources (kept across Streamlit reruns, see h5p_common/resources.py) ---
+@resources.cache_resource
+def http_session():
+    """Shared session, so repeated Wikimedia requests reuse their connections."""
+    session = requests.Session()
+    session.headers.update(HTTP_HEADERS)
+    return session
+
+@resources.cache_resource
+def face_cascade():
+    return cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+
+@resources.cache_resource
+def hyphenator():
+    """German dictionary, or None if pyphen fails to import or lacks it: text is then not hyphenated."""
+    try:
+        import pyphen
+        return pyphen.Pyphen(lang='de')
+    except (ImportError, KeyError) as e:
+        logger.warning(f"Hyphenation disabled, could not load pyphen's German dictionary: {e}")
+        return None
+
+@resources.cache_resource
+def load_font(size):
+    try:
+        return ImageFont.truetype(FONT_NAME, size)
+    except OSError:
+        return ImageFont.load_default()
 
 # --- Utilities ---
 def clean_html(raw_html):
     if not raw_html: return "Unknown"
-    cleanr = re.compile('<.*?>')
-    return re.sub(cleanr, '', str(raw_html)).strip()
+    return HTML_TAG_RE.sub('', str(raw_html)).strip()
 
 def extract_year(date_str):
     if not date_str: return "Unknown"
@@ -54,7 +88,7 @@ def ensure_directory(file_path):
 # --- Wikimedia & Image Logic ---
 def get_wikimedia_data(search_term, num_results=1):
     logger.info(f"Searching Wikimedia for: '{search_term}' (requesting {num_results} results)")
-    url = "https://commons.wikimedia.org/w/api.php"
+    url = WIKIMEDIA_API_URL
     params = {
         "action": "query", "format": "json", "generator": "search",
         "gsrnamespace": "6", "gsrlimit": str(num_results + 3),
@@ -63,7 +97,9 @@ def get_wikimedia_data(search_term, num_results=1):
     }
     results = []
     try:
-        response = requests.get(url, params=params, headers={"User-Agent": "MyBot/1.0"}, timeout=10)
+        with timing.span("wikimedia.search") as span:
+            response = http_session().get(url, params=params, timeout=10)
+            span.bytes = len(response.content)
         data = response.json()
         
         if "query" not in data or "pages" not in data["query"]:
@@ -100,12 +136,15 @@ def get_wikimedia_data(search_term, num_results=1):
 def download_image_as_cv2(url):
     try:
         logger.info(f"Attempting to download: {url}")
-        resp = requests.get(url, headers={"User-Agent": "MyBot/1.0"}, timeout=10)
+        with timing.span("download") as span:
+            resp = http_session().get(url, timeout=10)
+            span.bytes = len(resp.content)
         logger.info(f"Response status: {resp.status_code}")
         
         if resp.status_code == 200:
-            image_array = np.asarray(bytearray(resp.content), dtype=np.uint8)
-            img = cv2.imdecode(image_array, cv2.IMREAD_COLOR)
+            with timing.span("decode"):
+                image_array = np.asarray(bytearray(resp.content), dtype=np.uint8)
+                img = cv2.imdecode(image_array, cv2.IMREAD_COLOR)
             
             if img is None:
                 logger.error(f"cv2.imdecode failed - could not decode image from {url}")
@@ -133,6 +172,7 @@ def resize_and_crop_center(img, target_w, target_h):
     start_y = (resized_h - target_h) // 2
     return resized[start_y:start_y+target_h, start_x:start_x+target_w]
 
+@timing.span("collage")
 def create_collage(image_list, target_size, n_grid):
     if not image_list:
         return np.full((target_size, target_size, 3), 200, dtype=np.uint8)
@@ -162,10 +202,10 @@ def create_collage(image_list, target_size, n_grid):
 
     return resize_and_crop_center(collage_canvas, target_size, target_size)
 
+@timing.span("crop")
 def smart_crop_auto(img, target_size):
-    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
     gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    faces = face_cascade.detectMultiScale(gray, 1.1, 4)
+    faces = face_cascade().detectMultiScale(gray, 1.1, 4)
     
     h, w, _ = img.shape
     if len(faces) == 0:
@@ -193,6 +233,7 @@ def smart_crop_auto(img, target_size):
     cropped = img[int(start_y):int(end_y), int(start_x):int(end_x)]
     return cv2.resize(cropped, (target_size, target_size), interpolation=cv2.INTER_AREA)
 
+@timing.span("text_render")
 def create_text_image(text, size):
     img = Image.new('RGB', (size, size), color=(255, 255, 255))
     draw = ImageDraw.Draw(img)
@@ -203,8 +244,7 @@ def create_text_image(text, size):
 
     # Phase 1: Try shrinking
     while current_font_size >= MIN_FONT_SIZE:
-        try: font = ImageFont.truetype("arial.ttf", current_font_size) 
-        except: font = ImageFont.load_default()
+        font = load_font(current_font_size)
 
         avg_char_width = current_font_size * 0.55 
         available_width = size - (PADDING * 2)
@@ -223,14 +263,14 @@ def create_text_image(text, size):
             
     # Phase 2: Hyphenate
     if final_font is None:
-        try: final_font = ImageFont.truetype("arial.ttf", MIN_FONT_SIZE)
-        except: final_font = ImageFont.load_default()
+        final_font = load_font(MIN_FONT_SIZE)
         
         avg_char_width = MIN_FONT_SIZE * 0.55
         available_width = size - (PADDING * 2)
         chars_per_line = int(available_width / avg_char_width)
         
-        if HAS_PYPHEN:
+        dic = hyphenator() if HAS_PYPHEN else None
+        if dic is not None:
             processed_text_parts = []
             for word in text.split():
                 if len(word) * avg_char_width > available_width:
@@ -256,6 +296,7 @@ def create_text_image(text, size):
         
     return img
 
+@timing.span("placeholder")
 def create_placeholder_image(text, size):
     """
     Creates a colorful placeholder image with the search term text
@@ -281,13 +322,8 @@ def create_placeholder_image(text, size):
     # Add text overlay
     draw = ImageDraw.Draw(img)
     
-    # Try to load a font
-    try:
-        font_large = ImageFont.truetype("arial.ttf", 120)
-        font_small = ImageFont.truetype("arial.ttf", 40)
-    except:
-        font_large = ImageFont.load_default()
-        font_small = ImageFont.load_default()
+    font_large = load_font(120)
+    font_small = load_font(40)
     
     # Add "?" icon at top
     icon_bbox = draw.textbbox((0, 0), "?", font=font_large)
@@ -323,6 +359,7 @@ def create_placeholder_image(text, size):
     return cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
 
 # --- Main Generator Function ---
+@timing.span("memory_assets")
 def generate_memory_assets(cards_input, output_dir, use_collage=False, collage_count=4):
     """
     cards_input: list of dicts [{'prompt': 'Paris', 'match_text': 'Hauptstadt'}, ...]
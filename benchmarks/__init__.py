@@ -0,0 +1 @@
+"""Benchmarks of content build, packaging and image generation, see run.py."""
@@ -0,0 +1,395 @@
+"""
+Benchmarks of content build, packaging and image generation for every variant.
+
+Runs offline: inputs come from benchmarks/fixtures/, images are generated, and
+the memory_assets and pipeline benchmarks search and download from a local
+Wikimedia stand-in (see wikimedia_standin.py) instead of Commons. The pipeline
+replays recorded Gemini answers (see h5p_common/llm.py). Run from the repository root:
+
+    python -m benchmarks.run                        # all benchmarks, compared with the baseline
+    python -m benchmarks.run --filter package.      # only names containing "package."
+    python -m benchmarks.run --save-baseline        # store these results as the new baseline
+
+A benchmark whose median is more than --threshold (default 25%) slower than its
+baseline counts as a regression, and the runner exits with status 1. Baselines
+depend on the machine: save them on the machine that compares against them.
+"""
+import argparse
+import contextlib
+import copy
+import io
+import json
+import logging
+import platform
+import re
+import statistics
+import sys
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+if str(REPO_ROOT) not in sys.path:
+    sys.path.append(str(REPO_ROOT))
+from h5p_common import lazy
+from h5p_common.server import load_variant
+
+np = lazy.module("numpy")
+Image = lazy.module("PIL.Image")
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+# Images a serialised content.json references, relative to content/
+IMAGE_REFERENCE_RE = re.compile(rb'"path"\s*:\s*"(images/[^"]+)"')
+DEFAULT_THRESHOLD = 0.25
+# Shortest measured round, fast benchmarks repeat their call to fill it
+MIN_ROUND_SECONDS = 0.05
+
+# name -> setup function returning the zero-argument callable to measure
+BENCHMARKS = {}
+
+
+def benchmark(name: str):
+    """Registers a setup function. Its work (loading fixtures, warming caches) is not measured."""
+    def decorator(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return decorator
+
+
+def fixture_json(name: str):
+    with open(FIXTURES_DIR / name, encoding="utf-8") as f_fixture:
+        return json.load(f_fixture)
+
+
+def synthetic_image(width: int, height: int, seed: int = 0):
+    """Reproducible BGR image (as decoded by cv2): smooth gradients plus noise, so it compresses like a photo."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    gradient = np.stack([x * 255 // width, y * 255 // height, (x + y) * 255 // (width + height)], axis=-1)
+    noise = rng.integers(0, 64, size=(height, width, 3))
+    return np.clip(gradient + noise, 0, 255).astype(np.uint8)
+
+
+def synthetic_jpeg(width: int, height: int, seed: int = 0, quality: int = 90) -> bytes:
+    buffer = io.BytesIO()
+    Image.fromarray(synthetic_image(width, height, seed)[:, :, ::-1]).save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def _template(directory: str) -> str:
+    return str(REPO_ROOT / directory / "templates" / "template.zip")
+
+
+# --- Content build ---
+def _podcast_input() -> dict:
+    process_md_folder = load_variant("h5p_podcast_gem", "process_md_folder")["process_md_folder"]
+    md_intro, md_video, md_questions, _ = process_md_folder.parse_md_file_content(
+        (FIXTURES_DIR / "podcast.md").read_text(encoding="utf-8"))
+    return {**md_intro, **md_video, **md_questions}
+
+
+@benchmark("content_build.podcast")
+def bench_content_podcast():
+    booklet_generator = load_variant("h5p_podcast_gem", "booklet_generator")["booklet_generator"]
+    data = _podcast_input()
+    return lambda: booklet_generator.create_booklet_content_json_structure(
+        copy.deepcopy(data), "dQw4w9WgXcQ", "images/img_1.png", "images/img_2.png")
+
+
+@benchmark("content_build.iframe_gem")
+def bench_content_iframe_gem():
+    booklet_generator = load_variant("h5p_iframe_gem", "booklet_generator_iframe")["booklet_generator_iframe"]
+    data = fixture_json("iframe.json")
+    return lambda: booklet_generator.create_booklet_content_json_structure(copy.deepcopy(data), "images/img_1.png")
+
+
+@benchmark("content_build.iframe_text")
+def bench_content_iframe_text():
+    booklet_generator = load_variant("h5p_iframe_text", "booklet_generator_iframe")["booklet_generator_iframe"]
+    data = fixture_json("iframe.json")
+    return lambda: booklet_generator.create_booklet_content_json_structure(
+        copy.deepcopy(data), "images/img_1.png", data["book"]["title"])
+
+
+def _annual_review(directory: str):
+    booklet_generator = load_variant(directory, "booklet_generator_iframe")["booklet_generator_iframe"]
+    data = fixture_json("annual_review.json")
+    return lambda: booklet_generator.create_booklet_content_json_structure(
+        copy.deepcopy(data["chapters"]), data["roman_number"], data["months_text"],
+        mentimeter_urls=tuple(data["mentimeter_urls"]))
+
+
+@benchmark("content_build.JR")
+def bench_content_jr():
+    return _annual_review("JR")
+
+
+@benchmark("content_build.JRautoimage")
+def bench_content_jrautoimage():
+    return _annual_review("JRautoimage")
+
+
+@benchmark("content_build.autoimage")
+def bench_content_autoimage():
+    booklet_generator = load_variant("autoimage", "booklet_generator_v2")["booklet_generator_v2"]
+    chapters = fixture_json("autoimage_chapters.json")
+    return lambda: booklet_generator.create_booklet_content_json_structure(copy.deepcopy(chapters), "Benchmark-Video")
+
+
+# --- Packaging ---
+def _package(directory: str, generator_name: str, utils_name: str, build_content, use_base_package: bool = True):
+    """Serialises the content once, then measures create_h5p_package (base package compiled during setup)."""
+    modules = load_variant(directory, generator_name, utils_name)
+    booklet_generator, utils_booklet = modules[generator_name], modules[utils_name]
+    content_json = utils_booklet.serialize_json(build_content(booklet_generator))
+    h5p_json = utils_booklet.serialize_json(booklet_generator.generate_h5p_json_dict("Benchmark"))
+
+    if directory in ("h5p_iframe_gem", "h5p_iframe_text", "h5p_podcast_gem"):
+        # These take (source path, package path) tuples
+        files = [(str(REPO_ROOT / directory / "templates" / "img_1.png"), "images/img_1.png")]
+    else:
+        # A generated photo for every image the book references that the template lacks (cards, cover)
+        with zipfile.ZipFile(_template(directory)) as template_zip:
+            in_template = set(template_zip.namelist())
+        referenced = sorted({path.decode("utf-8") for path in IMAGE_REFERENCE_RE.findall(content_json)}
+                            - {name.removeprefix("content/") for name in in_template})
+        files = [{"filename": path, "data": synthetic_jpeg(400, 400, seed)} for seed, path in enumerate(referenced)]
+
+    def run():
+        package = utils_booklet.create_h5p_package(content_json, h5p_json, _template(directory), files,
+                                                   use_base_package=use_base_package)
+        if not package:
+            raise RuntimeError(f"create_h5p_package failed for {directory}")
+        return package
+    run()
+    return run
+
+
+# No package.podcast: h5p_podcast_gem/templates/ holds only the two images, not its template.zip
+@benchmark("package.iframe_gem")
+def bench_package_iframe_gem():
+    data = fixture_json("iframe.json")
+    return _package("h5p_iframe_gem", "booklet_generator_iframe", "utils_booklet_iframe",
+                    lambda g: g.create_booklet_content_json_structure(data, "images/img_1.png"))
+
+
+@benchmark("package.iframe_text")
+def bench_package_iframe_text():
+    data = fixture_json("iframe.json")
+    return _package("h5p_iframe_text", "booklet_generator_iframe", "utils_booklet_iframe",
+                    lambda g: g.create_booklet_content_json_structure(data, "images/img_1.png", data["book"]["title"]))
+
+
+def _annual_review_content(g):
+    data = fixture_json("annual_review.json")
+    return g.create_booklet_content_json_structure(data["chapters"], data["roman_number"], data["months_text"],
+                                                   mentimeter_urls=tuple(data["mentimeter_urls"]))
+
+
+@benchmark("package.JR")
+def bench_package_jr():
+    return _package("JR", "booklet_generator_iframe", "utils_booklet_iframe", _annual_review_content)
+
+
+@benchmark("package.JR.no_base")
+def bench_package_jr_no_base():
+    """Same book, re-compressing every template entry instead of appending to the base package."""
+    return _package("JR", "booklet_generator_iframe", "utils_booklet_iframe", _annual_review_content,
+                    use_base_package=False)
+
+
+@benchmark("package.JRautoimage")
+def bench_package_jrautoimage():
+    return _package("JRautoimage", "booklet_generator_iframe", "utils_booklet_iframe", _annual_review_content)
+
+
+@benchmark("package.autoimage")
+def bench_package_autoimage():
+    chapters = fixture_json("autoimage_chapters.json")
+    return _package("autoimage", "booklet_generator_v2", "utils_booklet_iframe",
+                    lambda g: g.create_booklet_content_json_structure(chapters, "Benchmark-Video"))
+
+
+# --- Images ---
+@benchmark("image.compress")
+def bench_compress():
+    utils_booklet = load_variant("JR", "utils_booklet_iframe")["utils_booklet_iframe"]
+    data = synthetic_jpeg(2400, 1600, quality=95)
+    return lambda: utils_booklet.compress_image_if_needed(data, "cover.jpg")
+
+
+def _image_gen():
+    return load_variant("autoimage", "utils_image_gen")["utils_image_gen"]
+
+
+@benchmark("image.text_render")
+def bench_text_render():
+    utils_image_gen = _image_gen()
+    texts = ("Bern", "Die Hauptstadt der Schweiz", "Donaudampfschifffahrtsgesellschaftskapitänsmütze")
+    return lambda: [utils_image_gen.create_text_image(text, utils_image_gen.IMAGE_SIZE) for text in texts]
+
+
+@benchmark("image.collage")
+def bench_collage():
+    utils_image_gen = _image_gen()
+    images = [synthetic_image(800 + 100 * i, 600, seed=i) for i in range(4)]
+    return lambda: utils_image_gen.create_collage(images, utils_image_gen.IMAGE_SIZE, 4)
+
+
+@benchmark("image.smart_crop")
+def bench_smart_crop():
+    utils_image_gen = _image_gen()
+    image = synthetic_image(1600, 1000)
+    utils_image_gen.face_cascade()
+    return lambda: utils_image_gen.smart_crop_auto(image, utils_image_gen.IMAGE_SIZE)
+
+
+# --- Memory assets, against the Wikimedia stand-in ---
+def _memory_assets(use_collage: bool):
+    from benchmarks import wikimedia_standin
+
+    utils_image_gen = _image_gen()
+    _, utils_image_gen.WIKIMEDIA_API_URL = wikimedia_standin.start_in_thread()
+    cards = [{"prompt": prompt, "match_text": text} for prompt, text in
+             (("Bern", "Hauptstadt"), ("Alpen", "Gebirge"), ("Rosengarten", "Park"), ("Aare", "Fluss"))]
+    # Kept alive by the closure, removed with it
+    output_dir = tempfile.TemporaryDirectory(prefix="h5p_bench_")
+    return lambda: utils_image_gen.generate_memory_assets(cards, Path(output_dir.name), use_collage=use_collage)
+
+
+@benchmark("memory_assets.collage")
+def bench_memory_assets_collage():
+    return _memory_assets(use_collage=True)
+
+
+@benchmark("memory_assets.photo")
+def bench_memory_assets_photo():
+    return _memory_assets(use_collage=False)
+
+
+# --- Transcript pipeline, with recorded LLM answers ---
+@benchmark("pipeline.transcript")
+def bench_pipeline_transcript():
+    from benchmarks import wikimedia_standin
+
+    cli_generator = load_variant("autoimage", "cli_generator")["cli_generator"]
+    cli_generator.configure_llm("fake", str(FIXTURES_DIR / "llm" / "transcript.json"))
+    _, cli_generator.utils_image_gen.WIKIMEDIA_API_URL = wikimedia_standin.start_in_thread()
+    transcript = (REPO_ROOT / "autoimage" / "example_transcript.txt").read_text(encoding="utf-8")
+    work_dir = tempfile.TemporaryDirectory(prefix="h5p_bench_")
+
+    def run():
+        # The pipeline reports its progress on stdout
+        with contextlib.redirect_stdout(io.StringIO()):
+            return cli_generator.build_h5p_package(transcript, "Benchmark-Video", "https://www.srf.ch/play/embed",
+                                                   work_dir=work_dir.name)
+    return run
+
+
+# --- Runner ---
+def measure(func, rounds: int) -> dict:
+    """
+    Calls func once to warm up, then in rounds of at least MIN_ROUND_SECONDS: fast functions
+    run several times per round, which keeps timer resolution out of the result.
+    Durations are per call, in seconds.
+    """
+    started = time.perf_counter()
+    func()
+    calls = max(1, int(MIN_ROUND_SECONDS / max(time.perf_counter() - started, 1e-6)))
+    durations = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for _ in range(calls):
+            func()
+        durations.append((time.perf_counter() - started) / calls)
+    return {
+        "rounds": rounds,
+        "calls_per_round": calls,
+        "min_s": min(durations),
+        "median_s": statistics.median(durations),
+        "mean_s": statistics.fmean(durations),
+        "stdev_s": statistics.stdev(durations) if rounds > 1 else 0.0,
+    }
+
+
+def load_baseline(path: Path) -> dict:
+    try:
+        with open(path, encoding="utf-8") as f_baseline:
+            return json.load(f_baseline).get("results", {})
+    except FileNotFoundError:
+        return {}
+
+
+def save_baseline(path: Path, results: dict):
+    baseline = {
+        "machine": platform.platform(),
+        "python": platform.python_version(),
+        "saved": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": {name: result for name, result in results.items() if "error" not in result},
+    }
+    path.write_text(json.dumps(baseline, indent=2) + "\n", encoding="utf-8")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks of content build, packaging and image generation")
+    parser.add_argument("--filter", "-k", default="", help="Only run benchmarks whose name contains this text")
+    parser.add_argument("--rounds", "-r", type=int, default=7, help="Measured calls per benchmark (default: 7)")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH, help=f"Baseline file (default: {BASELINE_PATH})")
+    parser.add_argument("--save-baseline", action="store_true", help="Store the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"Allowed slowdown of the median against the baseline (default: {DEFAULT_THRESHOLD})")
+    parser.add_argument("--json", type=Path, metavar="PATH", help="Also write the results to PATH as JSON")
+    parser.add_argument("--list", action="store_true", help="List the benchmarks and exit")
+    args = parser.parse_args()
+
+    names = [name for name in BENCHMARKS if args.filter in name]
+    if args.list:
+        print("\n".join(names))
+        return
+
+    # The generators log every step at INFO
+    logging.basicConfig(level=logging.WARNING)
+    logging.disable(logging.INFO)
+
+    baseline = load_baseline(args.baseline)
+    results = {}
+    regressions = []
+    print(f"{'benchmark':32} {'median ms':>10} {'min ms':>10} {'baseline':>10} {'change':>8}")
+    for name in names:
+        try:
+            results[name] = measure(BENCHMARKS[name](), args.rounds)
+        except Exception as e:
+            results[name] = {"error": f"{type(e).__name__}: {e}"}
+            print(f"{name:32} error: {results[name]['error']}")
+            continue
+
+        result = results[name]
+        line = f"{name:32} {result['median_s'] * 1000:10.2f} {result['min_s'] * 1000:10.2f}"
+        reference = baseline.get(name)
+        if reference:
+            change = result["median_s"] / reference["median_s"] - 1
+            result["change"] = change
+            line += f" {reference['median_s'] * 1000:10.2f} {change:+8.1%}"
+            if change > args.threshold:
+                regressions.append(name)
+                line += "  REGRESSION"
+        print(line)
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+    if args.save_baseline:
+        save_baseline(args.baseline, results)
+        print(f"Saved baseline to {args.baseline}")
+
+    errors = [name for name, result in results.items() if "error" in result]
+    if regressions:
+        print(f"{len(regressions)} regression(s) above {args.threshold:.0%}: {', '.join(regressions)}")
+    if errors:
+        print(f"{len(errors)} benchmark(s) failed: {', '.join(errors)}")
+    sys.exit(1 if regressions or errors else 0)
+
+
+if __name__ == "__main__":
+    main()
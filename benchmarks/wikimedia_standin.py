@@ -0,0 +1,201 @@
+"""
+Local stand-in for the Wikimedia Commons API, for offline tests and load benchmarks.
+
+Answers the image search of utils_image_gen.get_wikimedia_data() with canned
+results and serves the images from a fixtures directory, optionally with
+injected latency and errors:
+
+    python -m benchmarks.wikimedia_standin --port 8089 --latency 0.2 --error-rate 0.1
+    WIKIMEDIA_API_URL=http://127.0.0.1:8089/w/api.php python autoimage/cli_generator.py ...
+
+The fixtures directory (default: benchmarks/fixtures/wikimedia/) holds the
+images plus an optional search.json mapping search terms to result lists:
+
+    {"Bern": [{"file": "bern.jpg", "title": "Bundeshaus", "author": "...", "license": "CC BY-SA 4.0"}]}
+
+A term without an entry gets images picked from the directory by a hash of the
+term, so every search returns the same results on every run. Errors are drawn
+from a seeded random generator and answered with --error-status (default 503).
+"""
+import argparse
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, quote, unquote, urlparse
+
+logger = logging.getLogger(__name__)
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures" / "wikimedia"
+API_PATH = "/w/api.php"
+IMAGES_PATH = "/images/"
+IMAGE_TYPES = {".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png"}
+# filetype:bitmap and other search operators are not part of the term
+SEARCH_OPERATOR_PREFIXES = ("filetype:", "incategory:", "insource:")
+
+
+class StandinConfig:
+    """Fixtures and fault injection of a running stand-in."""
+
+    def __init__(self, fixtures_dir: Path = FIXTURES_DIR, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, error_status: int = 503, seed: int = 0):
+        self.fixtures_dir = Path(fixtures_dir)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.images = sorted(path.name for path in self.fixtures_dir.iterdir()
+                             if path.suffix.lower() in IMAGE_TYPES)
+        search_path = self.fixtures_dir / "search.json"
+        self.canned = json.loads(search_path.read_text(encoding="utf-8")) if search_path.exists() else {}
+        self.requests = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay_and_fault(self) -> bool:
+        """Counts a request and sleeps the injected latency. True if the request should fail."""
+        with self._lock:
+            self.requests += 1
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+            failed = self._random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+        if delay:
+            time.sleep(delay)
+        return failed
+
+    def results(self, term: str, limit: int) -> list:
+        """Result entries for a search term: canned ones, else images picked by a hash of the term."""
+        if term in self.canned:
+            return self.canned[term][:limit]
+        if not self.images:
+            return []
+        start = int(hashlib.sha256(term.encode("utf-8")).hexdigest(), 16) % len(self.images)
+        count = min(limit, len(self.images))
+        return [{"file": self.images[(start + offset) % len(self.images)]} for offset in range(count)]
+
+
+def search_response(config: StandinConfig, base_url: str, query: dict) -> dict:
+    """api.php?action=query&generator=search&prop=imageinfo answer in the shape Commons returns."""
+    words = query.get("gsrsearch", "").split()
+    term = " ".join(word for word in words if not word.startswith(SEARCH_OPERATOR_PREFIXES))
+    limit = int(query.get("gsrlimit", 10) or 10)
+
+    pages = {}
+    for index, result in enumerate(config.results(term, limit)):
+        file_name = result["file"]
+        image_url = f"{base_url}{IMAGES_PATH}{quote(file_name)}"
+        pages[str(-1 - index)] = {
+            "pageid": index + 1,
+            "ns": 6,
+            "title": f"File:{file_name}",
+            "index": index + 1,
+            "imageinfo": [{
+                "url": image_url,
+                "descriptionurl": f"{base_url}/wiki/File:{quote(file_name)}",
+                "extmetadata": {
+                    "ObjectName": {"value": result.get("title", Path(file_name).stem)},
+                    "Artist": {"value": result.get("author", "<a href=\"#\">Stand-in</a>")},
+                    "DateTime": {"value": result.get("date", "2020-01-01 12:00:00")},
+                    "LicenseShortName": {"value": result.get("license", "CC BY-SA 4.0")},
+                },
+            }],
+        }
+    if not pages:
+        return {"batchcomplete": ""}
+    return {"batchcomplete": "", "query": {"pages": pages}}
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    server_version = "WikimediaStandin/1.0"
+    protocol_version = "HTTP/1.1"
+    # Set by make_server()
+    config: StandinConfig = None
+
+    def _send(self, status: int, content_type: str, payload: bytes):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_json(self, status: int, data: dict):
+        self._send(status, "application/json; charset=utf-8", json.dumps(data).encode("utf-8"))
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if self.config.delay_and_fault():
+            self._send_json(self.config.error_status, {"error": {"code": "standin-injected",
+                                                                 "info": "Injected error"}})
+            return
+
+        if url.path == API_PATH:
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            # Image URLs point back at the host the client reached, which also works when bound to 0.0.0.0
+            host = self.headers.get("Host") or "{}:{}".format(*self.server.server_address[:2])
+            self._send_json(200, search_response(self.config, f"http://{host}", query))
+        elif url.path.startswith(IMAGES_PATH):
+            file_name = Path(unquote(url.path[len(IMAGES_PATH):])).name
+            path = self.config.fixtures_dir / file_name
+            if file_name in self.config.images:
+                self._send(200, IMAGE_TYPES[path.suffix.lower()], path.read_bytes())
+            else:
+                self._send_json(404, {"error": f"No fixture image {file_name}"})
+        else:
+            self._send_json(404, {"error": f"Unknown path {url.path}"})
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+
+def make_server(config: StandinConfig, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Stand-in server bound to host:port (0 picks a free port), not yet serving."""
+    handler = type("ConfiguredStandinHandler", (StandinHandler,), {"config": config})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_in_thread(config: StandinConfig = None, host: str = "127.0.0.1", port: int = 0) -> tuple:
+    """
+    Serves the stand-in on a daemon thread, e.g. inside a benchmark.
+    :return: (server, API URL to use as WIKIMEDIA_API_URL). Stop with server.shutdown().
+    """
+    server = make_server(config or StandinConfig(), host, port)
+    threading.Thread(target=server.serve_forever, name="wikimedia-standin", daemon=True).start()
+    bound_host, bound_port = server.server_address[:2]
+    return server, f"http://{bound_host}:{bound_port}{API_PATH}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Wikimedia Commons image search")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--fixtures", type=Path, default=FIXTURES_DIR, help="Directory of images and search.json")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Up to this many seconds added on top, at random")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with an error")
+    parser.add_argument("--error-status", type=int, default=503, help="HTTP status of injected errors")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the latency and error draws")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    config = StandinConfig(args.fixtures, args.latency, args.jitter, args.error_rate, args.error_status, args.seed)
+    server = make_server(config, args.host, args.port)
+    logger.info(f"Serving {len(config.images)} images, set WIKIMEDIA_API_URL=http://{args.host}:{args.port}{API_PATH}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        logger.info(f"Answered {config.requests} requests, {config.errors} with injected errors")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+"""
+Helpers shared by all generator variants (packaging, validation, serialisation).
+
+The variant folders import this package by adding the repository root to
+sys.path, so everything in here must only depend on the standard library.
+"""
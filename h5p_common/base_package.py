@@ -0,0 +1,272 @@
+"""
+Precompiled base packages.
+
+Every book built from a template shares the same library folders and template
+media. compile_base() writes those entries once, already compressed, to
+<template>.base.<mode>.zip next to the template, together with a JSON sidecar
+describing its contents. build_from_base() appends content.json, h5p.json and
+the book's own files to a copy of that archive: only the new members and a
+fresh central directory are written, the base members are copied as-is.
+
+A pruned base holds the dependency closure of the template's h5p.json. A book
+that needs further template libraries gets them appended to its own package;
+the stored base never changes with the books built from it.
+
+Compile ahead of time with:
+    python -m h5p_common.base_package JR/templates/template.zip [--prune [--drop-editor-libraries]]
+Otherwise the artifact is compiled on first use.
+"""
+import argparse
+import hashlib
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+import zipfile
+import zlib
+from pathlib import Path
+
+from h5p_common import packaging, resources, timing
+
+logger = logging.getLogger(__name__)
+
+# 2: metadata records the sha256 of the base zip
+BASE_FORMAT_VERSION = 2
+LIBRARY_DEPENDENCY_KEYS = ("preloadedDependencies", "dynamicDependencies", "editorDependencies")
+
+# base artifact path -> (template (mtime, size), base bytes, metadata)
+_base_cache = {}
+resources.on_clear(_base_cache.clear)
+# base artifact path -> lock, so concurrent cold requests compile each base once
+_base_locks = {}
+_base_locks_guard = threading.Lock()
+
+
+def cached_base_count() -> int:
+    """Number of base packages held in memory by this process."""
+    return len(_base_cache)
+
+
+def base_mode(prune: bool, keep_editor_libraries: bool) -> str:
+    """Name of the artifact flavour for the given pruning options."""
+    if not prune:
+        return "full"
+    return "editor" if keep_editor_libraries else "runtime"
+
+
+def base_paths(template_zip_path: str, mode: str) -> tuple:
+    """Returns (base zip path, metadata path) stored next to the template."""
+    template = Path(template_zip_path)
+    return (template.with_name(f"{template.stem}.base.{mode}.zip"),
+            template.with_name(f"{template.stem}.base.{mode}.json"))
+
+
+def _template_stamp(template_zip_path: str) -> tuple:
+    stat = Path(template_zip_path).stat()
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _file_sha256(path) -> str:
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+
+def _base_lock(base_zip_path: Path) -> threading.Lock:
+    with _base_locks_guard:
+        return _base_locks.setdefault(base_zip_path, threading.Lock())
+
+
+def _write_atomic(path: Path, data: bytes):
+    """Replaces path in one step, so other processes never read a partly written file."""
+    with tempfile.NamedTemporaryFile("wb", dir=path.parent, prefix=path.name, suffix=".tmp",
+                                     delete=False) as f_tmp:
+        f_tmp.write(data)
+    try:
+        os.replace(f_tmp.name, path)
+    except OSError:
+        Path(f_tmp.name).unlink(missing_ok=True)
+        raise
+
+
+def _is_intact(base_bytes: bytes, meta: dict) -> bool:
+    """True if the base zip is the one its metadata describes and every member passes its CRC check."""
+    if hashlib.sha256(base_bytes).hexdigest() != meta.get("base_sha256"):
+        return False
+    try:
+        with zipfile.ZipFile(io.BytesIO(base_bytes)) as base_zip:
+            return base_zip.testzip() is None
+    except (zipfile.BadZipFile, zlib.error, EOFError, ValueError):
+        return False
+
+
+# --- Compilation ---
+def compile_base(template_zip_path: str, prune: bool = False, keep_editor_libraries: bool = True,
+                 extra_roots: set = frozenset(), write: bool = True) -> tuple:
+    """
+    Compiles the base package of a template.
+
+    :param template_zip_path: Path to the template .zip file.
+    :param prune: Only keep the dependency closure of the template's h5p.json plus extra_roots.
+    :param keep_editor_libraries: When pruning, also keep the editor libraries of that closure.
+    :param extra_roots: Additional library folders (e.g. "H5P.Summary-1.10") the books need.
+    :param write: Store the artifact next to the template.
+    :return: (base zip bytes, metadata dict). Raises on I/O or zip errors.
+    """
+    entries = packaging.read_template_entries(template_zip_path)
+    entries.pop(packaging.CONTENT_JSON_NAME, None)
+    template_h5p = entries.pop(packaging.H5P_JSON_NAME, None)
+
+    roots = set(extra_roots)
+    if template_h5p is not None:
+        dependencies = json.loads(template_h5p[1]).get("preloadedDependencies", [])
+        roots.update(packaging.library_folder(dep) for dep in dependencies)
+
+    library_index = packaging.read_library_index(entries)
+    if prune:
+        needed = packaging.dependency_closure(roots, library_index, keep_editor_libraries)
+        packaging.prune_libraries(entries, needed)
+
+    in_memory_zip = io.BytesIO()
+    with zipfile.ZipFile(in_memory_zip, 'w', zipfile.ZIP_DEFLATED) as base_zip:
+        for info, data in entries.values():
+            base_zip.writestr(info, data)
+    base_bytes = in_memory_zip.getvalue()
+
+    meta = {
+        "format": BASE_FORMAT_VERSION,
+        "template_sha256": _file_sha256(template_zip_path),
+        "base_sha256": hashlib.sha256(base_bytes).hexdigest(),
+        "mode": base_mode(prune, keep_editor_libraries),
+        "roots": sorted(roots),
+        "libraries": sorted({packaging.entry_library(name) for name in entries} - {None}),
+        # Only the dependency lists, so closures can be computed without opening the zip
+        "dependencies": {
+            folder: {key: library[key] for key in LIBRARY_DEPENDENCY_KEYS if key in library}
+            for folder, library in library_index.items()
+        },
+        "entries": sorted(name.lower() for name in entries),
+        "media": {
+            hashlib.sha256(data).hexdigest(): name
+            for name, (_, data) in reversed(entries.items()) if packaging.is_media_entry(name)
+        },
+    }
+
+    if write:
+        base_zip_path, base_meta_path = base_paths(template_zip_path, meta["mode"])
+        try:
+            # The sidecar records the zip's hash, so a pair mixed from two writers is detected on reading
+            _write_atomic(base_zip_path, base_bytes)
+            _write_atomic(base_meta_path, json.dumps(meta, indent=2).encode("utf-8"))
+            logger.info(f"Compiled base package {base_zip_path} ({len(entries)} entries)")
+        except OSError as e:
+            logger.warning(f"Could not store base package next to the template: {e}")
+
+    return base_bytes, meta
+
+
+def _read_base(template_zip_path: str, prune: bool, keep_editor_libraries: bool) -> tuple:
+    """Loads the stored artifact if it matches the template, compiling it otherwise."""
+    base_zip_path, base_meta_path = base_paths(template_zip_path, base_mode(prune, keep_editor_libraries))
+    if base_zip_path.exists() and base_meta_path.exists():
+        try:
+            meta = json.loads(base_meta_path.read_text(encoding="utf-8"))
+            if (meta.get("format") == BASE_FORMAT_VERSION
+                    and meta.get("template_sha256") == _file_sha256(template_zip_path)):
+                base_bytes = base_zip_path.read_bytes()
+                if _is_intact(base_bytes, meta):
+                    return base_bytes, meta
+                logger.warning(f"Base package {base_zip_path} is damaged, recompiling")
+            else:
+                logger.info(f"Base package {base_zip_path} is out of date, recompiling")
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read base package {base_zip_path}: {e}")
+    return compile_base(template_zip_path, prune, keep_editor_libraries)
+
+
+def load_base(template_zip_path: str, prune: bool, keep_editor_libraries: bool) -> tuple:
+    """Returns (base zip bytes, metadata) for the template, cached per process."""
+    base_zip_path, _ = base_paths(template_zip_path, base_mode(prune, keep_editor_libraries))
+    stamp = _template_stamp(template_zip_path)
+    with _base_lock(base_zip_path):
+        cached = _base_cache.get(base_zip_path)
+        timing.cache_lookup("base_package", hit=cached is not None and cached[0] == stamp)
+        if cached is None or cached[0] != stamp:
+            cached = (stamp, *_read_base(template_zip_path, prune, keep_editor_libraries))
+            _base_cache[base_zip_path] = cached
+        _, base_bytes, meta = cached
+    return base_bytes, meta
+
+
+def missing_libraries(meta: dict, roots: set, keep_editor_libraries: bool) -> set:
+    """Template library folders the book with these roots needs but the base left out."""
+    needed = packaging.dependency_closure(roots, meta["dependencies"], keep_editor_libraries)
+    return (needed & meta["dependencies"].keys()) - set(meta["libraries"])
+
+
+# --- Package assembly ---
+def build_from_base(content_json: bytes, h5p_json: bytes, template_zip_path: str, files: list,
+                    prune: bool = False, keep_editor_libraries: bool = True,
+                    date_time: tuple = None) -> bytes | None:
+    """
+    Builds the package by appending the book to the template's base package.
+    Same arguments as packaging.build_package, date_time as in packaging.write_entry.
+
+    :return: Bytes of the H5P package, or None when the book replaces a template entry
+             and has to go through packaging.build_package instead.
+    """
+    new_files = {packaging.to_package_path(filename): data for filename, data in files}
+    base_bytes, meta = load_base(template_zip_path, prune, keep_editor_libraries)
+
+    base_entries = set(meta["entries"])
+    overridden = [name for name in new_files if name.lower() in base_entries]
+    if overridden:
+        logger.info(f"{overridden} replace template entries, building without the base package")
+        return None
+
+    # Libraries beyond the template's own closure go into this package only, the base stays as compiled
+    library_entries = {}
+    if prune:
+        roots = packaging.referenced_libraries(content_json, h5p_json)
+        missing = missing_libraries(meta, roots, keep_editor_libraries)
+        if missing:
+            logger.info(f"Adding {sorted(missing)} from the template, the base package leaves them out")
+            library_entries = {name: entry for name, entry in packaging.read_template_entries(template_zip_path).items()
+                               if packaging.entry_library(name) in missing}
+
+    entries = {name: (None, data) for name, data in new_files.items()}
+    stored_media = {bytes.fromhex(digest): name for digest, name in meta["media"].items()}
+    aliases = packaging.deduplicate_media(entries, stored_media)
+    if aliases:
+        logger.info(f"Stored {len(aliases)} duplicate media file(s) once: {aliases}")
+        content_json = packaging.rewrite_path_references(content_json, aliases)
+
+    # Append mode keeps the base members untouched and rewrites the central directory on close
+    in_memory_zip = io.BytesIO(base_bytes)
+    with zipfile.ZipFile(in_memory_zip, 'a', zipfile.ZIP_DEFLATED) as new_zip:
+        packaging.write_entry(new_zip, packaging.CONTENT_JSON_NAME, content_json, date_time)
+        packaging.write_entry(new_zip, packaging.H5P_JSON_NAME, h5p_json, date_time)
+        for name, (_, data) in entries.items():
+            packaging.write_entry(new_zip, name, data, date_time)
+        for info, data in library_entries.values():
+            new_zip.writestr(info, data)
+
+    return in_memory_zip.getvalue()
+
+
+# --- CLI ---
+def main():
+    parser = argparse.ArgumentParser(description="Precompile the base package of one or more H5P templates")
+    parser.add_argument("templates", nargs="+", help="Paths to template.zip files")
+    parser.add_argument("--prune", action="store_true", help="Only keep the libraries the template needs")
+    parser.add_argument("--drop-editor-libraries", action="store_true",
+                        help="When pruning, also drop the editor libraries (the H5P importer may then reject the package)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    for template_zip_path in args.templates:
+        compile_base(template_zip_path, prune=args.prune, keep_editor_libraries=not args.drop_editor_libraries)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Deterministic subContentIds.
+
+The builders give every sub-content a random uuid4, so the same input never
+produces the same content.json twice. assign_deterministic_ids() replaces them
+with uuid5 values derived from a book namespace and the structural path of
+each node (e.g. "/chapters/2/params/content/0/content"): rebuilding a book from
+the same input yields identical bytes, while different books stay distinct.
+"""
+import uuid
+
+# Parent namespace of all book namespaces
+ROOT_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "h5p-booklet-generator/subContentId")
+
+
+def book_namespace(name) -> uuid.UUID:
+    """Namespace UUID of a book, e.g. from its title or source file name. UUIDs are used as-is."""
+    if isinstance(name, uuid.UUID):
+        return name
+    return uuid.uuid5(ROOT_NAMESPACE, str(name))
+
+
+def assign_deterministic_ids(structure, namespace) -> int:
+    """
+    Replaces every "subContentId" in structure (in place) with a uuid5 of its path.
+
+    A node shared between several places keeps the id of its first path in document
+    order, as it would with random ids. Fragments (see serialization.py) are constant
+    and left alone.
+
+    :param structure: content.json dictionary as returned by a booklet generator.
+    :param namespace: Book name or UUID, see book_namespace().
+    :return: Number of ids assigned.
+    """
+    book = book_namespace(namespace)
+    visited = set()
+    assigned = 0
+    pending = [(structure, "")]
+    while pending:
+        node, path = pending.pop()
+        if isinstance(node, dict):
+            items = node.items()
+        elif isinstance(node, list):
+            items = enumerate(node)
+        else:
+            continue
+        if id(node) in visited:
+            continue
+        visited.add(id(node))
+
+        if isinstance(node, dict) and "subContentId" in node:
+            node["subContentId"] = str(uuid.uuid5(book, path or "/"))
+            assigned += 1
+        # Reversed so nodes are visited in document order
+        children = [(value, f"{path}/{key}") for key, value in items if isinstance(value, (dict, list))]
+        pending.extend(reversed(children))
+    return assigned
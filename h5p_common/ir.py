@@ -0,0 +1,506 @@
+"""
+Typed intermediate representation (IR) of a booklet.
+
+Input is parsed once into these slotted dataclasses, one parser per input format:
+
+    parse_chapter_list()   "type"-tagged chapter list (autoimage, JR, JRautoimage)
+    parse_podcast_book()   chapter1..chapter3 dict (h5p_podcast_gem)
+    parse_iframe_book()    chapter1..chapter5 dict (h5p_iframe_gem, h5p_iframe_text)
+
+The defaults of each input format are applied while parsing, so the per-type
+emitters in the variants' booklet generators only read attributes.
+"""
+import logging
+from dataclasses import dataclass, field
+
+logger = logging.getLogger(__name__)
+
+
+# --- Building blocks ---
+@dataclass(slots=True)
+class Image:
+    path: str
+    mime: str = "image/png"
+    copyright: dict | None = None  # Raw copyright input, see utils_booklet.parse_copyright_info
+
+
+@dataclass(slots=True)
+class Answer:
+    text: str = ""
+    correct: bool = False
+    feedback: str = ""
+    tip: str = ""
+
+
+@dataclass(slots=True)
+class Question:
+    kind: str  # "multichoice" or "truefalse"
+    text: str = ""
+    answers: list = field(default_factory=list)  # Answer, multichoice only
+    correct: bool = False  # truefalse only
+    feedback_correct: str = ""
+    feedback_wrong: str = ""
+
+
+@dataclass(slots=True)
+class ClozeTask:
+    """A Drag the Words task. distractors are already in H5P '*word*' syntax."""
+    title: str
+    description: str = ""
+    text: str = ""
+    distractors: str = ""
+
+
+@dataclass(slots=True)
+class AccordionPanel:
+    title: str = ""
+    text: str = ""
+
+
+@dataclass(slots=True)
+class Accordion:
+    title: str = "Zusammenfassung"
+    panels: list = field(default_factory=list)  # AccordionPanel
+
+
+@dataclass(slots=True)
+class IFrameEmbed:
+    source: str | None
+    width: str = "800"
+    height: str = "600"
+    min_width: str = "300"
+    title: str | None = None
+
+
+@dataclass(slots=True)
+class MemoryPair:
+    image: Image | None
+    match: Image | None
+    image_alt: str = ""
+    match_alt: str = ""
+    description: str = ""
+
+
+@dataclass(slots=True)
+class SummaryTask:
+    statements: list  # Correct statement first
+    tip: str = ""
+
+
+@dataclass(slots=True)
+class Summary:
+    title: str = "Zusammenfassung"
+    intro: str = ""
+    tasks: list = field(default_factory=list)  # SummaryTask
+
+
+@dataclass(slots=True)
+class SingleChoice:
+    question: str = ""
+    answers: list = field(default_factory=list)  # str, correct answer first
+
+
+@dataclass(slots=True)
+class SingleChoiceSet:
+    title: str = "Single Choice"
+    choices: list = field(default_factory=list)  # SingleChoice
+
+
+@dataclass(slots=True)
+class Interaction:
+    """A task shown on the interactive video at start_time (seconds)."""
+    start_time: int
+    action: Summary | SingleChoiceSet | ClozeTask
+
+
+@dataclass(slots=True)
+class InteractiveVideo:
+    title: str = "Interaktives Video"
+    interactions: list = field(default_factory=list)  # Interaction
+    final_summary: Summary | None = None
+    endscreen_time: int = 432
+
+
+@dataclass(slots=True)
+class SectionIntro:
+    """HTML heading and instruction above a chapter's main element."""
+    title: str = ""
+    instruction: str = ""
+
+
+@dataclass(slots=True)
+class QuestionPool:
+    title: str = "Fragenset"
+    intro_page_title: str = "Verständnisfragen"
+    intro_page_text: str = ""
+    pool_size: int = 10
+    questions: list = field(default_factory=list)  # Question
+
+
+# --- Chapters of the chapter-list format ---
+@dataclass(slots=True)
+class Introduction:
+    title: str = "Willkommen"
+    welcome_text: str = ""
+    objectives: list = field(default_factory=list)  # str
+    workflow: list = field(default_factory=list)  # str
+
+
+@dataclass(slots=True)
+class MemoryGame:
+    title: str | None = None
+    instruction: str = ""
+    pairs: list = field(default_factory=list)  # MemoryPair
+    theme_color: str = "#002f6c"
+    card_back: Image | None = None
+
+
+@dataclass(slots=True)
+class VideoPage:
+    title: str | None
+    video: IFrameEmbed
+    summary: Accordion
+
+
+@dataclass(slots=True)
+class QuestionSet:
+    title: str | None = None
+    intro_title: str = "Quiz"
+    intro_text: str = ""
+    background_image: Image | None = None
+    questions: list = field(default_factory=list)  # Question
+
+
+@dataclass(slots=True)
+class ClozeSet:
+    title: str | None = None
+    intro_title: str = "Quiz"
+    intro_text: str = ""
+    background_image: Image | None = None
+    tasks: list = field(default_factory=list)  # ClozeTask
+
+
+@dataclass(slots=True)
+class IFramePage:
+    title: str | None
+    embed: IFrameEmbed
+    top_text: str = ""
+    include_video_summary: bool = False  # Repeat the summary accordion of the video page
+
+
+# --- Chapters of the podcast and iframe formats ---
+@dataclass(slots=True)
+class IntroChapter:
+    title: str = "Einleitung"
+    heading: str = ""
+    guidance: str = ""
+    bullet_points: list = field(default_factory=list)  # HTML <li> items
+    accordion: Accordion = field(default_factory=lambda: Accordion(title="Begriffe"))
+
+
+@dataclass(slots=True)
+class VideoChapter:
+    title: str = "Video"
+    intro: SectionIntro = field(default_factory=SectionIntro)
+    video: InteractiveVideo = field(default_factory=InteractiveVideo)
+
+
+@dataclass(slots=True)
+class IFrameChapter:
+    title: str = "Beitrag"
+    intro: SectionIntro = field(default_factory=SectionIntro)
+    embed: IFrameEmbed = field(default_factory=lambda: IFrameEmbed(""))
+
+
+@dataclass(slots=True)
+class SummaryChapter:
+    title: str = "Zusammenfassung"
+    intro: SectionIntro = field(default_factory=SectionIntro)
+    summary: Summary = field(default_factory=Summary)
+
+
+@dataclass(slots=True)
+class QuestionChapter:
+    title: str = "Verständnisfragen"
+    intro: SectionIntro = field(default_factory=SectionIntro)
+    pool: QuestionPool = field(default_factory=QuestionPool)
+
+
+@dataclass(slots=True)
+class AssignmentChapter:
+    title: str = "Aufgabe"
+    data: dict = field(default_factory=dict)  # Raw input, see utils_booklet.generate_assignment_iframe_url
+
+
+@dataclass(slots=True)
+class Book:
+    chapters: list  # Chapter objects in reading order
+    cover_description: str = ""
+    show_cover_page: bool = True
+
+
+# --- Shared parsers ---
+def parse_image(value) -> Image | None:
+    """Accepts a path or a {"path", "mime", "copyright"} dict; None if there is no path."""
+    if not value:
+        return None
+    if isinstance(value, str):
+        mime = "image/jpeg" if value.lower().endswith(('.jpg', '.jpeg')) else "image/png"
+        return Image(value, mime)
+    if not value.get("path"):
+        return None
+    return Image(value["path"], value.get("mime", "image/png"), value.get("copyright"))
+
+
+def parse_accordion(items: list, title: str = "Zusammenfassung") -> Accordion:
+    return Accordion(title, [AccordionPanel(item.get("title", ""), item.get("text", "")) for item in items])
+
+
+def parse_summary(summary_data: dict, default_intro: str) -> Summary:
+    """Statement groups ({"statements": [{"text", "isCorrect"}], "tip"}) of an H5P.Summary."""
+    tasks = []
+    for group in summary_data.get("statementGroups", []):
+        correct_statement = ""
+        incorrect_statements = []
+        for statement in group.get("statements", []):
+            if statement.get("isCorrect"):
+                correct_statement = statement.get("text", "")
+            else:
+                incorrect_statements.append(statement.get("text", ""))
+        statements = [correct_statement] + incorrect_statements if correct_statement else incorrect_statements
+        tasks.append(SummaryTask(statements, group.get("tip", "")))
+    return Summary(summary_data.get("interactionTitle", "Zusammenfassung"),
+                   summary_data.get("introText", default_intro), tasks)
+
+
+def parse_section_intro(section_data: dict) -> SectionIntro:
+    return SectionIntro(section_data.get("title", ""), section_data.get("instruction", ""))
+
+
+# --- Chapter-list format ---
+def parse_chapter_list_question(question_data: dict) -> Question | None:
+    """{"type": "multichoice"|"truefalse", ...}; other types are skipped."""
+    kind = question_data.get("type")
+    if kind == "multichoice":
+        answers = [Answer(answer.get("text", ""), bool(answer.get("correct")), answer.get("feedback", ""))
+                   for answer in question_data.get("answers", [])]
+        return Question(kind, question_data.get("question", ""), answers)
+    if kind == "truefalse":
+        return Question(kind, question_data.get("question", ""), correct=bool(question_data.get("correct")),
+                        feedback_correct=question_data.get("feedback_correct", ""),
+                        feedback_wrong=question_data.get("feedback_wrong", ""))
+    return None
+
+
+def _parse_memory_pairs(cards: list) -> list:
+    pairs = []
+    # Cards come in consecutive (image, match) pairs; an odd last card is dropped
+    for i in range(0, len(cards) - 1, 2):
+        item_a = cards[i].get("image", {})
+        item_b = cards[i + 1].get("image", {})
+        pairs.append(MemoryPair(
+            parse_image(item_a), parse_image(item_b),
+            image_alt="" if isinstance(item_a, str) else item_a.get("imageAlt", ""),
+            match_alt="" if isinstance(item_b, str) else item_b.get("matchAlt", ""),
+            description="" if isinstance(item_a, str) else item_a.get("description", ""),
+        ))
+    return pairs
+
+
+def _parse_intro_screen(chapter_data: dict) -> dict:
+    intro_screen = chapter_data.get("intro_screen", {})
+    return {
+        "intro_title": intro_screen.get("title", "Quiz"),
+        "intro_text": intro_screen.get("text", ""),
+        "background_image": parse_image(intro_screen.get("background_image")),
+    }
+
+
+def parse_chapter(chapter_data: dict):
+    """Parses one {"type": ...} chapter. Returns None for unknown types."""
+    c_type = chapter_data.get("type")
+
+    if c_type == "introduction":
+        intro_data = chapter_data.get("data", {})
+        return Introduction(intro_data.get("title", "Willkommen"), intro_data.get("welcome_text", ""),
+                            list(intro_data.get("learning_objectives", [])), list(intro_data.get("workflow", [])))
+
+    if c_type == "memory_game":
+        return MemoryGame(chapter_data.get("title"), chapter_data.get("instruction", ""),
+                          _parse_memory_pairs(chapter_data.get("cards", [])),
+                          chapter_data.get("themeColor", "#002f6c"),
+                          parse_image(chapter_data.get("card_back_image", "images/card_back.png")))
+
+    if c_type == "video_page":
+        video_data = chapter_data.get("video", {})
+        video = IFrameEmbed(video_data.get("url"), str(video_data.get("width", 800)),
+                            str(video_data.get("height", 400)), "300", "Video")
+        return VideoPage(chapter_data.get("title"), video, parse_accordion(chapter_data.get("summary_accordion", [])))
+
+    if c_type == "question_set":
+        questions = map(parse_chapter_list_question, chapter_data.get("questions", []))
+        return QuestionSet(chapter_data.get("title"), **_parse_intro_screen(chapter_data),
+                           questions=[question for question in questions if question is not None])
+
+    if c_type == "cloze_set":
+        tasks = [ClozeTask(task.get("description", "Cloze"), task.get("description", ""),
+                           task.get("text_content", ""), task.get("distractors", ""))
+                 for task in chapter_data.get("tasks", [])]
+        return ClozeSet(chapter_data.get("title"), **_parse_intro_screen(chapter_data), tasks=tasks)
+
+    if c_type == "iframe_page":
+        embed_data = chapter_data.get("embed", {})
+        embed = IFrameEmbed(embed_data.get("source"), str(embed_data.get("width", "100%")),
+                            str(embed_data.get("height", "600")), str(embed_data.get("minWidth", "300")),
+                            chapter_data.get("title"))
+        return IFramePage(chapter_data.get("title"), embed, chapter_data.get("top_text", ""),
+                          bool(chapter_data.get("include_accordion_ref")))
+
+    return None
+
+
+def parse_chapter_list(chapters_data: list) -> list:
+    """Parses a list of {"type": ...} chapters, skipping invalid entries and unknown types."""
+    chapters = []
+    for chapter_data in chapters_data:
+        if not isinstance(chapter_data, dict):
+            logger.warning(f"Skipping invalid chapter data: {chapter_data}")
+            continue
+        chapter = parse_chapter(chapter_data)
+        if chapter is not None:
+            chapters.append(chapter)
+    return chapters
+
+
+# --- Podcast and iframe formats ---
+def parse_book_question(question_data: dict) -> Question | None:
+    """{"type": "MultipleChoice"|"TrueFalse", ...} as produced for the podcast and iframe books."""
+    q_type = question_data.get("type", "").strip()
+    if q_type == "MultipleChoice":
+        answers = [Answer(option.get("text", ""), option.get("is_correct", False),
+                          option.get("feedback", ""), option.get("tip", ""))
+                   for option in question_data.get("options", [])]
+        return Question("multichoice", question_data.get("question", "N/A"), answers)
+    if q_type == "TrueFalse":
+        return Question("truefalse", question_data.get("question", "N/A"),
+                        correct=bool(question_data.get("correct_answer")),
+                        feedback_correct=question_data.get("feedback_correct", ""),
+                        feedback_wrong=question_data.get("feedback_incorrect", ""))
+    logger.warning(f"Unsupported question type '{q_type}'. Skipping.")
+    return None
+
+
+def parse_book_questions(questions_data) -> list:
+    if not isinstance(questions_data, list):
+        logger.warning("Questions data is not a list.")
+        return []
+    questions = map(parse_book_question, questions_data)
+    return [question for question in questions if question is not None]
+
+
+def _parse_intro_chapter(chapter_data: dict, bullet_points_key: str) -> IntroChapter:
+    content_data = chapter_data.get("introductionContent", {})
+    accordion_data = chapter_data.get("accordion", {})
+    panels = [AccordionPanel(item.get("term", "N/A"), item.get("definition", ""))
+              for item in accordion_data.get("definitions", [])]
+    return IntroChapter(chapter_data.get("titleForChapter", "Einleitung"),
+                        content_data.get("title", ""), content_data.get("guidanceText", ""),
+                        list(content_data.get(bullet_points_key, [])),
+                        Accordion(accordion_data.get("titleForElement", "Begriffe"), panels))
+
+
+def _parse_interaction(interaction_data: dict) -> Interaction | None:
+    interaction_type = interaction_data.get("type")
+    if interaction_type == "Summary":
+        action = parse_summary(interaction_data, "<p>Wähle die korrekten Aussagen.</p>")
+    elif interaction_type == "SingleChoiceSet":
+        choices = [SingleChoice(choice.get("question", ""), choice.get("answers", []))
+                   for choice in interaction_data.get("choices", [])]
+        action = SingleChoiceSet(interaction_data.get("interactionTitle", "Single Choice"), choices)
+    elif interaction_type == "DragTheWords":
+        # "word1, word2" -> "*word1* *word2*"
+        distractors = interaction_data.get("distractors", "")
+        distractors = " ".join(f"*{word.strip()}*" for word in distractors.split(',') if word.strip()) if distractors else ""
+        action = ClozeTask(interaction_data.get("interactionTitle", "Drag the Words"),
+                           interaction_data.get("taskDescription", "Ziehe die Wörter in die richtigen Felder!"),
+                           interaction_data.get("textField", "Lückentext hier. *Lücke*."), distractors)
+    else:
+        logger.warning(f"Unknown interaction type '{interaction_type}' found. Skipping.")
+        return None
+    return Interaction(interaction_data.get("startTime", 0), action)
+
+
+def _parse_interactive_video(video_data: dict) -> InteractiveVideo:
+    interactions = map(_parse_interaction, video_data.get("interactions", []))
+    final_summary_data = video_data.get("finalSummary")
+    return InteractiveVideo(
+        video_data.get("titleForElement", "Interaktives Video"),
+        [interaction for interaction in interactions if interaction is not None],
+        parse_summary(final_summary_data, "<p>Wähle die korrekten Aussagen.</p>") if final_summary_data else None,
+        video_data.get("videoDurationForEndscreen") or 432,
+    )
+
+
+def _parse_cover(book_data: dict) -> dict:
+    cover_page_data = book_data.get("coverPage", {})
+    return {
+        "cover_description": f"{cover_page_data.get('title', '<h1>Cover Title</h1>')}{cover_page_data.get('subtitle', '')}",
+        "show_cover_page": book_data.get("showCoverPage", True),
+    }
+
+
+def parse_podcast_book(data: dict) -> Book:
+    """Parses the combined input of the podcast variant (book, chapter1..chapter3)."""
+    ch2_data = data.get("chapter2_video", {})
+    ch3_data = data.get("chapter3_questions", {})
+    qs_data = ch3_data.get("questionSet", {})
+
+    chapters = [
+        _parse_intro_chapter(data.get("chapter1_introduction", {}), "learningObjectives"),
+        VideoChapter(ch2_data.get("titleForChapter", "Video"),
+                     parse_section_intro(ch2_data.get("videoSectionIntro", {})),
+                     _parse_interactive_video(ch2_data.get("interactiveVideo", {}))),
+        QuestionChapter(ch3_data.get("titleForChapter", "Verständnisfragen"),
+                        parse_section_intro(ch3_data.get("questionSectionIntro", {})),
+                        QuestionPool(qs_data.get("titleForElement", "Fragenset"),
+                                     qs_data.get("titleForElement", "Verständnisfragen"), "", 10,
+                                     parse_book_questions(qs_data.get("questions", [])))),
+    ]
+    return Book(chapters, **_parse_cover(data.get("book", {})))
+
+
+def parse_iframe_book(data: dict) -> Book:
+    """Parses the combined input of the iframe variants (book, chapter1..chapter5, iframeUrl)."""
+    ch2_data = data.get("chapter2_iframe", {})
+    ch3_data = data.get("chapter3_summary", {})
+    ch4_data = data.get("chapter4_questions", {})
+    ch5_data = data.get("chapter5_assignment")
+
+    embed_data = ch2_data.get("iframeEmbed", {})
+    embed = IFrameEmbed(data.get("iframeUrl", ""), embed_data.get("width", "700"), embed_data.get("height", "500"),
+                        embed_data.get("minWidth", "400"), embed_data.get("titleForElement", "Externer Inhalt"))
+
+    summary_data = ch3_data.get("summaryElement", {})
+    summary = Summary(summary_data.get("titleForElement", "Zusammenfassung"),
+                      summary_data.get("introText", "<p>Wähle die korrekte Aussage.</p>"),
+                      [SummaryTask(task.get("choices", ["Placeholder - no choices provided"]), task.get("tip", ""))
+                       for task in summary_data.get("summaries", [])])
+
+    qs_data = ch4_data.get("questionSet", {})
+    pool = QuestionPool(qs_data.get("titleForElement", "Fragenset"),
+                        qs_data.get("introPageTitle", "Verständnisfragen Quiz"),
+                        qs_data.get("introPageIntroduction", ""), qs_data.get("poolSize", 10),
+                        parse_book_questions(qs_data.get("questions", [])))
+
+    chapters = [
+        _parse_intro_chapter(data.get("chapter1_introduction", {}), "bulletPoints"),
+        IFrameChapter(ch2_data.get("titleForChapter", "Beitrag"),
+                      parse_section_intro(ch2_data.get("iframeSectionIntro", {})), embed),
+        SummaryChapter(ch3_data.get("titleForChapter", "Zusammenfassung"),
+                       parse_section_intro(ch3_data.get("summarySectionIntro", {})), summary),
+        QuestionChapter(ch4_data.get("titleForChapter", "Verständnisfragen"),
+                        parse_section_intro(ch4_data.get("questionSectionIntro", {})), pool),
+    ]
+    if ch5_data:
+        chapters.append(AssignmentChapter(ch5_data.get("titleForChapter", "Aufgabe"), ch5_data))
+    return Book(chapters, **_parse_cover(data.get("book", {})))
@@ -0,0 +1,153 @@
+"""
+Lazy imports and import-time profiling.
+
+Heavy third-party modules (google.generativeai, cv2, numpy, requests, Pillow)
+take up most of the start-up time of the CLI and the Streamlit apps, even in
+runs that never touch them. A module bound with module() is only imported on
+first attribute access:
+
+    cv2 = lazy.module("cv2")
+    np = lazy.module("numpy")
+
+    def decode(data):
+        return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+
+A missing module still raises ImportError, at first use instead of at import.
+
+ImportProfiler records how long each module took to import, e.g. behind an
+--import-profile option:
+
+    profiler = lazy.ImportProfiler().start()
+    ...
+    print(profiler.report())
+"""
+import importlib
+import sys
+import threading
+import time
+
+_import_lock = threading.Lock()
+
+
+class LazyModule:
+    """Stand-in for a module that imports it on first attribute access."""
+
+    def __init__(self, name: str):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            with _import_lock:
+                module = self.__dict__["_module"]
+                if module is None:
+                    module = importlib.import_module(self._name)
+                    self.__dict__["_module"] = module
+        return module
+
+    def __getattr__(self, attribute: str):
+        return getattr(self._load(), attribute)
+
+    def __setattr__(self, attribute: str, value):
+        setattr(self._load(), attribute, value)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = "loaded" if self.__dict__["_module"] is not None else "not loaded"
+        return f"<lazy module '{self._name}' ({state})>"
+
+
+def module(name: str) -> LazyModule:
+    """Lazily imported module, e.g. module("PIL.Image") in place of "from PIL import Image"."""
+    return LazyModule(name)
+
+
+# --- Import profiling ---
+class _TimedLoader:
+    """Wraps a module loader, timing exec_module() of one module."""
+
+    def __init__(self, loader, name: str, profiler: "ImportProfiler"):
+        self._loader = loader
+        self._name = name
+        self._profiler = profiler
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        self._profiler._enter()
+        started = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._profiler._leave(self._name, time.perf_counter() - started)
+
+    def __getattr__(self, attribute: str):
+        return getattr(self._loader, attribute)
+
+
+class ImportProfiler:
+    """
+    Meta path finder recording the import time of every module imported while it is active.
+
+    Times are inclusive (a module's own code plus the modules it imports first) and
+    exclusive ("self", without the nested imports). Modules imported before start()
+    are not recorded.
+    """
+
+    def __init__(self):
+        # module name -> (inclusive seconds, self seconds)
+        self.timings = {}
+        self._local = threading.local()
+
+    def start(self) -> "ImportProfiler":
+        if self not in sys.meta_path:
+            sys.meta_path.insert(0, self)
+        return self
+
+    def stop(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def find_spec(self, name, path=None, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                # Loaders without exec_module (legacy load_module) are not timed
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = _TimedLoader(spec.loader, name, self)
+                return spec
+        return None
+
+    def _enter(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        # Time spent in imports nested in the current one
+        stack.append(0.0)
+
+    def _leave(self, name: str, elapsed: float):
+        stack = self._local.stack
+        nested = stack.pop()
+        if stack:
+            stack[-1] += elapsed
+        # Modules imported again after being dropped from sys.modules add up
+        inclusive, own = self.timings.get(name, (0.0, 0.0))
+        self.timings[name] = (inclusive + elapsed, own + elapsed - nested)
+
+    def report(self, limit: int = 30) -> str:
+        """Table of the slowest imports by self time, plus the total."""
+        rows = sorted(self.timings.items(), key=lambda item: item[1][1], reverse=True)
+        total = sum(own for _, own in self.timings.values())
+        lines = [f"{'self ms':>9} {'cumul. ms':>9}  module"]
+        for name, (inclusive, own) in rows[:limit]:
+            lines.append(f"{own * 1000:9.1f} {inclusive * 1000:9.1f}  {name}")
+        if len(rows) > limit:
+            lines.append(f"{'':>9} {'':>9}  ... {len(rows) - limit} more")
+        lines.append(f"{total * 1000:9.1f} {'':>9}  total, {len(rows)} modules")
+        return "\n".join(lines)
@@ -0,0 +1,339 @@
+"""
+Content-addressed store for the H5P libraries shared by the variant templates.
+
+The template.zip files of the variants carry largely the same library folders.
+Importing them into the store keeps every file once:
+
+    library_store/
+        blobs/<sha[:2]>/<sha>                 file bytes, named by their sha256
+        libraries/<Machine.Name-1.2.3>.json   one library version: path -> file record
+        manifests/<variant>.json              one template: library versions + remaining files
+
+A file record holds the sha256 and the zip attributes needed to rebuild the
+original entry. Directory entries are kept with the manifest's files, so library
+indexes only hold files. Templates are materialised from the store on demand and
+cached per process, with the blobs shared between all variants. A template.zip is
+only re-hashed to check it against its manifest when its mtime or size changed.
+
+    python -m h5p_common.library_store import JR JR/templates/template.zip
+    python -m h5p_common.library_store upgrade path/to/H5P.Column-1.18.h5p
+    python -m h5p_common.library_store materialize JR /tmp/template.zip
+
+Set H5P_LIBRARY_STORE to use a store outside the repository.
+"""
+import argparse
+import copy
+import hashlib
+import io
+import json
+import logging
+import os
+import zipfile
+from pathlib import Path
+
+from h5p_common import resources
+
+logger = logging.getLogger(__name__)
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# sha256 -> bytes, shared by every materialised template
+_blob_cache = {}
+# resolved template path -> (template (mtime, size), entries)
+_template_cache = {}
+# resolved template path -> variant name, built on first lookup
+_manifest_index = None
+# resolved template path -> (template (mtime, size), manifest template_sha256) already hashed.
+# Kept across reset_caches(): the manifest digest is part of the value.
+_verified_templates = {}
+
+
+def store_dir() -> Path:
+    return Path(os.environ.get("H5P_LIBRARY_STORE", REPO_ROOT / "library_store"))
+
+
+def _file_sha256(path) -> str:
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+
+def _read_json(path: Path) -> dict:
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def _write_json(path: Path, data: dict):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(data, indent=2, sort_keys=True), encoding="utf-8")
+
+
+@resources.on_clear
+def reset_caches():
+    """Forgets materialised templates, e.g. after an import or upgrade."""
+    global _manifest_index
+    _blob_cache.clear()
+    _template_cache.clear()
+    _manifest_index = None
+
+
+# --- Blobs ---
+def put_blob(data: bytes) -> str:
+    """Stores data under its sha256 (once) and returns the digest."""
+    digest = hashlib.sha256(data).hexdigest()
+    blob_path = store_dir() / "blobs" / digest[:2] / digest
+    if not blob_path.exists():
+        blob_path.parent.mkdir(parents=True, exist_ok=True)
+        blob_path.write_bytes(data)
+    return digest
+
+
+def get_blob(digest: str) -> bytes:
+    data = _blob_cache.get(digest)
+    if data is None:
+        data = (store_dir() / "blobs" / digest[:2] / digest).read_bytes()
+        _blob_cache[digest] = data
+    return data
+
+
+def _file_record(info: zipfile.ZipInfo, data: bytes) -> dict:
+    return {
+        "sha256": put_blob(data),
+        "date_time": list(info.date_time),
+        "external_attr": info.external_attr,
+        "create_system": info.create_system,
+        "compress_type": info.compress_type,
+    }
+
+
+def _zip_entry(name: str, record: dict) -> tuple:
+    """Rebuilds the (ZipInfo, bytes) pair of a stored file."""
+    info = zipfile.ZipInfo(name, date_time=tuple(record["date_time"]))
+    info.external_attr = record["external_attr"]
+    info.create_system = record["create_system"]
+    info.compress_type = record["compress_type"]
+    return info, get_blob(record["sha256"])
+
+
+# --- Import ---
+def _file_digests(files: dict) -> dict:
+    return {path: record["sha256"] for path, record in files.items()}
+
+
+def _content_digest(files: dict) -> str:
+    """sha256 over the paths and file digests of a library version."""
+    return hashlib.sha256(json.dumps(_file_digests(files), sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _split_entries(zip_obj: zipfile.ZipFile) -> tuple:
+    """
+    Groups zip entries into {library folder: {path in folder: (info, bytes)}} and the remaining
+    entries, directory entries included.
+    """
+    libraries, others = {}, {}
+    for info in zip_obj.infolist():
+        if info.is_dir():
+            # Templates differ in whether they list directories, library indexes must not
+            others[info.filename] = (info, b"")
+            continue
+        folder, sep, path = info.filename.partition("/")
+        entry = (info, zip_obj.read(info))
+        if sep and folder.lower() != "content":
+            libraries.setdefault(folder, {})[path] = entry
+        else:
+            others[info.filename] = entry
+    return libraries, others
+
+
+def import_libraries(libraries: dict) -> dict:
+    """
+    Stores library folders and returns {folder: library id}.
+    The id adds the patch version from library.json, e.g. "H5P.Column-1.18.5". A copy whose
+    files differ from the stored library of that id (e.g. a locally patched library) is stored
+    next to it as "H5P.Column-1.18.5+<content hash>", so other manifests keep the version they use.
+    """
+    library_ids = {}
+    for folder, files in libraries.items():
+        if "library.json" not in files:
+            logger.warning(f"Skipping {folder}: no library.json")
+            continue
+        library_json = json.loads(files["library.json"][1])
+        library_id = f"{folder}.{library_json.get('patchVersion', 0)}"
+        library_ids[folder] = library_id
+        index = {"files": {path: _file_record(info, data) for path, (info, data) in files.items()}}
+
+        # Copies that only differ in zip timestamps keep the stored index
+        index_path = store_dir() / "libraries" / f"{library_id}.json"
+        if index_path.exists():
+            stored_files = _read_json(index_path)["files"]
+            if _file_digests(stored_files) == _file_digests(index["files"]):
+                continue
+            variant_id = f"{library_id}+{_content_digest(index['files'])[:12]}"
+            logger.warning(f"Library {library_id} differs from the stored copy, storing it as {variant_id}")
+            library_id = library_ids[folder] = variant_id
+            index_path = store_dir() / "libraries" / f"{library_id}.json"
+            if index_path.exists():
+                continue
+        _write_json(index_path, index)
+    return library_ids
+
+
+def _template_stat(template_path: Path) -> list:
+    stat = template_path.stat()
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def import_template(variant: str, template_zip_path: str) -> dict:
+    """Imports a variant's template.zip into the store and writes its manifest."""
+    template_path = Path(template_zip_path).resolve()
+    with zipfile.ZipFile(template_path) as zip_obj:
+        libraries, others = _split_entries(zip_obj)
+
+    manifest = {
+        "template": template_path.relative_to(REPO_ROOT).as_posix(),
+        "template_sha256": _file_sha256(template_path),
+        "template_stat": _template_stat(template_path),
+        "libraries": import_libraries(libraries),
+        "files": {name: _file_record(info, data) for name, (info, data) in others.items()},
+    }
+    _write_json(store_dir() / "manifests" / f"{variant}.json", manifest)
+    reset_caches()
+    logger.info(f"Imported {template_zip_path} as '{variant}' ({len(manifest['libraries'])} libraries)")
+    return manifest
+
+
+def upgrade(package_path: str) -> list:
+    """
+    Imports the libraries of an .h5p/.zip and switches every manifest that uses the same
+    machineName-major.minor to them. The affected template.zip files are rewritten.
+
+    :return: Names of the variants that were updated.
+    """
+    with zipfile.ZipFile(package_path) as zip_obj:
+        libraries, _ = _split_entries(zip_obj)
+    library_ids = import_libraries(libraries)
+
+    updated = []
+    for manifest_path in sorted((store_dir() / "manifests").glob("*.json")):
+        manifest = _read_json(manifest_path)
+        changes = {folder: library_id for folder, library_id in library_ids.items()
+                   if manifest["libraries"].get(folder, library_id) != library_id}
+        if not changes:
+            continue
+        manifest["libraries"].update(changes)
+        template_path = REPO_ROOT / manifest["template"]
+        template_path.write_bytes(materialize_zip(manifest))
+        manifest["template_sha256"] = _file_sha256(template_path)
+        manifest["template_stat"] = _template_stat(template_path)
+        _write_json(manifest_path, manifest)
+        updated.append(manifest_path.stem)
+        logger.info(f"Upgraded {manifest_path.stem}: {changes}")
+
+    reset_caches()
+    return updated
+
+
+# --- Materialisation ---
+def load_manifest(variant: str) -> dict:
+    return _read_json(store_dir() / "manifests" / f"{variant}.json")
+
+
+def materialize(manifest: dict) -> dict:
+    """Returns the template as an ordered mapping of zip entry name -> (ZipInfo, bytes)."""
+    entries = {name: _zip_entry(name, record) for name, record in manifest["files"].items()}
+    for folder, library_id in sorted(manifest["libraries"].items()):
+        index = _read_json(store_dir() / "libraries" / f"{library_id}.json")
+        for path, record in index["files"].items():
+            name = f"{folder}/{path}"
+            entries[name] = _zip_entry(name, record)
+    return entries
+
+
+def materialize_zip(manifest: dict) -> bytes:
+    in_memory_zip = io.BytesIO()
+    with zipfile.ZipFile(in_memory_zip, 'w', zipfile.ZIP_DEFLATED) as template_zip:
+        for info, data in materialize(manifest).values():
+            template_zip.writestr(info, data)
+    return in_memory_zip.getvalue()
+
+
+def _variant_for(template_path: Path) -> str | None:
+    global _manifest_index
+    if _manifest_index is None:
+        _manifest_index = {}
+        for manifest_path in (store_dir() / "manifests").glob("*.json"):
+            try:
+                template = _read_json(manifest_path)["template"]
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Ignoring manifest {manifest_path}: {e}")
+                continue
+            _manifest_index[(REPO_ROOT / template).resolve()] = manifest_path.stem
+    return _manifest_index.get(template_path)
+
+
+def _is_imported_version(template_path: Path, stamp: tuple, manifest: dict) -> bool:
+    """True if the template is the one the manifest was built from. Hashes it only for an unknown (mtime, size)."""
+    if list(stamp) == manifest.get("template_stat"):
+        return True
+    if _verified_templates.get(template_path) == (stamp, manifest["template_sha256"]):
+        return True
+    # E.g. a checkout touched the file: same content, new mtime
+    if _file_sha256(template_path) != manifest["template_sha256"]:
+        return False
+    _verified_templates[template_path] = (stamp, manifest["template_sha256"])
+    return True
+
+
+def template_entries(template_zip_path: str) -> dict | None:
+    """
+    Entries of the template, materialised from the store and cached per process.
+
+    :return: A fresh mapping of zip entry name -> (ZipInfo, bytes) the caller may modify,
+             or None if the template is not in the store or changed since it was imported.
+    """
+    template_path = Path(template_zip_path).resolve()
+    variant = _variant_for(template_path)
+    if variant is None:
+        return None
+
+    stat = template_path.stat()
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    cached = _template_cache.get(template_path)
+    if cached is None or cached[0] != stamp:
+        manifest = load_manifest(variant)
+        if not _is_imported_version(template_path, stamp, manifest):
+            logger.warning(f"{template_zip_path} changed since it was imported into the library store, "
+                           f"re-run 'python -m h5p_common.library_store import {variant} {template_zip_path}'")
+            return None
+        cached = (stamp, materialize(manifest))
+        _template_cache[template_path] = cached
+    # Copies of the ZipInfos too, writestr() records offsets and sizes in them (see resources.template_entries)
+    return {name: (copy.copy(info), data) for name, (info, data) in cached[1].items()}
+
+
+# --- CLI ---
+def main():
+    parser = argparse.ArgumentParser(description="Shared H5P library store for the variant templates")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = commands.add_parser("import", help="Import a variant's template.zip")
+    import_parser.add_argument("variant", help="Variant name, e.g. JR")
+    import_parser.add_argument("template", help="Path to the variant's template.zip")
+
+    upgrade_parser = commands.add_parser("upgrade", help="Switch all variants to the libraries in a package")
+    upgrade_parser.add_argument("package", help=".h5p or .zip containing library folders")
+
+    materialize_parser = commands.add_parser("materialize", help="Write a variant's template.zip")
+    materialize_parser.add_argument("variant", help="Variant name, e.g. JR")
+    materialize_parser.add_argument("output", help="Output .zip path")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "import":
+        import_template(args.variant, args.template)
+    elif args.command == "upgrade":
+        print(f"Updated variants: {upgrade(args.package) or 'none'}")
+    elif args.command == "materialize":
+        Path(args.output).write_bytes(materialize_zip(load_manifest(args.variant)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+"""
+LLM backends of the transcript generators (autoimage/cli_generator.py, orchestrator_v2.py).
+
+Generators ask a backend for the answer to a prompt and never talk to Gemini
+directly, so a whole transcript-to-H5P run can use recorded answers instead:
+
+    gemini   Google Gemini, needs GEMINI_API_KEY (default)
+    fake     replays the answers recorded in a JSON fixture file, with optional
+             latency, without network access or quota
+
+The backend is chosen by create_backend(), from its arguments or else from
+the environment:
+
+    H5P_LLM_BACKEND=fake
+    H5P_LLM_FIXTURES=benchmarks/fixtures/llm/transcript.json
+    H5P_LLM_LATENCY=1.5         seconds per fake answer (H5P_LLM_JITTER adds up to that much more)
+    H5P_LLM_RECORD=path.json    also record every answer to path, e.g. to create fixtures
+
+A fixture file maps the section of each prompt (intro, memory, summary, quiz,
+cloze) to its answer, or to a list of answers that successive calls cycle through:
+
+    {"intro": "```json\\n{\\"title\\": ...}\\n```", "quiz": ["...", "..."]}
+
+Gemini calls go through LimitedBackend, which keeps a process within its quota
+and rides out transient failures instead of failing the whole book:
+
+    H5P_LLM_RPM=60              requests per minute (token bucket, bursts of H5P_LLM_BURST=5)
+    H5P_LLM_CONCURRENCY=4       calls in flight at once, across all threads of the process
+    H5P_LLM_RETRIES=5           retries of 429/5xx answers, timeouts and connection errors,
+                                after exponential backoff with full jitter (H5P_LLM_BACKOFF=1 s
+                                doubling per attempt, at most H5P_LLM_MAX_BACKOFF=60 s)
+    H5P_LLM_TIMEOUT=120         seconds per Gemini request
+
+The fake backend is only limited when one of the limits besides the timeout is
+set, e.g. to measure their effect with H5P_LLM_LATENCY. H5P_LLM_ERROR_RATE
+makes it fail that fraction of calls with a 503, to exercise the retries offline.
+"""
+import contextlib
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from h5p_common import lazy, timing
+
+logger = logging.getLogger(__name__)
+
+genai = lazy.module("google.generativeai")
+
+BACKENDS = ("gemini", "fake")
+
+# HTTP status codes worth retrying: quota exhausted, server errors, timeouts
+RETRIABLE_STATUS = {429, 500, 502, 503, 504}
+
+# Defaults of the H5P_LLM_* limits, see the module docstring
+DEFAULT_LIMITS = {
+    "H5P_LLM_RPM": 60.0,
+    "H5P_LLM_BURST": 5.0,
+    "H5P_LLM_CONCURRENCY": 4,
+    "H5P_LLM_RETRIES": 5,
+    "H5P_LLM_BACKOFF": 1.0,
+    "H5P_LLM_MAX_BACKOFF": 60.0,
+}
+# Seconds per Gemini request, H5P_LLM_TIMEOUT
+DEFAULT_TIMEOUT = 120.0
+
+# Token bucket and concurrency cap shared by every LimitedBackend of the process, see shared_limits()
+_shared_limits = None
+_shared_limits_lock = threading.Lock()
+
+
+class LLMError(Exception):
+    """A backend that cannot answer, e.g. a fake without a recorded answer for the section."""
+
+
+class TransientLLMError(LLMError):
+    """A failure that may pass on retry. code is the HTTP status, as on google.api_core exceptions."""
+
+    def __init__(self, message: str, code: int = 503):
+        super().__init__(message)
+        self.code = code
+
+
+def is_retriable(error: Exception) -> bool:
+    """True for rate limiting, server errors, timeouts and dropped connections."""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    try:
+        return int(getattr(error, "code", None)) in RETRIABLE_STATUS
+    except (TypeError, ValueError):
+        return False
+
+
+class LLMResponse:
+    """The answer to a prompt. Has .text like the responses of google.generativeai."""
+    __slots__ = ("text",)
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+class LLMBackend:
+    """Interface of the backends: answers a prompt, named by the section of the book it is for."""
+    name = "base"
+
+    def generate(self, prompt: str, model_name: str, section: str) -> LLMResponse:
+        raise NotImplementedError
+
+
+class GeminiBackend(LLMBackend):
+    """Google Gemini. Configures the API key and creates each model client on first use."""
+    name = "gemini"
+
+    def __init__(self, api_key: str, timeout: float | None = None):
+        self.api_key = api_key
+        self.timeout = timeout
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def model(self, model_name: str):
+        with self._lock:
+            if not self._models:
+                genai.configure(api_key=self.api_key)
+            if model_name not in self._models:
+                self._models[model_name] = genai.GenerativeModel(model_name)
+            return self._models[model_name]
+
+    def generate(self, prompt: str, model_name: str, section: str) -> LLMResponse:
+        request_options = {"timeout": self.timeout} if self.timeout else None
+        return LLMResponse(self.model(model_name).generate_content(prompt, request_options=request_options).text)
+
+
+class FakeBackend(LLMBackend):
+    """
+    Replays recorded answers from a fixture file, ignoring prompt and model.
+    :param latency: seconds each answer takes, to measure overlap of concurrent calls
+    :param jitter: up to this many seconds added at random (seeded, so runs repeat)
+    :param error_rate: fraction of calls that fail with a TransientLLMError (503)
+    """
+    name = "fake"
+
+    def __init__(self, fixtures_path, latency: float = 0.0, jitter: float = 0.0, seed: int = 0,
+                 error_rate: float = 0.0):
+        self.fixtures_path = Path(fixtures_path)
+        with open(self.fixtures_path, encoding="utf-8") as f_fixtures:
+            self.answers = {section: answer if isinstance(answer, list) else [answer]
+                            for section, answer in json.load(f_fixtures).items()}
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.calls = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def generate(self, prompt: str, model_name: str, section: str) -> LLMResponse:
+        answers = self.answers.get(section)
+        if not answers:
+            raise LLMError(f"No recorded answer for section '{section}' in {self.fixtures_path}")
+        with self._lock:
+            index = self.calls.get(section, 0)
+            self.calls[section] = index + 1
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+            failed = self._random.random() < self.error_rate
+        if delay:
+            time.sleep(delay)
+        if failed:
+            raise TransientLLMError(f"Injected failure of section '{section}'")
+        return LLMResponse(answers[index % len(answers)])
+
+
+class RecordingBackend(LLMBackend):
+    """Passes calls to another backend and saves its answers as a fixture file for FakeBackend."""
+
+    def __init__(self, backend: LLMBackend, path):
+        self.backend = backend
+        self.name = backend.name
+        self.path = Path(path)
+        self.answers = {}
+        self._lock = threading.Lock()
+
+    def generate(self, prompt: str, model_name: str, section: str) -> LLMResponse:
+        response = self.backend.generate(prompt, model_name, section)
+        with self._lock:
+            self.answers.setdefault(section, []).append(response.text)
+            # Saved after every answer, so an interrupted run keeps what it recorded
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=self.path.parent, prefix=self.path.name,
+                                             suffix=".tmp", delete=False) as f_tmp:
+                json.dump({key: answers[0] if len(answers) == 1 else answers
+                           for key, answers in self.answers.items()}, f_tmp, ensure_ascii=False, indent=2)
+            os.replace(f_tmp.name, self.path)
+        return response
+
+
+class TokenBucket:
+    """Allows rate calls per second on average, and bursts of up to capacity calls. Thread-safe."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Takes a token, waiting until one is available."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class Limits:
+    """Rate limit, concurrency cap and retry policy of LimitedBackend."""
+
+    def __init__(self, requests_per_minute: float = 60.0, burst: float = 5.0, concurrency: int = 4,
+                 retries: int = 5, backoff: float = 1.0, max_backoff: float = 60.0):
+        self.bucket = TokenBucket(requests_per_minute / 60, burst) if requests_per_minute > 0 else None
+        self.slots = threading.BoundedSemaphore(concurrency) if concurrency > 0 else None
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    @classmethod
+    def from_env(cls) -> "Limits":
+        values = {name: type(default)(os.environ.get(name, default)) for name, default in DEFAULT_LIMITS.items()}
+        return cls(values["H5P_LLM_RPM"], values["H5P_LLM_BURST"], values["H5P_LLM_CONCURRENCY"],
+                   values["H5P_LLM_RETRIES"], values["H5P_LLM_BACKOFF"], values["H5P_LLM_MAX_BACKOFF"])
+
+    def backoff_delay(self, attempt: int) -> float:
+        """Full jitter: anywhere between 0 and the exponential backoff of the attempt (0-based)."""
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+
+def shared_limits() -> Limits:
+    """The process-wide Limits from the H5P_LLM_* variables, so every generator and thread shares the quota."""
+    global _shared_limits
+    with _shared_limits_lock:
+        if _shared_limits is None:
+            _shared_limits = Limits.from_env()
+        return _shared_limits
+
+
+class LimitedBackend(LLMBackend):
+    """
+    Passes calls to another backend within a rate limit and concurrency cap, and retries
+    the transient failures (see is_retriable). Waiting shows up as the stages llm.throttle
+    and llm.backoff in run reports and metrics.
+    """
+
+    def __init__(self, backend: LLMBackend, limits: Limits = None):
+        self.backend = backend
+        self.name = backend.name
+        self.limits = limits or shared_limits()
+
+    def _call(self, prompt: str, model_name: str, section: str) -> LLMResponse:
+        limits = self.limits
+        with limits.slots or contextlib.nullcontext():
+            if limits.bucket is not None:
+                with timing.span("llm.throttle"):
+                    limits.bucket.acquire()
+            return self.backend.generate(prompt, model_name, section)
+
+    def generate(self, prompt: str, model_name: str, section: str) -> LLMResponse:
+        for attempt in range(self.limits.retries + 1):
+            try:
+                return self._call(prompt, model_name, section)
+            except Exception as e:
+                if attempt == self.limits.retries or not is_retriable(e):
+                    raise
+                delay = self.limits.backoff_delay(attempt)
+                logger.warning(f"LLM call for {section} failed ({type(e).__name__}: {e}), "
+                               f"retry {attempt + 1}/{self.limits.retries} in {delay:.1f}s")
+                with timing.span("llm.backoff"):
+                    time.sleep(delay)
+
+
+def create_backend(name: str = None, api_key: str = None, fixtures=None, latency: float = None,
+                   record=None) -> LLMBackend | None:
+    """
+    Backend named by name or H5P_LLM_BACKEND (default gemini), see the module docstring.
+    :return: the backend, or None for gemini without an API key
+    """
+    name = name or os.environ.get("H5P_LLM_BACKEND") or "gemini"
+    if name not in BACKENDS:
+        raise LLMError(f"Unknown LLM backend '{name}', expected one of {', '.join(BACKENDS)}")
+
+    if name == "fake":
+        fixtures = fixtures or os.environ.get("H5P_LLM_FIXTURES")
+        if not fixtures:
+            raise LLMError("The fake LLM backend needs a fixture file (H5P_LLM_FIXTURES)")
+        if latency is None:
+            latency = float(os.environ.get("H5P_LLM_LATENCY", 0))
+        backend = FakeBackend(fixtures, latency, float(os.environ.get("H5P_LLM_JITTER", 0)),
+                              error_rate=float(os.environ.get("H5P_LLM_ERROR_RATE", 0)))
+        logger.info(f"Using recorded LLM answers from {fixtures}")
+        limited = any(name in os.environ for name in DEFAULT_LIMITS)
+    else:
+        if not api_key:
+            return None
+        backend = GeminiBackend(api_key, float(os.environ.get("H5P_LLM_TIMEOUT", DEFAULT_TIMEOUT)))
+        limited = True
+
+    record = record or os.environ.get("H5P_LLM_RECORD")
+    if record:
+        backend = RecordingBackend(backend, record)
+        logger.info(f"Recording LLM answers to {record}")
+    # Outermost, so only answers that finally succeeded are recorded
+    return LimitedBackend(backend) if limited else backend
@@ -0,0 +1,308 @@
+"""
+Prometheus metrics of a long-running generator process.
+
+Importing this module subscribes it to the stage spans of timing.py, so the
+instrumented stages (Gemini calls, Wikimedia searches and downloads, image
+processing, packaging) feed these metrics without further calls:
+
+    h5p_stage_duration_seconds{stage}   histogram of every stage's latency
+    h5p_stage_failures_total{stage}     stages that raised, e.g. Wikimedia errors
+    h5p_packages_built_total            packages assembled ("zip" stage)
+    h5p_packages_failed_total           packaging attempts that raised
+    h5p_package_size_bytes              histogram of package sizes
+    h5p_cache_entries{cache}            entries held by the resource and base-package caches
+
+The text exposition format is served at /metrics by h5p_common.server. Streamlit
+apps call enable_from_env() once at start-up:
+
+    H5P_METRICS_PORT=9464       serve /metrics from a background thread on that port
+    H5P_METRICS_TEXTFILE=path   rewrite path every H5P_METRICS_INTERVAL seconds (default 15),
+                                for node_exporter's textfile collector
+
+Metrics are per process: run each Streamlit app with its own port or file. The
+worker processes of bulk jobs (see h5p_podcast_gem/jobs.py) are not included.
+"""
+import logging
+import math
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from h5p_common import timing
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Stage latency in seconds, from chapter rendering up to slow Gemini calls
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+# Package size in bytes, 256 KB to 100 MB
+SIZE_BUCKETS = tuple(n * 1024 * 1024 for n in (0.25, 0.5, 1, 2, 5, 10, 20, 50, 100))
+
+# Started by enable_from_env(), once per process
+_exporters_started = False
+_exporters_lock = threading.Lock()
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    """Base of the metric types: a name, a help text and values per label tuple."""
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} takes labels {self.label_names}, got {sorted(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def samples(self):
+        """(name suffix, label values, extra label, value) of every sample."""
+        with self._lock:
+            return [("", key, "", value) for key, value in sorted(self._values.items())]
+
+    def expose(self) -> list:
+        lines = [f"# HELP {self.name} {_escape(self.help_text)}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, key, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.label_names, key, extra)} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(Metric):
+    """A value that goes up and down. With a collector function, read at every scrape."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labels: tuple = (), collect=None):
+        super().__init__(name, help_text, labels)
+        # collect() -> {label value tuple: value}
+        self._collect = collect
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self):
+        if self._collect is None:
+            return super().samples()
+        try:
+            values = self._collect()
+        except Exception as e:
+            logger.warning(f"Could not collect {self.name}: {e}")
+            return []
+        return [("", tuple(str(v) for v in key), "", value) for key, value in sorted(values.items())]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            # [count per bucket..., count in +Inf only, sum]
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[index] += 1
+                    break
+            else:
+                state[len(self.buckets)] += 1
+            state[-1] += value
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            items = sorted((key, list(state)) for key, state in self._values.items())
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), state[:-1]):
+                cumulative += count
+                samples.append(("_bucket", key, f'le="{_format_value(bound)}"', cumulative))
+            samples.append(("_sum", key, "", state[-1]))
+            samples.append(("_count", key, "", cumulative))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def expose(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, help_text: str, labels: tuple = ()) -> Counter:
+    return REGISTRY.register(Counter(name, help_text, labels))
+
+
+def gauge(name: str, help_text: str, labels: tuple = (), collect=None) -> Gauge:
+    return REGISTRY.register(Gauge(name, help_text, labels, collect))
+
+
+def histogram(name: str, help_text: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, help_text, labels, buckets))
+
+
+# --- Generator metrics ---
+def _cache_entries() -> dict:
+    """Entries per cache, only of the modules this process has loaded."""
+    entries = {}
+    resources = sys.modules.get("h5p_common.resources")
+    if resources is not None:
+        for name, size in resources.cache_sizes().items():
+            entries[("resource:" + name,)] = size
+    base_package = sys.modules.get("h5p_common.base_package")
+    if base_package is not None:
+        entries[("base_package",)] = base_package.cached_base_count()
+    return entries
+
+
+STAGE_DURATION = histogram("h5p_stage_duration_seconds", "Duration of a pipeline stage", ("stage",))
+STAGE_FAILURES = counter("h5p_stage_failures_total", "Pipeline stages that raised an error", ("stage",))
+PACKAGES_BUILT = counter("h5p_packages_built_total", "H5P packages assembled")
+PACKAGES_FAILED = counter("h5p_packages_failed_total", "H5P packages whose assembly raised an error")
+PACKAGE_SIZE = histogram("h5p_package_size_bytes", "Size of the assembled H5P packages", buckets=SIZE_BUCKETS)
+CACHE_ENTRIES = gauge("h5p_cache_entries", "Entries held by a cache", ("cache",), collect=_cache_entries)
+
+
+@timing.on_span
+def _observe_span(stage: str, seconds: float, n_bytes: int | None, failed: bool):
+    STAGE_DURATION.observe(seconds, stage=stage)
+    if failed:
+        STAGE_FAILURES.inc(stage=stage)
+    # The "zip" span wraps the assembly of every package (see packaging.build_package)
+    if stage == "zip":
+        if failed:
+            PACKAGES_FAILED.inc()
+        else:
+            PACKAGES_BUILT.inc()
+            if n_bytes:
+                PACKAGE_SIZE.observe(n_bytes)
+
+
+# --- Export ---
+def expose() -> str:
+    return REGISTRY.expose()
+
+
+def write_textfile(path):
+    """Writes the metrics to path for node_exporter's textfile collector, replacing it atomically."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=path.parent, prefix=path.name,
+                                     suffix=".tmp", delete=False) as f_tmp:
+        f_tmp.write(expose())
+    os.replace(f_tmp.name, path)
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        payload = expose().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serves /metrics on a daemon thread."""
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="h5p-metrics", daemon=True).start()
+    logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+    return server
+
+
+def _textfile_loop(path: str, interval: float):
+    while True:
+        try:
+            write_textfile(path)
+        except OSError as e:
+            logger.warning(f"Could not write metrics to {path}: {e}")
+        time.sleep(interval)
+
+
+def enable_from_env():
+    """Starts the exporters configured by H5P_METRICS_PORT / H5P_METRICS_TEXTFILE. Only the first call does."""
+    global _exporters_started
+    with _exporters_lock:
+        if _exporters_started:
+            return
+        _exporters_started = True
+
+    port = os.environ.get("H5P_METRICS_PORT")
+    if port:
+        try:
+            start_http_server(int(port), os.environ.get("H5P_METRICS_HOST", "0.0.0.0"))
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not serve metrics on port {port}: {e}")
+
+    textfile = os.environ.get("H5P_METRICS_TEXTFILE")
+    if textfile:
+        interval = float(os.environ.get("H5P_METRICS_INTERVAL", 15))
+        threading.Thread(target=_textfile_loop, args=(textfile, interval),
+                         name="h5p-metrics-textfile", daemon=True).start()
+        logger.info(f"Writing metrics to {textfile} every {interval:g}s")
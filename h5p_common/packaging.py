@@ -0,0 +1,292 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import time
+import zipfile
+
+from h5p_common import library_store, resources, serialization, timing
+
+logger = logging.getLogger(__name__)
+
+CONTENT_JSON_NAME = "content/content.json"
+H5P_JSON_NAME = "h5p.json"
+
+# Matches every "path": "<string>" pair in a serialised content.json
+PATH_REFERENCE_RE = re.compile(rb'("path"\s*:\s*)("(?:[^"\\]|\\.)*")')
+
+# Matches every "library": "H5P.Name 1.2" sub-content reference
+LIBRARY_REFERENCE_RE = re.compile(rb'"library"\s*:\s*"([^"\s]+) (\d+)\.(\d+)"')
+
+# Reproducible builds: earliest zip timestamp, used unless SOURCE_DATE_EPOCH is set
+REPRODUCIBLE_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+# -rw-r--r-- regular file, written as if on Unix
+REPRODUCIBLE_EXTERNAL_ATTR = 0o100644 << 16
+
+
+def to_package_path(filename: str) -> str:
+    """Returns the full zip entry name for a file given relative to content/."""
+    if filename.lower().startswith("content/"):
+        return filename
+    return f"content/{filename}"
+
+
+def is_media_entry(name: str) -> bool:
+    """Media files live under content/ next to content.json."""
+    lowered = name.lower()
+    return lowered.startswith("content/") and lowered != CONTENT_JSON_NAME and not lowered.endswith("/")
+
+
+# --- Content-addressed de-duplication ---
+def deduplicate_media(entries: dict, canonical_by_digest: dict = None) -> dict:
+    """
+    Drops media entries whose bytes are identical to an earlier entry.
+
+    :param entries: Ordered mapping of zip entry name -> (ZipInfo or None, bytes). Modified in place.
+    :param canonical_by_digest: sha256 digest -> entry name of media stored outside entries
+                                (e.g. in a base package). New digests are added to it.
+    :return: Mapping of dropped path -> canonical path, both relative to content/.
+    """
+    if canonical_by_digest is None:
+        canonical_by_digest = {}
+    aliases = {}
+    for name in list(entries):
+        if not is_media_entry(name):
+            continue
+        digest = hashlib.sha256(entries[name][1]).digest()
+        canonical = canonical_by_digest.setdefault(digest, name)
+        if canonical != name:
+            aliases[name[len("content/"):]] = canonical[len("content/"):]
+            del entries[name]
+    return aliases
+
+
+def rewrite_path_references(content_json: bytes, aliases: dict) -> bytes:
+    """Points every "path" value listed in aliases to its canonical file."""
+    if not aliases:
+        return content_json
+
+    def _replace(match):
+        value = json.loads(match.group(2))
+        if value not in aliases:
+            return match.group(0)
+        return match.group(1) + json.dumps(aliases[value], ensure_ascii=False).encode('utf-8')
+
+    return PATH_REFERENCE_RE.sub(_replace, content_json)
+
+
+# --- Library dependency pruning ---
+def library_folder(dependency: dict) -> str:
+    """Folder name of a {"machineName", "majorVersion", "minorVersion"} dependency entry."""
+    return f"{dependency['machineName']}-{dependency['majorVersion']}.{dependency['minorVersion']}"
+
+
+def entry_library(name: str) -> str | None:
+    """Returns the library folder a zip entry belongs to, or None for content/ and top-level files."""
+    folder, sep, _ = name.partition("/")
+    if not sep or folder.lower() == "content":
+        return None
+    return folder
+
+
+def read_library_index(entries: dict) -> dict:
+    """Maps each library folder in entries to its parsed library.json."""
+    index = {}
+    for name, (_, data) in entries.items():
+        folder = entry_library(name)
+        if folder is None or name != f"{folder}/library.json":
+            continue
+        try:
+            index[folder] = json.loads(data)
+        except ValueError as e:
+            logger.warning(f"Could not parse {name}: {e}")
+    return index
+
+
+def referenced_libraries(content_json: bytes, h5p_json: bytes) -> set:
+    """Library folders the book uses directly: h5p.json dependencies plus every sub-content library."""
+    roots = {library_folder(dep) for dep in json.loads(h5p_json).get("preloadedDependencies", [])}
+    for machine_name, major, minor in LIBRARY_REFERENCE_RE.findall(content_json):
+        roots.add(f"{machine_name.decode('utf-8')}-{int(major)}.{int(minor)}")
+    return roots
+
+
+def dependency_closure(roots: set, library_index: dict, keep_editor_libraries: bool = False) -> set:
+    """
+    Transitive closure of roots over preloaded and dynamic dependencies.
+
+    :param keep_editor_libraries: Also follow editorDependencies, so the package stays editable after import.
+    """
+    dependency_keys = ["preloadedDependencies", "dynamicDependencies"]
+    if keep_editor_libraries:
+        dependency_keys.append("editorDependencies")
+
+    needed = set()
+    pending = list(roots)
+    while pending:
+        folder = pending.pop()
+        if folder in needed:
+            continue
+        needed.add(folder)
+        library = library_index.get(folder)
+        if library is None:
+            logger.warning(f"Library {folder} is referenced but missing from the template")
+            continue
+        for key in dependency_keys:
+            pending.extend(library_folder(dep) for dep in library.get(key, []))
+    return needed
+
+
+def prune_libraries(entries: dict, needed: set) -> list:
+    """
+    Drops every library folder not in needed.
+
+    :param entries: Ordered mapping of zip entry name -> (ZipInfo or None, bytes). Modified in place.
+    :return: Sorted list of removed library folders.
+    """
+    removed = set()
+    for name in list(entries):
+        folder = entry_library(name)
+        if folder is not None and folder not in needed:
+            removed.add(folder)
+            del entries[name]
+    return sorted(removed)
+
+
+# --- Reproducible output ---
+def reproducible_date_time() -> tuple:
+    """Timestamp for new zip entries: SOURCE_DATE_EPOCH (UTC) if set, else 1980-01-01."""
+    source_date_epoch = os.environ.get("SOURCE_DATE_EPOCH")
+    if not source_date_epoch:
+        return REPRODUCIBLE_DATE_TIME
+    try:
+        date_time = time.gmtime(int(source_date_epoch))[:6]
+    except (ValueError, OverflowError, OSError):
+        logger.warning(f"Ignoring invalid SOURCE_DATE_EPOCH={source_date_epoch!r}")
+        return REPRODUCIBLE_DATE_TIME
+    # The zip format cannot store dates before 1980
+    return max(date_time, REPRODUCIBLE_DATE_TIME)
+
+
+def write_entry(zip_obj: zipfile.ZipFile, name: str, data: bytes, date_time: tuple = None):
+    """
+    Writes a new zip entry.
+
+    :param date_time: Fixed timestamp for reproducible output (see reproducible_date_time()).
+                      The attributes are fixed as well. None stamps the current local time.
+    """
+    if date_time is None:
+        zip_obj.writestr(name, data)
+        return
+    info = zipfile.ZipInfo(name, date_time=date_time)
+    info.compress_type = zip_obj.compression
+    info.create_system = 3
+    info.external_attr = REPRODUCIBLE_EXTERNAL_ATTR
+    zip_obj.writestr(info, data)
+
+
+# --- Package assembly ---
+def read_template_entries(template_zip_path: str, skip: set = frozenset()) -> dict:
+    """
+    Reads every template entry whose lower-cased name is not in skip.
+
+    Templates imported into the shared library store are materialised from there,
+    others are read once per process and template version (see resources.py).
+
+    :return: Ordered mapping of zip entry name -> (ZipInfo, bytes).
+    """
+    stored_entries = library_store.template_entries(template_zip_path)
+    if stored_entries is None:
+        stored_entries = resources.template_entries(template_zip_path)
+    return {name: entry for name, entry in stored_entries.items() if name.lower() not in skip}
+
+
+def build_package(content_json, h5p_json, template_zip_path: str, files: list = None,
+                  prune: bool = False, keep_editor_libraries: bool = True, use_base: bool = False,
+                  validate_output: bool = True, reproducible: bool = False) -> bytes:
+    """
+    Assembles an .h5p package from the template plus the generated files.
+
+    :param content_json: Serialised content/content.json, as UTF-8 bytes (see serialization.py) or str.
+    :param h5p_json: Serialised h5p.json, as UTF-8 bytes or str.
+    :param template_zip_path: Path to the template .zip file.
+    :param files: List of (filename, bytes) tuples. Filenames without a 'content/' prefix
+                  are placed inside content/. They replace template entries with the same name.
+    :param prune: Only copy the libraries in the dependency closure of the book.
+    :param keep_editor_libraries: When pruning, also keep the editor libraries of that closure. The H5P
+                                  importer requires every editorDependency, so only drop them for
+                                  targets known to have them installed.
+    :param use_base: Append the book to the precompiled base package of the template (see base_package.py)
+                     instead of re-compressing every template entry.
+    :param validate_output: Log dangling references and unused files of the result (see validate.py).
+    :param reproducible: Give the new entries a fixed timestamp and attributes and write the book's
+                         files sorted by name, so identical input gives identical bytes. Implied when
+                         SOURCE_DATE_EPOCH is set. Template entries keep their stored attributes.
+    :return: Bytes of the H5P package. Raises on I/O or zip errors.
+    """
+    # base_package and validate build on the helpers in this module
+    from h5p_common import base_package, validate
+
+    if files is None:
+        files = []
+    content_json = serialization.to_bytes(content_json)
+    h5p_json = serialization.to_bytes(h5p_json)
+
+    date_time = None
+    if reproducible or os.environ.get("SOURCE_DATE_EPOCH"):
+        date_time = reproducible_date_time()
+        # Also fixes which copy of a duplicated file is kept
+        files = sorted(files, key=lambda file: to_package_path(file[0]))
+
+    with timing.span("zip") as span:
+        package = None
+        if use_base:
+            package = base_package.build_from_base(content_json, h5p_json, template_zip_path, files,
+                                                   prune, keep_editor_libraries, date_time)
+        if package is None:
+            package = _assemble_package(content_json, h5p_json, template_zip_path, files,
+                                        prune, keep_editor_libraries, date_time)
+        span.bytes = len(package)
+
+    if validate_output:
+        with timing.span("validate"):
+            validate.log_report(validate.validate_package(package), "Generated package")
+    return package
+
+
+def _assemble_package(content_json: bytes, h5p_json: bytes, template_zip_path: str, files: list,
+                      prune: bool, keep_editor_libraries: bool, date_time: tuple = None) -> bytes:
+    """Builds the package from scratch, re-compressing every template entry."""
+    new_files = {to_package_path(filename): data for filename, data in files}
+    replaced = {name.lower() for name in new_files} | {CONTENT_JSON_NAME, H5P_JSON_NAME}
+
+    entries = read_template_entries(template_zip_path, replaced)
+    for name, data in new_files.items():
+        entries[name] = (None, data)
+
+    if prune:
+        needed = dependency_closure(referenced_libraries(content_json, h5p_json),
+                                    read_library_index(entries), keep_editor_libraries)
+        removed = prune_libraries(entries, needed)
+        logger.info(f"Pruned {len(removed)} unused template libraries: {removed}")
+
+    aliases = deduplicate_media(entries)
+    if aliases:
+        logger.info(f"Stored {len(aliases)} duplicate media file(s) once: {aliases}")
+        content_json = rewrite_path_references(content_json, aliases)
+
+    in_memory_zip = io.BytesIO()
+    with zipfile.ZipFile(in_memory_zip, 'w', zipfile.ZIP_DEFLATED) as new_zip:
+        # 1. Template files, 2. new JSONs, 3. generated/extra files
+        for name, (info, data) in entries.items():
+            if info is not None:
+                new_zip.writestr(info, data)
+        write_entry(new_zip, CONTENT_JSON_NAME, content_json, date_time)
+        write_entry(new_zip, H5P_JSON_NAME, h5p_json, date_time)
+        for name, (info, data) in entries.items():
+            if info is None:
+                write_entry(new_zip, name, data, date_time)
+
+    return in_memory_zip.getvalue()
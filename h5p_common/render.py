@@ -0,0 +1,92 @@
+"""
+Chapter renderer registry.
+
+Each booklet generator keeps a Registry that maps the IR chapter classes it
+supports (see ir.py) to their render functions:
+
+    RENDERERS = render.Registry()
+
+    @RENDERERS.register(ir.VideoChapter, "video_id")
+    def create_video_chapter(chapter: ir.VideoChapter, video_id: str | None) -> dict: ...
+
+    chapters = RENDERERS.render(book.chapters, {"video_id": video_id})
+
+The dispatch for a sequence of chapter types is compiled into a plan once and
+reused for every book with the same layout. Renderers only read their chapter
+and the book context, so chapters can be rendered independently of each other.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from h5p_common import timing
+
+logger = logging.getLogger(__name__)
+
+
+class Registry:
+    """Render functions keyed by IR chapter class, plus the compiled plans per chapter layout."""
+
+    def __init__(self):
+        # chapter class -> (render function, names of the context values it takes)
+        self._renderers = {}
+        # tuple of chapter classes -> tuple of (render function, context names) or None
+        self._plans = {}
+
+    def register(self, chapter_type: type, *context_keys: str):
+        """
+        Decorator registering a render function for chapter_type.
+
+        :param chapter_type: IR chapter class, e.g. ir.MemoryGame. Subclasses use the same renderer
+                             unless they register their own.
+        :param context_keys: Names of book context values passed after the chapter, in this order.
+        """
+        def decorator(renderer):
+            self._renderers[chapter_type] = (renderer, context_keys)
+            self._plans.clear()
+            return renderer
+        return decorator
+
+    def _resolve(self, chapter_type: type):
+        for cls in chapter_type.__mro__:
+            if cls in self._renderers:
+                return self._renderers[cls]
+        return None
+
+    def compile_plan(self, chapter_types: tuple) -> tuple:
+        """
+        Resolves the renderer of each chapter type, cached per layout.
+        Types without a renderer map to None; their chapters are skipped.
+        """
+        plan = self._plans.get(chapter_types)
+        if plan is None:
+            plan = tuple(self._resolve(chapter_type) for chapter_type in chapter_types)
+            self._plans[chapter_types] = plan
+            skipped = sorted({t.__name__ for t, step in zip(chapter_types, plan) if step is None})
+            if skipped:
+                logger.debug(f"No renderer for {skipped}, these chapters are skipped")
+        return plan
+
+    def render(self, chapters: list, context: dict = None, max_workers: int = None) -> list:
+        """
+        Renders parsed chapters in order.
+
+        :param chapters: IR chapter objects.
+        :param context: Book-wide values the renderers declared at registration.
+        :param max_workers: Render chapters on a thread pool of this size. Only pays off for
+                            renderers that wait on I/O; the default renders sequentially.
+        :return: Rendered chapter dictionaries, without the skipped chapters.
+        """
+        if context is None:
+            context = {}
+        plan = self.compile_plan(tuple(type(chapter) for chapter in chapters))
+        jobs = [(step, chapter) for step, chapter in zip(plan, chapters) if step is not None]
+
+        def _render(job):
+            (renderer, context_keys), chapter = job
+            return renderer(chapter, *(context[key] for key in context_keys))
+
+        with timing.span("render"):
+            if max_workers and len(jobs) > 1:
+                with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                    return list(executor.map(timing.bind(_render), jobs))
+            return [_render(job) for job in jobs]
@@ -0,0 +1,166 @@
+"""
+Process-wide resource caches.
+
+Streamlit reruns the whole orchestrator script on every widget interaction.
+Anything loaded on the way (template zips, fonts, the face detector, HTTP
+sessions, API clients) is kept here instead of being rebuilt on each rerun:
+
+    @resources.cache_resource
+    def face_cascade():
+        return cv2.CascadeClassifier(...)
+
+Inside a running Streamlit app the decorators are st.cache_resource and
+st.cache_data, so the caches also show up in (and are cleared by) Streamlit's
+"Clear cache" menu. Everywhere else (CLI scripts, batch jobs) they fall back to
+functools.lru_cache. Either way, clear_all() invalidates every cache, e.g. after
+a template was replaced:
+
+    if st.sidebar.button("Reload templates"):
+        resources.clear_all()
+
+File-backed entries are also keyed by the file's (mtime, size), so an edited
+template is picked up without explicit invalidation.
+"""
+import copy
+import functools
+import io
+import logging
+import zipfile
+from pathlib import Path
+
+from h5p_common import timing
+
+logger = logging.getLogger(__name__)
+
+# Caches created by the decorators below, and functions clearing caches kept elsewhere
+_caches = []
+_clear_hooks = []
+
+
+def _streamlit_cache(kind: str):
+    """st.cache_resource / st.cache_data when running inside a Streamlit app, else None."""
+    try:
+        import streamlit as st
+        from streamlit import runtime
+    except ImportError:
+        return None
+    if not runtime.exists():
+        return None
+    return getattr(st, kind)
+
+
+def _cache(kind: str, func, max_entries: int | None):
+    streamlit_cache = _streamlit_cache(kind)
+    if streamlit_cache is not None:
+        cached = streamlit_cache(show_spinner=False, max_entries=max_entries)(func)
+    else:
+        cached = functools.lru_cache(maxsize=max_entries)(func)
+        cached.clear = cached.cache_clear
+    _caches.append(cached)
+    return cached
+
+
+def cache_resource(func=None, *, max_entries: int | None = None):
+    """
+    Caches a shared object (client, session, parsed font) per argument tuple.
+    Every caller gets the same object, which must therefore not be modified.
+
+    :param max_entries: Keep only this many argument tuples, least recently used first out.
+    """
+    if func is None:
+        return functools.partial(cache_resource, max_entries=max_entries)
+    return _cache("cache_resource", func, max_entries)
+
+
+def cache_data(func=None, *, max_entries: int | None = None):
+    """
+    Caches serialisable data per argument tuple, as cache_resource. Streamlit hands out copies,
+    the fallback shares the cached value, so callers must not modify it in either case.
+    """
+    if func is None:
+        return functools.partial(cache_data, max_entries=max_entries)
+    return _cache("cache_data", func, max_entries)
+
+
+def on_clear(hook):
+    """Registers a function that clears a cache kept outside this module. Usable as a decorator."""
+    _clear_hooks.append(hook)
+    return hook
+
+
+def clear_all():
+    """Invalidates every cached resource, e.g. after templates or fonts were replaced."""
+    for cached in _caches:
+        cached.clear()
+    for hook in _clear_hooks:
+        hook()
+    logger.info(f"Cleared {len(_caches)} resource caches and {len(_clear_hooks)} module caches")
+
+
+def cache_sizes() -> dict:
+    """Entries per cache as {"module.function": n}. Streamlit's caches do not report a size and are left out."""
+    sizes = {}
+    for cached in _caches:
+        cache_info = getattr(cached, "cache_info", None)
+        if cache_info is not None:
+            sizes[f"{cached.__module__}.{cached.__qualname__}"] = cache_info().currsize
+    return sizes
+
+
+def file_stamp(path) -> tuple | None:
+    """(mtime, size) of a file, or None if it does not exist. Part of the key of file-backed entries."""
+    try:
+        stat = Path(path).stat()
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+# --- Files ---
+@cache_resource(max_entries=64)
+def _read_file(path: str, stamp: tuple) -> bytes:
+    timing.cache_miss("file")
+    return Path(path).read_bytes()
+
+
+def file_bytes(path) -> bytes | None:
+    """Contents of a static file such as a template image, read once per version. None if missing."""
+    path = str(Path(path).resolve())
+    stamp = file_stamp(path)
+    if stamp is None:
+        return None
+    timing.cache_lookup("file")
+    return _read_file(path, stamp)
+
+
+# --- Templates ---
+# Old versions of an edited template are evicted first
+@cache_resource(max_entries=8)
+def _read_template(template_path: str, stamp: tuple) -> dict:
+    timing.cache_miss("template")
+    with open(template_path, 'rb') as f_template:
+        template_bytes = f_template.read()
+
+    entries = {}
+    with zipfile.ZipFile(io.BytesIO(template_bytes), 'r') as template_zip_obj:
+        for item in template_zip_obj.infolist():
+            entries[item.filename] = (item, template_zip_obj.read(item.filename))
+    logger.info(f"Loaded template {template_path} ({len(entries)} entries)")
+    return entries
+
+
+def template_entries(template_zip_path: str) -> dict:
+    """
+    Entries of a template zip, read once per template version.
+
+    :return: A fresh mapping of zip entry name -> (ZipInfo, bytes) the caller may modify.
+             The ZipInfos are copies too: ZipFile.writestr() records offsets and sizes in
+             them, which would corrupt concurrent builds sharing the cached objects.
+             Raises on I/O or zip errors.
+    """
+    template_path = str(Path(template_zip_path).resolve())
+    stamp = file_stamp(template_path)
+    if stamp is None:
+        raise FileNotFoundError(f"Template not found: {template_zip_path}")
+    timing.cache_lookup("template")
+    return {name: (copy.copy(info), data) for name, (info, data) in _read_template(template_path, stamp).items()}
@@ -0,0 +1,96 @@
+"""
+JSON serialisation for content.json and h5p.json.
+
+Uses orjson or msgspec when one is installed and falls back to the standard
+library otherwise. Every backend returns UTF-8 bytes with non-ASCII characters
+left unescaped, ready to be written into the package without another copy.
+
+Constant sub-trees (l10n and UI texts) can be wrapped in a Fragment: they are
+encoded once and their bytes are spliced into every document that uses them.
+"""
+import json
+import re
+
+from h5p_common import timing
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+if orjson is not None:
+    BACKEND = "orjson"
+elif msgspec is not None:
+    BACKEND = "msgspec"
+else:
+    BACKEND = "json"
+
+
+# Encoders write this string in place of a Fragment, dumps() then swaps in the encoded bytes.
+# U+E000 is a private-use character and does not occur in generated text.
+FRAGMENT_MARKER = "\ue000h5p-fragment:"
+FRAGMENT_MARKER_RE = re.compile(b'"' + re.escape(FRAGMENT_MARKER.encode('utf-8')) + rb'(\d+)"')
+
+
+class Fragment:
+    """
+    A constant JSON sub-tree, encoded once when it is created.
+    Use it as a value anywhere in a structure passed to dumps(); it must not be modified.
+    """
+    __slots__ = ("data", "encoded", "native")
+
+    def __init__(self, data):
+        self.data = data
+        self.encoded = dumps(data)
+        # orjson >= 3.9 embeds raw JSON natively
+        self.native = orjson.Fragment(self.encoded) if BACKEND == "orjson" and hasattr(orjson, "Fragment") else None
+
+
+def _encode(data, pretty: bool, default) -> bytes:
+    if BACKEND == "orjson":
+        return orjson.dumps(data, default=default, option=orjson.OPT_INDENT_2 if pretty else 0)
+    if BACKEND == "msgspec":
+        encoded = msgspec.json.encode(data, enc_hook=default)
+        return msgspec.json.format(encoded, indent=2) if pretty else encoded
+    if pretty:
+        return json.dumps(data, ensure_ascii=False, indent=2, default=default).encode('utf-8')
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=default).encode('utf-8')
+
+
+def dumps(data, pretty: bool = False) -> bytes:
+    """
+    Serialises data to UTF-8 JSON bytes.
+
+    :param data: JSON-compatible structure (dicts with string keys, lists, str, numbers, bool, None)
+                 that may contain Fragment values.
+    :param pretty: Indent with two spaces. Compact output is 20-40% smaller for content.json.
+                   Fragments are always spliced in compact form.
+    """
+    fragments = []
+
+    def _default(obj):
+        if isinstance(obj, Fragment):
+            if obj.native is not None:
+                return obj.native
+            fragments.append(obj.encoded)
+            return f"{FRAGMENT_MARKER}{len(fragments) - 1}"
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+    with timing.span("serialize") as span:
+        encoded = _encode(data, pretty, _default)
+        if fragments:
+            encoded = FRAGMENT_MARKER_RE.sub(lambda match: fragments[int(match.group(1))], encoded)
+        span.bytes = len(encoded)
+    return encoded
+
+
+def to_bytes(json_text) -> bytes:
+    """Accepts serialised JSON as str or bytes and returns UTF-8 bytes."""
+    if isinstance(json_text, str):
+        return json_text.encode('utf-8')
+    return bytes(json_text)
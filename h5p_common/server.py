@@ -0,0 +1,405 @@
+"""
+Headless HTTP service for package generation.
+
+One long-running process serves every variant, so callers such as an LMS
+integration skip interpreter start-up and imports, and templates, fonts and
+other resources (see resources.py) stay warm between books:
+
+    python -m h5p_common.server --port 8000
+
+    POST /podcast         .md file with the three response blocks (h5p_podcast_gem)
+    POST /iframe          merged book JSON, as built by h5p_iframe_gem/orchestrator.py
+    POST /iframe-text     merged book JSON, as built by h5p_iframe_text/orchestrator.py
+    POST /annual-review   {"chapters": [...], "roman_number", "months_text", ...} (JR)
+    POST /transcript      {"transcript", "title", "video_url", ...} (autoimage, needs GEMINI_API_KEY
+                          or H5P_LLM_BACKEND=fake, see llm.py)
+    GET  /health
+    GET  /metrics         Prometheus metrics (see metrics.py)
+
+Successful requests return the .h5p package (application/zip), failures a JSON
+{"error": ...}. Binary inputs (cover image, memory images) are passed as
+{"filename": "images/x.png", "data": "<base64>"} objects. A Server-Timing
+header lists how long each stage of the generation took (see timing.py).
+
+The service holds no per-request state, so it scales horizontally by running
+several instances behind a load balancer. Only the standard library is used
+here; each variant needs its own requirements.
+"""
+import argparse
+import base64
+import binascii
+import importlib
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, quote, urlparse
+
+from h5p_common import lazy, metrics, resources, timing
+
+logger = logging.getLogger(__name__)
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+# Largest accepted request body
+MAX_BODY_BYTES = 50 * 1024 * 1024
+# Chunk size when writing the package back
+RESPONSE_CHUNK_SIZE = 64 * 1024
+
+_import_lock = threading.Lock()
+
+
+class RequestError(Exception):
+    """A request the service cannot handle, reported to the client with this status."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+# --- Variant modules ---
+@resources.cache_resource
+def load_variant(directory: str, *module_names: str) -> dict:
+    """
+    Imports modules of a variant folder and returns {name: module}.
+
+    The variants use the same flat module names (utils_booklet_iframe, ...), so each
+    folder is imported on its own: clashing entries of sys.modules are set aside
+    during the import and restored afterwards. The returned modules keep references
+    to their own dependencies.
+    """
+    variant_dir = REPO_ROOT / directory
+    local_names = {path.stem for path in variant_dir.glob("*.py")}
+    with _import_lock:
+        saved = {name: sys.modules.pop(name) for name in local_names if name in sys.modules}
+        sys.path.insert(0, str(variant_dir))
+        try:
+            modules = {name: importlib.import_module(name) for name in module_names}
+        finally:
+            sys.path.remove(str(variant_dir))
+            for name in local_names:
+                sys.modules.pop(name, None)
+            sys.modules.update(saved)
+    logger.info(f"Loaded {directory}: {', '.join(module_names)}")
+    return modules
+
+
+def _clean_filename(title: str, default: str) -> str:
+    """Download file name from a book title, as the orchestrators build it."""
+    clean_title = "".join(c if c.isalnum() or c in (' ', '_', '-') else '_' for c in title)
+    clean_title = "_".join(clean_title.split())
+    return f"{clean_title or default}.h5p"
+
+
+def _decode_file(file: dict) -> dict:
+    """{"filename", "data": base64} -> {"filename", "data": bytes}."""
+    try:
+        return {"filename": file["filename"], "data": base64.b64decode(file["data"], validate=True)}
+    except (KeyError, TypeError, binascii.Error) as e:
+        raise RequestError(400, f"Invalid file object, expected {{'filename', 'data': base64}}: {e}")
+
+
+def _json_object(body: bytes) -> dict:
+    try:
+        data = json.loads(body)
+    except ValueError as e:
+        raise RequestError(400, f"Invalid JSON: {e}")
+    if not isinstance(data, dict):
+        raise RequestError(400, "The request body must be a JSON object.")
+    return data
+
+
+# --- Variant handlers: (request body, query parameters) -> (package bytes, file name) ---
+def generate_podcast(body: bytes, query: dict) -> tuple:
+    """Markdown file as uploaded to h5p_podcast_gem/bulk.py. ?youtube_url= overrides Block 1's URL."""
+    process_md_folder = load_variant("h5p_podcast_gem", "process_md_folder")["process_md_folder"]
+    try:
+        md_content = body.decode("utf-8")
+    except UnicodeDecodeError as e:
+        raise RequestError(400, f"The markdown file must be UTF-8: {e}")
+
+    md_intro, md_video, md_questions, md_errors = process_md_folder.parse_md_file_content(md_content)
+    if md_errors:
+        raise RequestError(400, "\n".join(md_errors))
+    h5p_bytes, filename, error = process_md_folder.do_h5p_generation(
+        query.get("youtube_url"), md_intro, md_video, md_questions)
+    if error:
+        raise RequestError(422, error)
+    return h5p_bytes, filename
+
+
+def _generate_iframe_book(directory: str, data: dict, with_title: bool) -> tuple:
+    modules = load_variant(directory, "booklet_generator_iframe", "utils_booklet_iframe")
+    booklet_generator = modules["booklet_generator_iframe"]
+    utils_booklet = modules["utils_booklet_iframe"]
+    if not data.get("iframeUrl"):
+        raise RequestError(400, "No 'iframeUrl' in the request.")
+
+    templates_dir = REPO_ROOT / directory / "templates"
+    template_zip_path = templates_dir / "template.zip"
+    cover_image_path = templates_dir / "img_1.png"
+    if not template_zip_path.exists() or not cover_image_path.exists():
+        raise RequestError(500, f"Template files missing in {templates_dir}")
+
+    book_overall_title = data.get("book", {}).get("title", "Generated InteractiveBook")
+    h5p_cover_image_path = "images/img_1.png"
+    if with_title:
+        content_dict = booklet_generator.create_booklet_content_json_structure(
+            data, h5p_cover_image_path, book_overall_title)
+    else:
+        content_dict = booklet_generator.create_booklet_content_json_structure(data, h5p_cover_image_path)
+    h5p_bytes = utils_booklet.create_h5p_package(
+        utils_booklet.serialize_json(content_dict),
+        utils_booklet.serialize_json(booklet_generator.generate_h5p_json_dict(book_overall_title)),
+        str(template_zip_path),
+        [(str(cover_image_path), h5p_cover_image_path)]
+    )
+    if not h5p_bytes:
+        raise RequestError(500, "H5P package generation failed.")
+    return h5p_bytes, _clean_filename(book_overall_title, "InteractiveBook_IFrame")
+
+
+def generate_iframe(body: bytes, query: dict) -> tuple:
+    """Merged input of h5p_iframe_gem: iframeUrl, book, chapter1_introduction ... chapter4_questions."""
+    return _generate_iframe_book("h5p_iframe_gem", _json_object(body), with_title=False)
+
+
+def generate_iframe_text(body: bytes, query: dict) -> tuple:
+    """Merged input of h5p_iframe_text, optionally with chapter5_assignment."""
+    return _generate_iframe_book("h5p_iframe_text", _json_object(body), with_title=True)
+
+
+def generate_annual_review(body: bytes, query: dict) -> tuple:
+    """
+    JR annual review: {"chapters": [chapter JSON, ...], "roman_number": "II", "months_text": "März-April",
+    "mentimeter_urls": [step 6, step 7], "cover": file, "files": [memory images],
+    "deterministic_ids": optional bool}.
+    """
+    modules = load_variant("JR", "booklet_generator_iframe", "utils_booklet_iframe")
+    booklet_generator = modules["booklet_generator_iframe"]
+    utils_booklet = modules["utils_booklet_iframe"]
+    data = _json_object(body)
+
+    chapters = data.get("chapters")
+    if not isinstance(chapters, list):
+        raise RequestError(400, "'chapters' must be a list of chapter objects.")
+    roman_number = str(data.get("roman_number", "II"))
+    mentimeter_urls = tuple(data.get("mentimeter_urls") or (None, None))
+    if len(mentimeter_urls) != 2:
+        raise RequestError(400, "'mentimeter_urls' must hold two URLs (steps 6 and 7).")
+
+    extra_files = []
+    cover_filename_param = "images/title_2025.png"
+    if data.get("cover"):
+        cover = _decode_file(data["cover"])
+        cover_filename_param = f"images/{Path(cover['filename']).name}"
+        extra_files.append({"filename": cover_filename_param,
+                            "data": utils_booklet.compress_image_if_needed(cover["data"], cover["filename"])})
+    for file in data.get("files", []):
+        image = _decode_file(file)
+        extra_files.append({"filename": f"images/{Path(image['filename']).name}",
+                            "data": utils_booklet.compress_image_if_needed(image["data"], image["filename"])})
+
+    book_title = f"Jahresrückblick {roman_number}"
+    months_text = str(data.get("months_text", ""))
+    content_structure = booklet_generator.create_booklet_content_json_structure(
+        chapters,
+        roman_number=roman_number,
+        months_text=months_text,
+        cover_image_name=cover_filename_param,
+        mentimeter_urls=mentimeter_urls,
+        # Opt-in: books sharing a namespace share their subContentIds
+        id_namespace=f"{book_title} {months_text}" if data.get("deterministic_ids") else None
+    )
+    h5p_bytes = utils_booklet.create_h5p_package(
+        utils_booklet.serialize_content_json(content_structure),
+        utils_booklet.serialize_json(booklet_generator.generate_h5p_json_dict(book_title)),
+        str(REPO_ROOT / "JR" / "templates" / "template.zip"),
+        extra_files
+    )
+    if not h5p_bytes:
+        raise RequestError(500, "H5P package generation failed.")
+    return h5p_bytes, f"jahresrueckblick_{roman_number}.h5p"
+
+
+def generate_transcript(body: bytes, query: dict) -> tuple:
+    """
+    autoimage pipeline: {"transcript", "title", "video_url", "model": optional Gemini model,
+    "cover": optional file, "deterministic_ids": optional bool}.
+    """
+    cli_generator = load_variant("autoimage", "cli_generator")["cli_generator"]
+    data = _json_object(body)
+    missing = [key for key in ("transcript", "title", "video_url") if not data.get(key)]
+    if missing:
+        raise RequestError(400, f"Missing fields: {', '.join(missing)}")
+    if cli_generator.llm_backend is None and not cli_generator.configure_llm():
+        raise RequestError(503, "GEMINI_API_KEY is not configured on the server.")
+
+    with tempfile.TemporaryDirectory(prefix="h5p_transcript_") as work_dir:
+        cover_image_path = None
+        if data.get("cover"):
+            cover = _decode_file(data["cover"])
+            cover_image_path = Path(work_dir) / Path(cover["filename"]).name
+            cover_image_path.write_bytes(cover["data"])
+
+        h5p_bytes = cli_generator.build_h5p_package(
+            data["transcript"], data["title"], data["video_url"],
+            cover_image_path=str(cover_image_path) if cover_image_path else None,
+            model_name=data.get("model", "gemini-flash-latest"),
+            id_namespace=data["title"] if data.get("deterministic_ids") else None,
+            work_dir=str(Path(work_dir) / "images")
+        )
+    if not h5p_bytes:
+        raise RequestError(500, "H5P package generation failed.")
+    return h5p_bytes, _clean_filename(data["title"], "InteractiveBook")
+
+
+ROUTES = {
+    "/podcast": generate_podcast,
+    "/iframe": generate_iframe,
+    "/iframe-text": generate_iframe_text,
+    "/annual-review": generate_annual_review,
+    "/transcript": generate_transcript,
+}
+
+
+# --- HTTP ---
+class GenerationHandler(BaseHTTPRequestHandler):
+    server_version = "H5PGenerator/1.0"
+    protocol_version = "HTTP/1.1"
+    # Log the JSON run report (see timing.py) of every generation, set by --report
+    log_reports = False
+
+    def _send_json(self, status: int, data: dict):
+        payload = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_package(self, h5p_bytes: bytes, filename: str, report: timing.RunReport):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/zip")
+        # Stage durations for the caller, e.g. visible in browser dev tools
+        self.send_header("Server-Timing", ", ".join(
+            f"{name.replace('.', '-')};dur={stage['total_ms']}" for name, stage in report.to_dict()["stages"].items()))
+        self.send_header("Content-Length", str(len(h5p_bytes)))
+        # Titles may hold any character: ASCII fallback plus the UTF-8 name (RFC 6266)
+        ascii_name = filename.encode("ascii", "replace").decode("ascii").replace("?", "_")
+        self.send_header("Content-Disposition", f"attachment; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(filename)}")
+        self.end_headers()
+        view = memoryview(h5p_bytes)
+        for start in range(0, len(view), RESPONSE_CHUNK_SIZE):
+            self.wfile.write(view[start:start + RESPONSE_CHUNK_SIZE])
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/health":
+            self._send_json(200, {"status": "ok", "endpoints": sorted(ROUTES)})
+        elif path == "/metrics":
+            payload = metrics.expose().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", metrics.CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        else:
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        handler = ROUTES.get(url.path)
+        if handler is None:
+            self._send_json(404, {"error": f"Unknown endpoint {url.path}, expected one of {sorted(ROUTES)}"})
+            return
+
+        length_header = self.headers.get("Content-Length")
+        if length_header is None:
+            self._send_json(411, {"error": "Content-Length header required"})
+            self.close_connection = True
+            return
+        try:
+            length = int(length_header)
+        except ValueError:
+            length = -1
+        if length < 0:
+            self._send_json(400, {"error": f"Invalid Content-Length header {length_header!r}"})
+            self.close_connection = True
+            return
+        if length > MAX_BODY_BYTES:
+            self._send_json(413, {"error": f"Request body larger than {MAX_BODY_BYTES} bytes"})
+            self.close_connection = True
+            return
+        body = self.rfile.read(length)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+        try:
+            with timing.run(url.path) as report:
+                h5p_bytes, filename = handler(body, query)
+        except RequestError as e:
+            self._send_json(e.status, {"error": str(e)})
+            return
+        except Exception as e:
+            logger.error(f"{url.path} failed: {e}\n{traceback.format_exc()}")
+            self._send_json(500, {"error": f"Error during package generation: {e}"})
+            return
+        if self.log_reports:
+            logger.info(f"Run report {url.path}: {report.to_json(pretty=False)}")
+        self._send_package(h5p_bytes, filename, report)
+
+    def log_message(self, format, *args):
+        logger.info(f"{self.address_string()} {format % args}")
+
+
+def warm_up():
+    """Imports the variants and reads their templates before the first request."""
+    for directory, modules in (("h5p_podcast_gem", ("process_md_folder",)),
+                               ("h5p_iframe_gem", ("booklet_generator_iframe", "utils_booklet_iframe")),
+                               ("h5p_iframe_text", ("booklet_generator_iframe", "utils_booklet_iframe")),
+                               ("JR", ("booklet_generator_iframe", "utils_booklet_iframe"))):
+        try:
+            load_variant(directory, *modules)
+            template_zip_path = REPO_ROOT / directory / "templates" / "template.zip"
+            if template_zip_path.exists():
+                resources.template_entries(str(template_zip_path))
+        except Exception as e:
+            logger.warning(f"Could not preload {directory}: {e}")
+
+
+# --- CLI ---
+def main():
+    parser = argparse.ArgumentParser(description="HTTP service generating H5P packages for every variant")
+    parser.add_argument("--host", default=os.environ.get("H5P_SERVER_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("H5P_SERVER_PORT", 8000)))
+    parser.add_argument("--no-warm-up", action="store_true", help="Load variants on their first request")
+    parser.add_argument("--report", action="store_true",
+                        help="Log a JSON report of stage durations, bytes and cache hit rates per request")
+    parser.add_argument("--import-profile", action="store_true",
+                        help="Print the import time of each module loaded by the warm-up")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    GenerationHandler.log_reports = args.report
+    profiler = lazy.ImportProfiler().start() if args.import_profile else None
+    if not args.no_warm_up:
+        warm_up()
+    if profiler is not None:
+        profiler.stop()
+        print(profiler.report(), file=sys.stderr)
+    server = ThreadingHTTPServer((args.host, args.port), GenerationHandler)
+    logger.info(f"Serving on http://{args.host}:{args.port} ({', '.join(sorted(ROUTES))})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Per-stage timing of a generation run.
+
+A run collects the spans, byte counts and cache lookups of everything that
+happens inside it, including code running in other threads through bind():
+
+    with timing.run("transcript") as report:
+        with timing.span("llm.intro") as span:
+            response = model.generate_content(prompt)
+            span.bytes = len(response.text)
+        ...
+    print(report.to_json())
+
+Spans with the same name add up, so the report shows per stage how often it ran,
+for how long in total and at most, and how many bytes it moved. Spans may nest
+(e.g. "download" inside "memory_assets"), so stage totals overlap and do not sum
+to the run duration.
+
+Outside a run, span() and the cache counters do nothing beyond a context variable
+lookup, so library code can stay instrumented permanently. Observers registered
+with on_span() (see metrics.py) see every finished span, inside a run or not.
+"""
+import contextlib
+import contextvars
+import json
+import threading
+import time
+
+_current_run = contextvars.ContextVar("h5p_timing_run", default=None)
+
+# Called with (stage name, seconds, bytes or None, failed) for every finished span
+_span_observers = []
+
+
+class Span:
+    """An open span. Set bytes to the amount of data the stage read, downloaded or wrote."""
+    __slots__ = ("name", "bytes")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.bytes = None
+
+
+class RunReport:
+    """Stage durations, byte counts and cache hit rates of one run. Thread-safe."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.time()
+        self.duration = None
+        self._started_counter = time.perf_counter()
+        self._lock = threading.Lock()
+        # stage name -> [count, total seconds, max seconds, bytes]
+        self._stages = {}
+        # cache name -> [lookups, misses]
+        self._caches = {}
+
+    def add_span(self, name: str, seconds: float, n_bytes: int = None):
+        with self._lock:
+            stage = self._stages.setdefault(name, [0, 0.0, 0.0, 0])
+            stage[0] += 1
+            stage[1] += seconds
+            stage[2] = max(stage[2], seconds)
+            if n_bytes:
+                stage[3] += n_bytes
+
+    def add_cache(self, name: str, lookups: int = 0, misses: int = 0):
+        with self._lock:
+            cache = self._caches.setdefault(name, [0, 0])
+            cache[0] += lookups
+            cache[1] += misses
+
+    def finish(self):
+        self.duration = time.perf_counter() - self._started_counter
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            stages = {
+                name: {"count": count, "total_ms": round(total * 1000, 3), "max_ms": round(longest * 1000, 3),
+                       "bytes": n_bytes}
+                for name, (count, total, longest, n_bytes) in self._stages.items()
+            }
+            caches = {
+                name: {"lookups": lookups, "misses": misses,
+                       "hit_rate": round((lookups - misses) / lookups, 3) if lookups else None}
+                for name, (lookups, misses) in self._caches.items()
+            }
+        duration = self.duration if self.duration is not None else time.perf_counter() - self._started_counter
+        return {
+            "run": self.name,
+            "started": self.started,
+            "duration_ms": round(duration * 1000, 3),
+            "stages": stages,
+            "caches": caches,
+        }
+
+    def to_json(self, pretty: bool = True) -> str:
+        return json.dumps(self.to_dict(), ensure_ascii=False, indent=2 if pretty else None)
+
+
+@contextlib.contextmanager
+def run(name: str):
+    """Collects the spans of the enclosed code into a new RunReport, which it yields."""
+    report = RunReport(name)
+    token = _current_run.set(report)
+    try:
+        yield report
+    finally:
+        report.finish()
+        _current_run.reset(token)
+
+
+def current_run() -> RunReport | None:
+    return _current_run.get()
+
+
+def on_span(observer):
+    """Registers observer(stage name, seconds, bytes, failed) for every finished span. Usable as a decorator."""
+    _span_observers.append(observer)
+    return observer
+
+
+@contextlib.contextmanager
+def span(name: str):
+    """Times the enclosed stage. Yields a Span whose bytes the caller may set. Also usable as a decorator."""
+    report = _current_run.get()
+    current = Span(name)
+    if report is None and not _span_observers:
+        yield current
+        return
+    started = time.perf_counter()
+    failed = False
+    try:
+        yield current
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        if report is not None:
+            report.add_span(name, elapsed, current.bytes)
+        for observer in _span_observers:
+            observer(name, elapsed, current.bytes, failed)
+
+
+def cache_lookup(name: str, hit: bool = None):
+    """Counts a lookup in the named cache, and a miss when hit is False (see cache_miss)."""
+    report = _current_run.get()
+    if report is not None:
+        report.add_cache(name, lookups=1, misses=0 if hit is None or hit else 1)
+
+
+def cache_miss(name: str):
+    """Counts a miss of a lookup already counted, e.g. from inside the function a cache wraps."""
+    report = _current_run.get()
+    if report is not None:
+        report.add_cache(name, misses=1)
+
+
+def bind(func):
+    """func, bound to the current run, for thread pools (context variables do not follow threads)."""
+    report = _current_run.get()
+    if report is None:
+        return func
+
+    def bound(*args, **kwargs):
+        token = _current_run.set(report)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _current_run.reset(token)
+    return bound
@@ -0,0 +1,179 @@
+"""
+Single-pass validation of generated .h5p packages.
+
+The central directory is read once to index the entries. content.json is
+walked for every "path" and "library" reference, and h5p.json plus the bundled
+library.json files are followed for library dependencies. Reported:
+  - errors: referenced files or libraries that are not in the package, including
+    editorDependencies, which the H5P importer requires as well
+  - warnings: content/ files and library folders nothing refers to
+
+Check a folder of packages with:
+    python -m h5p_common.validate output/ [more.h5p ...]
+"""
+import argparse
+import io
+import json
+import logging
+import sys
+import zipfile
+from pathlib import Path
+
+from h5p_common import packaging
+
+logger = logging.getLogger(__name__)
+
+DEPENDENCY_KEYS = ("preloadedDependencies", "dynamicDependencies", "editorDependencies")
+
+
+def _walk_references(node, paths: set, libraries: set):
+    """Collects "path" values and "library" folders from a content.json tree."""
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if isinstance(value, str):
+                if key == "path":
+                    paths.add(value)
+                elif key == "library":
+                    machine_name, _, version = value.partition(" ")
+                    if version:
+                        libraries.add(f"{machine_name}-{version}")
+            else:
+                _walk_references(value, paths, libraries)
+    elif isinstance(node, list):
+        for item in node:
+            _walk_references(item, paths, libraries)
+
+
+def _is_external(path: str) -> bool:
+    return "://" in path or path.startswith("//")
+
+
+def validate_package(package) -> dict:
+    """
+    Validates an .h5p package.
+
+    :param package: Bytes of the package or a path to an .h5p file.
+    :return: {"errors": [...], "warnings": [...]} with readable messages.
+    """
+    report = {"errors": [], "warnings": []}
+    source = io.BytesIO(package) if isinstance(package, (bytes, bytearray)) else package
+    try:
+        package_zip = zipfile.ZipFile(source)
+    except (OSError, zipfile.BadZipFile) as e:
+        report["errors"].append(f"Not a readable zip file: {e}")
+        return report
+
+    with package_zip:
+        names = set(package_zip.namelist())
+        for required in (packaging.H5P_JSON_NAME, packaging.CONTENT_JSON_NAME):
+            if required not in names:
+                report["errors"].append(f"Missing {required}")
+        if report["errors"]:
+            return report
+
+        try:
+            h5p_json = json.loads(package_zip.read(packaging.H5P_JSON_NAME))
+            content_json = json.loads(package_zip.read(packaging.CONTENT_JSON_NAME))
+        except ValueError as e:
+            report["errors"].append(f"Invalid JSON: {e}")
+            return report
+
+        paths, content_libraries = set(), set()
+        _walk_references(content_json, paths, content_libraries)
+
+        # --- File references ---
+        referenced_files = set()
+        for path in sorted(paths):
+            if not path or _is_external(path):
+                continue
+            entry_name = packaging.to_package_path(path)
+            referenced_files.add(entry_name)
+            if entry_name not in names:
+                report["errors"].append(f"content.json references missing file '{path}'")
+
+        # --- Library references ---
+        library_index = {}
+        for name in names:
+            folder = packaging.entry_library(name)
+            if folder is not None and name == f"{folder}/library.json":
+                try:
+                    library_index[folder] = json.loads(package_zip.read(name))
+                except ValueError as e:
+                    report["errors"].append(f"Invalid {name}: {e}")
+
+    roots = {packaging.library_folder(dep) for dep in h5p_json.get("preloadedDependencies", [])}
+    for folder in sorted(content_libraries - roots):
+        report["warnings"].append(f"Library {folder} is used in content.json but not listed in h5p.json")
+
+    missing = set()
+    for folder in sorted(roots | content_libraries):
+        if folder not in library_index:
+            missing.add(folder)
+            report["errors"].append(f"Library {folder} is referenced but not bundled")
+    for folder, library in sorted(library_index.items()):
+        for key in DEPENDENCY_KEYS:
+            for dependency in library.get(key, []):
+                dependency_folder = packaging.library_folder(dependency)
+                if dependency_folder in library_index or dependency_folder in missing:
+                    continue
+                missing.add(dependency_folder)
+                report["errors"].append(f"Library {dependency_folder} (needed by {folder}) is not bundled")
+
+    # --- Unused files ---
+    for name in sorted(names):
+        if packaging.is_media_entry(name) and name not in referenced_files:
+            report["warnings"].append(f"Unused file '{name}'")
+    needed = set()
+    pending = [folder for folder in roots | content_libraries if folder in library_index]
+    while pending:
+        folder = pending.pop()
+        if folder in needed:
+            continue
+        needed.add(folder)
+        for key in DEPENDENCY_KEYS:
+            dependencies = map(packaging.library_folder, library_index[folder].get(key, []))
+            pending.extend(dependency for dependency in dependencies if dependency in library_index)
+    for folder in sorted(library_index.keys() - needed):
+        report["warnings"].append(f"Unused library {folder}")
+
+    return report
+
+
+def log_report(report: dict, label: str = "Package"):
+    for message in report["errors"]:
+        logger.error(f"{label}: {message}")
+    for message in report["warnings"]:
+        logger.warning(f"{label}: {message}")
+
+
+# --- CLI ---
+def main():
+    parser = argparse.ArgumentParser(description="Validate generated .h5p packages")
+    parser.add_argument("paths", nargs="+", help=".h5p files or folders containing them")
+    parser.add_argument("--quiet", "-q", action="store_true", help="Only print packages with errors")
+    args = parser.parse_args()
+
+    packages = []
+    for path in map(Path, args.paths):
+        packages.extend(sorted(path.glob("*.h5p")) if path.is_dir() else [path])
+
+    failed = 0
+    for package_path in packages:
+        report = validate_package(package_path)
+        if report["errors"]:
+            failed += 1
+        elif args.quiet:
+            continue
+        print(f"{'FAIL' if report['errors'] else 'OK  '} {package_path}")
+        for message in report["errors"]:
+            print(f"    error: {message}")
+        if not args.quiet:
+            for message in report["warnings"]:
+                print(f"    warning: {message}")
+
+    print(f"{len(packages) - failed}/{len(packages)} packages valid")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 import json
 import utils_booklet_iframe as utils_booklet # Renamed for clarity
+from h5p_common import ids, ir, render
 
 # --- H5P Structure Default Values ---
 DEFAULT_H5P_IMAGE_PARAMS_BASE = {
@@ -49,53 +50,23 @@ def generate_h5p_json_dict(book_overall_title: str):
         ]
     }
 
-# --- content.json generation ---
-def create_booklet_content_json_structure(data: dict, h5p_cover_image_path: str, book_overall_title: str) -> dict:
-    """
-    Creates the Python dictionary for the H5P.InteractiveBook content.json (IFrame version).
-    """
-    # --- Data Extraction ---
-    book_data = data.get("book", {})
-    ch1_data = data.get("chapter1_introduction", {})
-    ch2_data = data.get("chapter2_iframe", {})
-    ch3_data = data.get("chapter3_summary", {})
-    ch4_data = data.get("chapter4_questions", {})
-    ch5_assignment_data = data.get("chapter5_assignment") # Can be None
-    
-    iframe_url = data.get("iframeUrl", "")
+# --- Chapters ---
+# Each emitter renders one parsed chapter (see h5p_common/ir.py) and is registered for its type
+RENDERERS = render.Registry()
 
-    # --- Cover Page ---
-    cover_page_data = book_data.get("coverPage", {})
-    cover_description_html = f"{cover_page_data.get('title', '<h1>Cover Title</h1>')}{cover_page_data.get('subtitle', '')}"
+@RENDERERS.register(ir.IntroChapter)
+def create_intro_chapter(chapter: ir.IntroChapter) -> dict:
+    bullet_points_html = "".join(chapter.bullet_points)
     
-    cover_image_file_params = {**DEFAULT_H5P_IMAGE_PARAMS_BASE, "path": h5p_cover_image_path}
-    cover_image_full_params = {**DEFAULT_H5P_IMAGE_WRAPPER_PARAMS, "file": cover_image_file_params}
-    cover_image_metadata = {**DEFAULT_H5P_IMAGE_METADATA, "title": "Cover Bild"}
-
-    book_cover = {
-        "coverDescription": cover_description_html,
-        "coverMedium": {
-            "params": cover_image_full_params,
-            "library": "H5P.Image 1.1",
-            "metadata": cover_image_metadata,
-            "subContentId": utils_booklet.generate_uuid()
-        }
-    }
-
-    # --- Chapter 1: Introduction ---
-    intro_content_data = ch1_data.get("introductionContent", {})
-    bullet_points_list = intro_content_data.get("bulletPoints", [])
-    bullet_points_html = "".join(bullet_points_list)
-    
-    if bullet_points_html and not bullet_points_html.strip().lower().startswith("<ul>") and bullet_points_list:
+    if bullet_points_html and not bullet_points_html.strip().lower().startswith("<ul>") and chapter.bullet_points:
         bullet_points_html_complete = f"<ul>{bullet_points_html}</ul>"
     else:
         bullet_points_html_complete = bullet_points_html
 
     intro_text_html = (
-        f"{intro_content_data.get('title', '')}"
+        f"{chapter.heading}"
         f"{bullet_points_html_complete}"
-        f"{intro_content_data.get('guidanceText', '')}"
+        f"{chapter.guidance}"
     )
     
     chapter1_text = {
@@ -108,16 +79,15 @@ def create_booklet_content_json_structure(data: dict, h5p_cover_image_path: str,
         "useSeparator": "auto"
     }
 
-    accordion_section_data = ch1_data.get("accordion", {})
     accordion_panels = []
-    for definition_item in accordion_section_data.get("definitions", []):
+    for panel in chapter.accordion.panels:
         accordion_panels.append({
-            "title": definition_item.get("term", "N/A"),
+            "title": panel.title,
             "content": {
-                "params": {"text": definition_item.get("definition", "")},
+                "params": {"text": panel.text},
                 "library": "H5P.AdvancedText 1.1",
                 "subContentId": utils_booklet.generate_uuid(),
-                "metadata": {**DEFAULT_H5P_ADVANCED_TEXT_METADATA, "title": f"Definition: {definition_item.get('term', 'N/A')}"}
+                "metadata": {**DEFAULT_H5P_ADVANCED_TEXT_METADATA, "title": f"Definition: {panel.title}"}
             }
         })
     
@@ -127,31 +97,30 @@ def create_booklet_content_json_structure(data: dict, h5p_cover_image_path: str,
             "library": "H5P.Accordion 1.0",
             "metadata": {
                 "contentType": "Accordion", "license": "U", 
-                "title": accordion_section_data.get("titleForElement", "Begriffe"),
-                "authors": [], "changes": [], "extraTitle": accordion_section_data.get("titleForElement", "Begriffe")
+                "title": chapter.accordion.title,
+                "authors": [], "changes": [], "extraTitle": chapter.accordion.title
             },
             "subContentId": utils_booklet.generate_uuid()
         },
         "useSeparator": "auto"
     }
     
-    chapter1_column = {
+    return {
         "params": {"content": [chapter1_text, chapter1_accordion]},
         "library": "H5P.Column 1.18",
         "subContentId": utils_booklet.generate_uuid(),
         "metadata": {
             "contentType": "Column", "license": "U", 
-            "title": ch1_data.get("titleForChapter", "Einleitung"),
-            "authors": [], "changes": [], "extraTitle": ch1_data.get("titleForChapter", "Einleitung")
+            "title": chapter.title,
+            "authors": [], "changes": [], "extraTitle": chapter.title
         }
     }
 
-    # --- Chapter 2: IFrame ---
-    iframe_section_intro_data = ch2_data.get("iframeSectionIntro", {})
-    chapter2_intro_text_html = f"{iframe_section_intro_data.get('title', '')}{iframe_section_intro_data.get('instruction', '')}"
+@RENDERERS.register(ir.IFrameChapter)
+def create_iframe_chapter(chapter: ir.IFrameChapter) -> dict:
     chapter2_intro_text = {
         "content": {
-            "params": {"text": chapter2_intro_text_html},
+            "params": {"text": f"{chapter.intro.title}{chapter.intro.instruction}"},
             "library": "H5P.AdvancedText 1.1",
             "metadata": {**DEFAULT_H5P_ADVANCED_TEXT_METADATA, "title": "Iframe Einleitung"},
             "subContentId": utils_booklet.generate_uuid()
@@ -159,44 +128,43 @@ def create_booklet_content_json_structure(data: dict, h5p_cover_image_path: str,
         "useSeparator": "auto"
     }
 
-    iframe_embed_data = ch2_data.get("iframeEmbed", {})
+    embed = chapter.embed
     chapter2_iframe_embed = {
         "content": {
             "params": {
-                "source": iframe_url,
-                "width": iframe_embed_data.get("width", "700"),
-                "minWidth": iframe_embed_data.get("minWidth", "400"),
-                "height": iframe_embed_data.get("height", "500"),
+                "source": embed.source,
+                "width": embed.width,
+                "minWidth": embed.min_width,
+                "height": embed.height,
                 "resizeSupported": True
             },
             "library": "H5P.IFrameEmbed 1.0",
             "metadata": {
                 "contentType": "Iframe Embedder", "license": "U",
-                "title": iframe_embed_data.get("titleForElement", "Externer Inhalt"),
-                "authors": [], "changes": [], "extraTitle": iframe_embed_data.get("titleForElement", "Externer Inhalt")
+                "title": embed.title,
+                "authors": [], "changes": [], "extraTitle": embed.title
             },
             "subContentId": utils_booklet.generate_uuid()
         },
         "useSeparator": "auto"
     }
 
-    chapter2_iframe_column = {
+    return {
         "params": {"content": [chapter2_intro_text, chapter2_iframe_embed]},
         "library": "H5P.Column 1.18",
         "subContentId": utils_booklet.generate_uuid(),
         "metadata": {
             "contentType": "Column", "license": "U", 
-            "title": ch2_data.get("titleForChapter", "Beitrag"),
-            "authors": [], "changes": [], "extraTitle": ch2_data.get("titleForChapter", "Beitrag")
+            "title": chapter.title,
+            "authors": [], "changes": [], "extraTitle": chapter.title
         }
     }
 
-    # --- Chapter 3: Summary ---
-    summary_section_intro_data = ch3_data.get("summarySectionIntro", {})
-    chapter3_intro_text_html = f"{summary_section_intro_data.get('title', '')}{summary_section_intro_data.get('instruction', '')}"
+@RENDERERS.register(ir.SummaryChapter)
+def create_summary_chapter(chapter: ir.SummaryChapter) -> dict:
     chapter3_intro_text = {
         "content": {
-            "params": {"text": chapter3_intro_text_html},
+            "params": {"text": f"{chapter.intro.title}{chapter.intro.instruction}"},
             "library": "H5P.AdvancedText 1.1",
             "metadata": {**DEFAULT_H5P_ADVANCED_TEXT_METADATA, "title": "Zusammenfassung Einleitung"},
             "subContentId": utils_booklet.generate_uuid()
@@ -204,13 +172,13 @@ def create_booklet_content_json_structure(data: dict, h5p_cover_image_path: str,
         "useSeparator": "auto"
     }
     
-    summary_element_data = ch3_data.get("summaryElement", {})
+    summary = chapter.summary
     h5p_summary_tasks = []
-    for task_item in summary_element_data.get("summaries", []):
+    for task in summary.tasks:
         h5p_summary_tasks.append({
-            "summary": task_item.get("choices", ["Placeholder - no choices provided"]),
+            "summary": task.statements,
             "subContentId": utils_booklet.generate_uuid(),
-            "tip": task_item.get("tip", "")
+            "tip": task.tip
         })
     
     if not h5p_summary_tasks:
@@ -224,7 +192,7 @@ def create_booklet_content_json_structure(data: dict, h5p_cover_image_path: str,
     chapter3_summary_element = {
         "content": {
             "params": {
-                "intro": summary_element_data.get("introText", "<p>Wähle die korrekte Aussage.</p>"),
+                "intro": summary.intro,
                 "overallFeedback": [{"from": 0, "to": 100}],
                 "solvedLabel":"Fortschritt:", "scoreLabel":"Falsche Antworten:", "resultLabel":"Dein Ergebnis",
                 "labelCorrect":"Richtig.", "labelIncorrect":"Falsch! Bitte versuche es noch einmal.",
@@ -236,31 +204,30 @@ def create_booklet_content_json_structure(data: dict, h5p_cover_image_path: str,
             "library": "H5P.Summary 1.10",
             "metadata": {
                 "contentType": "Summary", "license": "U",
-                "title": summary_element_data.get("titleForElement", "Zusammenfassung"),
-                "authors": [], "changes": [], "extraTitle": summary_element_data.get("titleForElement", "Zusammenfassung")
+                "title": summary.title,
+                "authors": [], "changes": [], "extraTitle": summary.title
             },
             "subContentId": utils_booklet.generate_uuid()
         },
         "useSeparator": "auto"
     }
 
-    chapter3_summary_column = {
+    return {
         "params": {"content": [chapter3_intro_text, chapter3_summary_element]},
         "library": "H5P.Column 1.18",
         "subContentId": utils_booklet.generate_uuid(),
         "metadata": {
             "contentType": "Column", "license": "U", 
-            "title": ch3_data.get("titleForChapter", "Zusammenfassung"),
-            "authors": [], "changes": [], "extraTitle": ch3_data.get("titleForChapter", "Zusammenfassung")
+            "title": chapter.title,
+            "authors": [], "changes": [], "extraTitle": chapter.title
         }
     }
 
-    # --- Chapter 4: Question Set ---
-    qs_intro_data = ch4_data.get("questionSectionIntro", {})
-    chapter4_intro_text_html = f"{qs_intro_data.get('title', '')}{qs_intro_data.get('instruction', '')}"
+@RENDERERS.register(ir.QuestionChapter)
+def create_question_chapter(chapter: ir.QuestionChapter) -> dict:
     chapter4_intro_text = {
         "content": {
-            "params": {"text": chapter4_intro_text_html},
+            "params": {"text": f"{chapter.intro.title}{chapter.intro.instruction}"},
             "library": "H5P.AdvancedText 1.1",
             "metadata": {**DEFAULT_H5P_ADVANCED_TEXT_METADATA, "title": "Fragen Einleitung"},
             "subContentId": utils_booklet.generate_uuid()
@@ -268,20 +235,20 @@ def create_booklet_content_json_structure(data: dict, h5p_cover_image_path: str,
         "useSeparator": "auto"
     }
 
-    qs_section_data = ch4_data.get("questionSet", {})
-    mapped_questions = utils_booklet.map_questions_to_h5p_array(qs_section_data.get("questions", []))
+    pool = chapter.pool
+    mapped_questions = utils_booklet.map_questions_to_h5p_array(pool.questions)
     
     chapter4_question_set = {
         "content": {
             "params": {
                 "introPage": { 
                     "showIntroPage": True, "startButtonText": "Quiz starten",
-                    "title": qs_section_data.get("introPageTitle", "Verständnisfragen Quiz"),
-                    "introduction": qs_section_data.get("introPageIntroduction", "")
+                    "title": pool.intro_page_title,
+                    "introduction": pool.intro_page_text
                 },
                 "progressType": "dots", "passPercentage": 50, "disableBackwardsNavigation": False,
                 "randomQuestions": True, 
-                "poolSize": qs_section_data.get("poolSize", 10),
+                "poolSize": pool.pool_size,
                 "questions": mapped_questions,
                 "endGame": {
                     "showResultPage":True,"showSolutionButton":True,"showRetryButton":True,
@@ -302,69 +269,93 @@ def create_booklet_content_json_structure(data: dict, h5p_cover_image_path: str,
             "library": "H5P.QuestionSet 1.20",
             "metadata": {
                 "contentType": "Question Set", "license": "U", 
-                "title": qs_section_data.get("titleForElement", "Fragenset"),
-                "authors": [], "changes": [], "extraTitle": qs_section_data.get("titleForElement", "Fragenset")
+                "title": pool.title,
+                "authors": [], "changes": [], "extraTitle": pool.title
             },
             "subContentId": utils_booklet.generate_uuid()
         },
         "useSeparator": "auto"
     }
 
-    chapter4_qs_column = {
+    return {
         "params": {"content": [chapter4_intro_text, chapter4_question_set]},
         "library": "H5P.Column 1.18",
         "subContentId": utils_booklet.generate_uuid(),
         "metadata": {
             "contentType": "Column", "license": "U", 
-            "title": ch4_data.get("titleForChapter", "Verständnisfragen"),
-            "authors": [], "changes": [], "extraTitle": ch4_data.get("titleForChapter", "Verständnisfragen")
+            "title": chapter.title,
+            "authors": [], "changes": [], "extraTitle": chapter.title
         }
     }
 
-    # --- Assemble Chapters List ---
-    chapters_list = [chapter1_column, chapter2_iframe_column, chapter3_summary_column, chapter4_qs_column]
-
-    # --- Chapter 5: Assignment IFrame (Conditional) ---
-    if ch5_assignment_data:
-        assignment_url = utils_booklet.generate_assignment_iframe_url(ch5_assignment_data, book_overall_title)
-        
-        chapter5_assignment_iframe_embed = {
-            "content": {
-                "params": {
-                    "source": assignment_url,
-                    "width": "720", # Default width for this type of assignment
-                    "height": "1600", # Default height
-                    "resizeSupported": True
-                },
-                "library": "H5P.IFrameEmbed 1.0",
-                "metadata": {
-                    "contentType": "Iframe Embedder", "license": "U",
-                    "title": ch5_assignment_data.get("titleForChapter", "Aufgabe"),
-                    "authors": [], "changes": [], "extraTitle": ch5_assignment_data.get("titleForChapter", "Aufgabe")
-                },
-                "subContentId": utils_booklet.generate_uuid()
+@RENDERERS.register(ir.AssignmentChapter, "book_overall_title")
+def create_assignment_chapter(chapter: ir.AssignmentChapter, book_overall_title: str) -> dict:
+    assignment_url = utils_booklet.generate_assignment_iframe_url(chapter.data, book_overall_title)
+    
+    chapter5_assignment_iframe_embed = {
+        "content": {
+            "params": {
+                "source": assignment_url,
+                "width": "720", # Default width for this type of assignment
+                "height": "1600", # Default height
+                "resizeSupported": True
             },
-            "useSeparator": "auto"
+            "library": "H5P.IFrameEmbed 1.0",
+            "metadata": {
+                "contentType": "Iframe Embedder", "license": "U",
+                "title": chapter.title,
+                "authors": [], "changes": [], "extraTitle": chapter.title
+            },
+            "subContentId": utils_booklet.generate_uuid()
+        },
+        "useSeparator": "auto"
+    }
+
+    return {
+        "params": {"content": [chapter5_assignment_iframe_embed]},
+        "library": "H5P.Column 1.18",
+        "subContentId": utils_booklet.generate_uuid(),
+        "metadata": {
+            "contentType": "Column", "license": "U", 
+            "title": chapter.title,
+            "authors": [], "changes": [], "extraTitle": chapter.title
         }
+    }
 
-        chapter5_assignment_column = {
-            "params": {"content": [chapter5_assignment_iframe_embed]},
-            "library": "H5P.Column 1.18",
-            "subContentId": utils_booklet.generate_uuid(),
-            "metadata": {
-                "contentType": "Column", "license": "U", 
-                "title": ch5_assignment_data.get("titleForChapter", "Aufgabe"),
-                "authors": [], "changes": [], "extraTitle": ch5_assignment_data.get("titleForChapter", "Aufgabe")
-            }
+
+# --- content.json generation ---
+def create_booklet_content_json_structure(data: dict, h5p_cover_image_path: str, book_overall_title: str,
+                                          id_namespace: str | None = None) -> dict:
+    """
+    Creates the Python dictionary for the H5P.InteractiveBook content.json (IFrame version).
+    :param id_namespace: Book name for reproducible subContentIds (see h5p_common/ids.py), random if None.
+    """
+    # --- Data Extraction (see h5p_common/ir.py) ---
+    book = ir.parse_iframe_book(data)
+
+    # --- Cover Page ---
+    cover_image_file_params = {**DEFAULT_H5P_IMAGE_PARAMS_BASE, "path": h5p_cover_image_path}
+    cover_image_full_params = {**DEFAULT_H5P_IMAGE_WRAPPER_PARAMS, "file": cover_image_file_params}
+    cover_image_metadata = {**DEFAULT_H5P_IMAGE_METADATA, "title": "Cover Bild"}
+
+    book_cover = {
+        "coverDescription": book.cover_description,
+        "coverMedium": {
+            "params": cover_image_full_params,
+            "library": "H5P.Image 1.1",
+            "metadata": cover_image_metadata,
+            "subContentId": utils_booklet.generate_uuid()
         }
-        chapters_list.append(chapter5_assignment_column)
+    }
 
+    # --- Chapters ---
+    chapters_list = RENDERERS.render(book.chapters, {"book_overall_title": book_overall_title})
 
     # --- Final Content Structure ---
     content_structure = {
-        "showCoverPage": book_data.get("showCoverPage", True),
+        "showCoverPage": book.show_cover_page,
         "bookCover": book_cover,
-        "chapters": chapters_list, # Use the dynamic list
+        "chapters": chapters_list,
         "behaviour": {
             "baseColor":"#002f6c","defaultTableOfContents":True,"progressIndicators":True,
             "progressAuto":True,"displaySummary":True,"enableRetry":True
@@ -386,4 +377,7 @@ def create_booklet_content_json_structure(data: dict, h5p_cover_image_path: str,
         "totalScoreLabel":"Gesamtpunktzahl",
         "a11y":{"progress":"Seite @page von @total.","menu":"Inhaltsverzeichnis ein- bzw. ausschalten"}
     }
+    if id_namespace is not None:
+        ids.assign_deterministic_ids(content_structure, id_namespace)
+
     return content_structure
\ No newline at end of file
@@ -1,8 +1,16 @@
 import streamlit as st
 import json
+import sys
 from pathlib import Path
+
+# h5p_common lives at the repository root; set up here, once, before anything imports it
+_REPO_ROOT = str(Path(__file__).resolve().parent.parent)
+if _REPO_ROOT not in sys.path:
+    sys.path.append(_REPO_ROOT)
+
 import booklet_generator_iframe as booklet_generator # Renamed for clarity
 import utils_booklet_iframe as utils_booklet   # Renamed for clarity
+from h5p_common import metrics, resources
 
 
 # Define paths (assuming this script is in the same directory as templates/)
@@ -14,10 +22,19 @@ SOURCE_COVER_IMAGE_PATH = TEMPLATES_DIR / "img_1.png"
 # Target paths within the H5P package (relative to content/)
 H5P_INTERNAL_COVER_IMAGE_PATH = "images/img_1.png"
 
+# Prometheus metrics, when H5P_METRICS_PORT or H5P_METRICS_TEXTFILE is set (see h5p_common/metrics.py)
+metrics.enable_from_env()
+
 st.set_page_config(page_title="H5P InteractiveBook Generator (IFrame)", page_icon="📚")
 
 def main():
     st.title("H5P InteractiveBook Generator (IFrame Version)")
+
+    # Cached templates and resources survive reruns (see h5p_common/resources.py)
+    if st.sidebar.button("🔄 Reload templates & caches"):
+        resources.clear_all()
+        st.sidebar.success("Caches cleared.")
+
     st.markdown("""
         This tool generates H5P interactive book packages with an IFrame embed, summary, and questions.
         An optional fifth chapter can be added by providing assignment content in the final text area.
@@ -214,11 +231,11 @@ def main():
                 H5P_INTERNAL_COVER_IMAGE_PATH,
                 book_overall_title
             )
-            content_json_str = json.dumps(content_dict, ensure_ascii=False, indent=2)
+            content_json = utils_booklet.serialize_json(content_dict)
 
             st.write("Generating h5p.json structure...")
             h5p_json_dict = booklet_generator.generate_h5p_json_dict(book_overall_title)
-            h5p_json_str = json.dumps(h5p_json_dict, ensure_ascii=False, indent=2)
+            h5p_json = utils_booklet.serialize_json(h5p_json_dict)
 
             images_to_add = [
                 (str(SOURCE_COVER_IMAGE_PATH), H5P_INTERNAL_COVER_IMAGE_PATH)
@@ -236,8 +253,8 @@ def main():
 
             st.write("Creating H5P package...")
             h5p_package_bytes = utils_booklet.create_h5p_package(
-                content_json_str,
-                h5p_json_str,
+                content_json,
+                h5p_json,
                 str(TEMPLATE_ZIP_PATH),
                 images_to_add
             )
@@ -1,5 +1,7 @@
 import json
 import utils_booklet # Direct import
+from h5p_common import ids, ir, render
+from h5p_common.serialization import Fragment
 
 # --- H5P Structure Default Values (mostly from dummy content.json) ---
 DEFAULT_H5P_IMAGE_PARAMS_BASE = { # Base for file part, path will be set
@@ -18,6 +20,38 @@ DEFAULT_H5P_ADVANCED_TEXT_METADATA = {
     "authors": [], "changes": []
 }
 
+# --- Static l10n blocks ---
+# Serialised once and spliced into every content.json (see h5p_common/serialization.py)
+SINGLE_CHOICE_SET_L10N = Fragment({"nextButtonLabel": "Weiter", "showSolutionButtonLabel": "Lösung anzeigen", "retryButtonLabel": "Wiederholen", "solutionViewTitle": "Lösung", "correctText": "Richtig!", "incorrectText": "Falsch!", "shouldSelect": "Hätte gewählt werden müssen", "shouldNotSelect": "Hätte nicht gewählt werden sollen", "muteButtonLabel": "Stumm schalten", "closeButtonLabel": "Schließen", "slideOfTotal": "Seite :num von :total", "scoreBarLabel": "Du hast :num von :total Punkten erreicht.", "solutionListQuestionNumber": "Frage :num", "a11yShowSolution": "Die Lösung anzeigen. Die richtigen Lösungen werden in der Aufgabe angezeigt.", "a11yRetry": "Die Aufgabe wiederholen. Alle Versuche werden zurückgesetzt und die Aufgabe wird erneut gestartet."})
+INTERACTIVE_VIDEO_L10N = Fragment({
+    "interaction":"Interaktion", "play":"Abspielen", "pause":"Pause", "mute":"Stummschalten, derzeit nicht laut geschaltet",
+    "unmute":"Laut schalten, derzeit stumm geschaltet", "quality":"Videoqualität", "captions":"Untertitel",
+    "close":"Schließen", "fullscreen":"Vollbild", "exitFullscreen":"Vollbild beenden",
+    "summary":"Zusammenfassung öffnen", "bookmarks":"Lesezeichen", "endscreen":"Einsendebildschirm",
+    "defaultAdaptivitySeekLabel":"Fortfahren", "continueWithVideo":"Video fortsetzen",
+    "more":"Mehr Abspieloptionen", "playbackRate":"Abspielgeschwindigkeit", "rewind10":"10 Sekunden zurückspulen",
+    "navDisabled":"Vor- und Zurückspulen ist deaktiviert", "navForwardDisabled":"Navigation vorwärts ist deaktiviert",
+    "sndDisabled":"Ton ist deaktiviert",
+    "requiresCompletionWarning":"Es müssen alle Fragen richtig beantwortet werden, um weitermachen zu können.",
+    "back":"Zurück", "hours":"Stunden", "minutes":"Minuten", "seconds":"Sekunden",
+    "currentTime":"Aktuelle Zeit:", "totalTime":"Gesamtzeit:",
+    "singleInteractionAnnouncement":"Interaktion ist erschienen:",
+    "multipleInteractionsAnnouncement":"Mehrere Interaktionen sind erschienen.",
+    "videoPausedAnnouncement":"Video ist angehalten", "content":"Inhalt", "answered":"@answered beantwortet",
+    "endcardTitle":"@answered Frage(n) beantwortet",
+    "endcardInformation":"Du hast @answered Fragen beantwortet.",
+    "endcardInformationOnSubmitButtonDisabled":"Du hast @answered Fragen beantwortet. Klicke unten, um deine Ergebnisse abzusenden.",
+    "endcardInformationNoAnswers":"Du hast noch keine Fragen beantwortet.",
+    "endcardInformationMustHaveAnswer":"Du musst mindestens eine Frage beantworten, um deine Antworten absenden zu können.",
+    "endcardSubmitButton":"Antworten absenden", "endcardSubmitMessage":"Deine Antworten wurden abgeschickt!",
+    "endcardTableRowAnswered":"Beantwortete Fragen", "endcardTableRowScore":"Punkte",
+    "endcardAnsweredScore":"beantwortet",
+    "endCardTableRowSummaryWithScore":"Du hast @score von @total Punkten für die @question erhalten, die bei @minutes Minuten und @seconds Sekunden erschienen ist.",
+    "endCardTableRowSummaryWithoutScore":"Du hast die @question beantwortet, die bei @minutes Minuten und @seconds Sekunden erschienen ist.",
+    "videoProgressBar":"Video-Fortschritt",
+    "howToCreateInteractions":"Spiele das Video ab, um mit dem Erstellen von Interaktionen zu beginnen"
+})
+
 # --- h5p.json generation ---
 def generate_h5p_json_dict(book_overall_title: str):
     """Generates the Python dictionary for h5p.json."""
@@ -57,34 +91,20 @@ def generate_h5p_json_dict(book_overall_title: str):
 
 # --- Helper functions for creating different interaction types ---
 
-def create_summary_h5p(interaction_data: dict) -> dict:
+def create_summary_h5p(summary: ir.Summary) -> dict:
     """Creates an H5P.Summary interaction dictionary."""
     h5p_summary_tasks = []
-    for group in interaction_data.get("statementGroups", []):
-        choices = []
-        correct_statement = ""
-        incorrect_statements = []
-        for stmt in group.get("statements", []):
-            if stmt.get("isCorrect"):
-                correct_statement = stmt.get("text", "")
-            else:
-                incorrect_statements.append(stmt.get("text", ""))
-        
-        if correct_statement:
-            choices = [correct_statement] + incorrect_statements
-        elif incorrect_statements:
-            choices = incorrect_statements
-        
+    for task in summary.tasks:
         h5p_summary_tasks.append({
-            "summary": choices,
+            "summary": task.statements,
             "subContentId": utils_booklet.generate_uuid(),
-            "tip": group.get("tip", "")
+            "tip": task.tip
         })
 
     return {
         "library": "H5P.Summary 1.10",
         "params": {
-            "intro": interaction_data.get("introText", "<p>Wähle die korrekten Aussagen.</p>"),
+            "intro": summary.intro,
             "overallFeedback": [{"from": 0, "to": 100}],
             "solvedLabel":"Fortschritt:", "scoreLabel":"Falsche Antworten:", "resultLabel":"Dein Ergebnis",
             "labelCorrect":"Richtig.", "labelIncorrect":"Falsch! Bitte versuche es noch einmal.",
@@ -96,18 +116,18 @@ def create_summary_h5p(interaction_data: dict) -> dict:
         "subContentId": utils_booklet.generate_uuid(),
         "metadata": {
             "contentType": "Summary", "license": "U", 
-            "title": interaction_data.get("interactionTitle", "Zusammenfassung"),
-            "authors": [], "changes": [], "extraTitle": interaction_data.get("interactionTitle", "Zusammenfassung")
+            "title": summary.title,
+            "authors": [], "changes": [], "extraTitle": summary.title
         }
     }
 
-def create_single_choice_set_h5p(interaction_data: dict) -> dict:
+def create_single_choice_set_h5p(choice_set: ir.SingleChoiceSet) -> dict:
     """Creates an H5P.SingleChoiceSet interaction dictionary."""
     h5p_choices = []
-    for choice_item in interaction_data.get("choices", []):
+    for choice in choice_set.choices:
         h5p_choices.append({
-            "question": choice_item.get("question", ""),
-            "answers": choice_item.get("answers", []),
+            "question": choice.question,
+            "answers": choice.answers,
             "subContentId": utils_booklet.generate_uuid()
         })
 
@@ -116,33 +136,26 @@ def create_single_choice_set_h5p(interaction_data: dict) -> dict:
         "params": {
             "overallFeedback": [{"from": 0, "to": 100}],
             "behaviour": {"autoContinue": True, "timeoutCorrect": 1000, "timeoutWrong": 2000, "soundEffectsEnabled": False, "enableRetry": False, "enableSolutionsButton": False, "passPercentage": 100},
-            "l10n": {"nextButtonLabel": "Weiter", "showSolutionButtonLabel": "Lösung anzeigen", "retryButtonLabel": "Wiederholen", "solutionViewTitle": "Lösung", "correctText": "Richtig!", "incorrectText": "Falsch!", "shouldSelect": "Hätte gewählt werden müssen", "shouldNotSelect": "Hätte nicht gewählt werden sollen", "muteButtonLabel": "Stumm schalten", "closeButtonLabel": "Schließen", "slideOfTotal": "Seite :num von :total", "scoreBarLabel": "Du hast :num von :total Punkten erreicht.", "solutionListQuestionNumber": "Frage :num", "a11yShowSolution": "Die Lösung anzeigen. Die richtigen Lösungen werden in der Aufgabe angezeigt.", "a11yRetry": "Die Aufgabe wiederholen. Alle Versuche werden zurückgesetzt und die Aufgabe wird erneut gestartet."},
+            "l10n": SINGLE_CHOICE_SET_L10N,
             "choices": h5p_choices
         },
         "subContentId": utils_booklet.generate_uuid(),
         "metadata": {
             "contentType": "Single Choice Set", "license": "U", 
-            "title": interaction_data.get("interactionTitle", "Single Choice"),
-            "authors": [], "changes": [], "extraTitle": interaction_data.get("interactionTitle", "Single Choice")
+            "title": choice_set.title,
+            "authors": [], "changes": [], "extraTitle": choice_set.title
         }
     }
 
-def create_drag_the_words_h5p(interaction_data: dict) -> dict:
+def create_drag_the_words_h5p(task: ir.ClozeTask) -> dict:
     """Creates an H5P.DragText interaction dictionary."""
-    distractors_input = interaction_data.get("distractors", "")
-    distractors_h5p = ""
-    if distractors_input:
-        # Convert "word1, word2" to "*word1* *word2*"
-        distractors_list = [f"*{word.strip()}*" for word in distractors_input.split(',') if word.strip()]
-        distractors_h5p = " ".join(distractors_list)
-
     return {
         "library": "H5P.DragText 1.10",
         "params": {
             "media": {"disableImageZooming": False},
-            "taskDescription": interaction_data.get("taskDescription", "Ziehe die Wörter in die richtigen Felder!"),
-            "textField": interaction_data.get("textField", "Lückentext hier. *Lücke*."),
-            "distractors": distractors_h5p,
+            "taskDescription": task.description,
+            "textField": task.text,
+            "distractors": task.distractors,
             "overallFeedback": [{"from": 0, "to": 100}],
             "checkAnswer": "Überprüfen", "tryAgain": "Wiederholen", "showSolution": "Lösung anzeigen",
             "correctText": "Richtig!", "incorrectText": "Falsch!",
@@ -152,51 +165,35 @@ def create_drag_the_words_h5p(interaction_data: dict) -> dict:
         "subContentId": utils_booklet.generate_uuid(),
         "metadata": {
             "contentType": "Drag the Words", "license": "U", 
-            "title": interaction_data.get("interactionTitle", "Drag the Words"),
-            "authors": [], "changes": [], "extraTitle": interaction_data.get("interactionTitle", "Drag the Words")
+            "title": task.title,
+            "authors": [], "changes": [], "extraTitle": task.title
         }
     }
 
-# --- content.json generation ---
-def create_booklet_content_json_structure(data: dict, video_id: str | None, 
-                                          h5p_cover_image_path: str, 
-                                          h5p_qs_image_path: str) -> dict:
-    """
-    Creates the Python dictionary for the H5P.InteractiveBook content.json.
-    """
-    book_data = data.get("book", {})
-    ch1_data = data.get("chapter1_introduction", {})
-    ch2_data = data.get("chapter2_video", {})
-    ch3_data = data.get("chapter3_questions", {})
-
-    cover_page_data = book_data.get("coverPage", {})
-    cover_description_html = f"{cover_page_data.get('title', '<h1>Cover Title</h1>')}{cover_page_data.get('subtitle', '')}"
-    
-    cover_image_file_params = {**DEFAULT_H5P_IMAGE_PARAMS_BASE, "path": h5p_cover_image_path}
-    cover_image_full_params = {**DEFAULT_H5P_IMAGE_WRAPPER_PARAMS, "file": cover_image_file_params}
+def create_interaction_action_h5p(action) -> dict:
+    """Dispatches a parsed interaction to its helper above."""
+    if isinstance(action, ir.Summary):
+        return create_summary_h5p(action)
+    if isinstance(action, ir.SingleChoiceSet):
+        return create_single_choice_set_h5p(action)
+    return create_drag_the_words_h5p(action)
 
-    book_cover = {
-        "coverDescription": cover_description_html,
-        "coverMedium": {
-            "params": cover_image_full_params,
-            "library": "H5P.Image 1.1",
-            "metadata": {**DEFAULT_H5P_IMAGE_METADATA, "title": "Cover Bild"},
-            "subContentId": utils_booklet.generate_uuid()
-        }
-    }
+# --- Chapters ---
+# Each emitter renders one parsed chapter (see h5p_common/ir.py) and is registered for its type
+RENDERERS = render.Registry()
 
-    intro_content_data = ch1_data.get("introductionContent", {})
-    learning_objectives_list = intro_content_data.get("learningObjectives", [])
-    learning_objectives_html = "".join(learning_objectives_list)
+@RENDERERS.register(ir.IntroChapter)
+def create_intro_chapter(chapter: ir.IntroChapter) -> dict:
+    learning_objectives_html = "".join(chapter.bullet_points)
     
-    if learning_objectives_html and not learning_objectives_html.strip().lower().startswith("<ul>") and learning_objectives_list:
+    if learning_objectives_html and not learning_objectives_html.strip().lower().startswith("<ul>") and chapter.bullet_points:
         learning_objectives_html_complete = f"<ul>{learning_objectives_html}</ul>"
     else:
         learning_objectives_html_complete = learning_objectives_html
 
     intro_text_html = (
-        f"{intro_content_data.get('title', '')}"
-        f"{intro_content_data.get('guidanceText', '')}"
+        f"{chapter.heading}"
+        f"{chapter.guidance}"
         f"{learning_objectives_html_complete}"
         "<hr /><p>Lesen Sie zuerst die Definitionen der Begriffen hier unten. Sie werden im Video weiter vertieft.</p>"
     )
@@ -211,16 +208,15 @@ def create_booklet_content_json_structure(data: dict, video_id: str | None,
         "useSeparator": "auto"
     }
 
-    accordion_section_data = ch1_data.get("accordion", {})
     accordion_panels = []
-    for definition_item in accordion_section_data.get("definitions", []):
+    for panel in chapter.accordion.panels:
         accordion_panels.append({
-            "title": definition_item.get("term", "N/A"),
+            "title": panel.title,
             "content": {
-                "params": {"text": definition_item.get("definition", "")},
+                "params": {"text": panel.text},
                 "library": "H5P.AdvancedText 1.1",
                 "subContentId": utils_booklet.generate_uuid(),
-                "metadata": {**DEFAULT_H5P_ADVANCED_TEXT_METADATA, "title": f"Definition: {definition_item.get('term', '')}"}
+                "metadata": {**DEFAULT_H5P_ADVANCED_TEXT_METADATA, "title": f"Definition: {panel.title}"}
             }
         })
     
@@ -230,30 +226,30 @@ def create_booklet_content_json_structure(data: dict, video_id: str | None,
             "library": "H5P.Accordion 1.0",
             "metadata": {
                 "contentType": "Accordion", "license": "U", 
-                "title": accordion_section_data.get("titleForElement", "Begriffe"),
-                "authors": [], "changes": [], "extraTitle": accordion_section_data.get("titleForElement", "Begriffe")
+                "title": chapter.accordion.title,
+                "authors": [], "changes": [], "extraTitle": chapter.accordion.title
             },
             "subContentId": utils_booklet.generate_uuid()
         },
         "useSeparator": "auto"
     }
     
-    chapter1_column = {
+    return {
         "params": {"content": [chapter1_text, chapter1_accordion]},
         "library": "H5P.Column 1.18",
         "subContentId": utils_booklet.generate_uuid(),
         "metadata": {
             "contentType": "Column", "license": "U", 
-            "title": ch1_data.get("titleForChapter", "Einleitung"),
-            "authors": [], "changes": [], "extraTitle": ch1_data.get("titleForChapter", "Einleitung")
+            "title": chapter.title,
+            "authors": [], "changes": [], "extraTitle": chapter.title
         }
     }
 
-    video_section_intro_data = ch2_data.get("videoSectionIntro", {})
-    chapter2_text_html = f"{video_section_intro_data.get('title', '')}{video_section_intro_data.get('instruction', '')}"
+@RENDERERS.register(ir.VideoChapter, "video_id")
+def create_video_chapter(chapter: ir.VideoChapter, video_id: str | None) -> dict:
     chapter2_text = {
         "content": {
-            "params": {"text": chapter2_text_html},
+            "params": {"text": f"{chapter.intro.title}{chapter.intro.instruction}"},
             "library": "H5P.AdvancedText 1.1",
             "metadata": {**DEFAULT_H5P_ADVANCED_TEXT_METADATA, "title": "Videoeinleitung"},
             "subContentId": utils_booklet.generate_uuid()
@@ -261,48 +257,28 @@ def create_booklet_content_json_structure(data: dict, video_id: str | None,
         "useSeparator": "auto"
     }
 
-    interactive_video_section_data = ch2_data.get("interactiveVideo", {})
+    video = chapter.video
     iv_interactions = []
-    
-    # NEW: Loop through the generic 'interactions' array
-    for interaction_item in interactive_video_section_data.get("interactions", []):
-        interaction_type = interaction_item.get("type")
-        h5p_action = None
-
-        if interaction_type == "Summary":
-            h5p_action = create_summary_h5p(interaction_item)
-        elif interaction_type == "SingleChoiceSet":
-            h5p_action = create_single_choice_set_h5p(interaction_item)
-        elif interaction_type == "DragTheWords":
-            h5p_action = create_drag_the_words_h5p(interaction_item)
-        else:
-            utils_booklet.logger.warning(f"Unknown interaction type '{interaction_type}' found. Skipping.")
-            continue
-
-        if h5p_action:
-            iv_interactions.append({
-                "x": 3, "y": 5, "width": 40, "height": 20, # Generic position
-                "duration": {
-                    "from": interaction_item.get("startTime", 0),
-                    "to": interaction_item.get("startTime", 0) + 1
-                },
-                "action": h5p_action,
-                "pause": True,
-                "displayType": "poster",
-                "buttonOnMobile": False,
-                "adaptivity": {"correct": {"allowOptOut": False, "message": ""}, "wrong": {"allowOptOut": False, "message": ""}},
-                "label": ""
-            })
-
-    # NEW: Build the final summary task for the end of the video
-    final_summary_data = interactive_video_section_data.get("finalSummary")
-    final_summary_task = None
-    if final_summary_data:
-        # Re-use the summary creation helper, as the structure is identical
-        final_summary_task = create_summary_h5p(final_summary_data)
+    for interaction in video.interactions:
+        iv_interactions.append({
+            "x": 3, "y": 5, "width": 40, "height": 20, # Generic position
+            "duration": {
+                "from": interaction.start_time,
+                "to": interaction.start_time + 1
+            },
+            "action": create_interaction_action_h5p(interaction.action),
+            "pause": True,
+            "displayType": "poster",
+            "buttonOnMobile": False,
+            "adaptivity": {"correct": {"allowOptOut": False, "message": ""}, "wrong": {"allowOptOut": False, "message": ""}},
+            "label": ""
+        })
 
-    # Fallback to a default empty summary if none is provided in the JSON
-    if not final_summary_task:
+    # Final summary task at the end of the video, same structure as the Summary interactions
+    if video.final_summary is not None:
+        final_summary_task = create_summary_h5p(video.final_summary)
+    else:
+        # Fallback to a default empty summary if none is provided in the JSON
         final_summary_task = {
             "library":"H5P.Summary 1.10",
             "params": {
@@ -314,10 +290,7 @@ def create_booklet_content_json_structure(data: dict, video_id: str | None,
         }
 
     youtube_path = f"https://www.youtube.com/watch?v={video_id}" if video_id else ""
-    
-    video_endscreen_time = 432 
-    if interactive_video_section_data.get("videoDurationForEndscreen"):
-        video_endscreen_time = interactive_video_section_data.get("videoDurationForEndscreen")
+    video_endscreen_time = video.endscreen_time
 
     chapter2_interactive_video = {
         "content": {
@@ -342,61 +315,34 @@ def create_booklet_content_json_structure(data: dict, video_id: str | None,
                     "autoplay":False,"loop":False,"showBookmarksmenuOnLoad":False,"showRewind10":True,
                     "preventSkippingMode":"none","deactivateSound":False,"showSolutionButton":"off","retryButton":"off"
                 },
-                "l10n": { 
-                    "interaction":"Interaktion", "play":"Abspielen", "pause":"Pause", "mute":"Stummschalten, derzeit nicht laut geschaltet",
-                    "unmute":"Laut schalten, derzeit stumm geschaltet", "quality":"Videoqualität", "captions":"Untertitel",
-                    "close":"Schließen", "fullscreen":"Vollbild", "exitFullscreen":"Vollbild beenden",
-                    "summary":"Zusammenfassung öffnen", "bookmarks":"Lesezeichen", "endscreen":"Einsendebildschirm",
-                    "defaultAdaptivitySeekLabel":"Fortfahren", "continueWithVideo":"Video fortsetzen",
-                    "more":"Mehr Abspieloptionen", "playbackRate":"Abspielgeschwindigkeit", "rewind10":"10 Sekunden zurückspulen",
-                    "navDisabled":"Vor- und Zurückspulen ist deaktiviert", "navForwardDisabled":"Navigation vorwärts ist deaktiviert",
-                    "sndDisabled":"Ton ist deaktiviert",
-                    "requiresCompletionWarning":"Es müssen alle Fragen richtig beantwortet werden, um weitermachen zu können.",
-                    "back":"Zurück", "hours":"Stunden", "minutes":"Minuten", "seconds":"Sekunden",
-                    "currentTime":"Aktuelle Zeit:", "totalTime":"Gesamtzeit:",
-                    "singleInteractionAnnouncement":"Interaktion ist erschienen:",
-                    "multipleInteractionsAnnouncement":"Mehrere Interaktionen sind erschienen.",
-                    "videoPausedAnnouncement":"Video ist angehalten", "content":"Inhalt", "answered":"@answered beantwortet",
-                    "endcardTitle":"@answered Frage(n) beantwortet",
-                    "endcardInformation":"Du hast @answered Fragen beantwortet.",
-                    "endcardInformationOnSubmitButtonDisabled":"Du hast @answered Fragen beantwortet. Klicke unten, um deine Ergebnisse abzusenden.",
-                    "endcardInformationNoAnswers":"Du hast noch keine Fragen beantwortet.",
-                    "endcardInformationMustHaveAnswer":"Du musst mindestens eine Frage beantworten, um deine Antworten absenden zu können.",
-                    "endcardSubmitButton":"Antworten absenden", "endcardSubmitMessage":"Deine Antworten wurden abgeschickt!",
-                    "endcardTableRowAnswered":"Beantwortete Fragen", "endcardTableRowScore":"Punkte",
-                    "endcardAnsweredScore":"beantwortet",
-                    "endCardTableRowSummaryWithScore":"Du hast @score von @total Punkten für die @question erhalten, die bei @minutes Minuten und @seconds Sekunden erschienen ist.",
-                    "endCardTableRowSummaryWithoutScore":"Du hast die @question beantwortet, die bei @minutes Minuten und @seconds Sekunden erschienen ist.",
-                    "videoProgressBar":"Video-Fortschritt",
-                    "howToCreateInteractions":"Spiele das Video ab, um mit dem Erstellen von Interaktionen zu beginnen"
-                }
+                "l10n": INTERACTIVE_VIDEO_L10N
             },
             "library": "H5P.InteractiveVideo 1.27",
             "metadata": {
                 "contentType": "Interactive Video", "license": "U", 
-                "title": interactive_video_section_data.get("titleForElement", "Interaktives Video"),
-                "authors": [], "changes": [], "extraTitle": interactive_video_section_data.get("titleForElement", "Interaktives Video")
+                "title": video.title,
+                "authors": [], "changes": [], "extraTitle": video.title
             },
             "subContentId": utils_booklet.generate_uuid()
         },
         "useSeparator": "auto"
     }
 
-    chapter2_column = {
+    return {
         "params": {"content": [chapter2_text, chapter2_interactive_video]},
         "library": "H5P.Column 1.18",
         "subContentId": utils_booklet.generate_uuid(),
         "metadata": {
-            "contentType": "Column", "license": "U", "title": ch2_data.get("titleForChapter", "Video"),
-            "authors": [], "changes": [], "extraTitle": ch2_data.get("titleForChapter", "Video")
+            "contentType": "Column", "license": "U", "title": chapter.title,
+            "authors": [], "changes": [], "extraTitle": chapter.title
         }
     }
-    
-    qs_intro_data = ch3_data.get("questionSectionIntro", {})
-    chapter3_text_html = f"{qs_intro_data.get('title', '')}{qs_intro_data.get('instruction', '')}"
+
+@RENDERERS.register(ir.QuestionChapter, "h5p_qs_image_path")
+def create_question_chapter(chapter: ir.QuestionChapter, h5p_qs_image_path: str) -> dict:
     chapter3_text = {
         "content": {
-            "params": {"text": chapter3_text_html},
+            "params": {"text": f"{chapter.intro.title}{chapter.intro.instruction}"},
             "library": "H5P.AdvancedText 1.1",
             "metadata": {**DEFAULT_H5P_ADVANCED_TEXT_METADATA, "title": "Fragen Einleitung"},
             "subContentId": utils_booklet.generate_uuid()
@@ -404,8 +350,8 @@ def create_booklet_content_json_structure(data: dict, video_id: str | None,
         "useSeparator": "auto"
     }
 
-    qs_section_data = ch3_data.get("questionSet", {})
-    mapped_questions = utils_booklet.map_questions_to_h5p_array(qs_section_data.get("questions", []))
+    pool = chapter.pool
+    mapped_questions = utils_booklet.map_questions_to_h5p_array(pool.questions)
     
     qs_background_file_params = {**DEFAULT_H5P_IMAGE_PARAMS_BASE, "path": h5p_qs_image_path}
     
@@ -414,12 +360,12 @@ def create_booklet_content_json_structure(data: dict, video_id: str | None,
             "params": {
                 "introPage": { 
                     "showIntroPage": True, "startButtonText": "Quiz starten",
-                    "title": qs_section_data.get("titleForElement", "Verständnisfragen"), 
-                    "introduction": "" 
+                    "title": pool.intro_page_title, 
+                    "introduction": pool.intro_page_text 
                 },
                 "progressType": "dots", "passPercentage": 50, "disableBackwardsNavigation": False,
                 "randomQuestions": True, 
-                "poolSize": 10,
+                "poolSize": pool.pool_size,
                 "questions": mapped_questions,
                 "backgroundImage": qs_background_file_params,
                 "endGame": { 
@@ -441,28 +387,54 @@ def create_booklet_content_json_structure(data: dict, video_id: str | None,
             "library": "H5P.QuestionSet 1.20",
             "metadata": {
                 "contentType": "Question Set", "license": "U", 
-                "title": qs_section_data.get("titleForElement", "Fragenset"),
-                "authors": [], "changes": [], "extraTitle": qs_section_data.get("titleForElement", "Fragenset")
+                "title": pool.title,
+                "authors": [], "changes": [], "extraTitle": pool.title
             },
             "subContentId": utils_booklet.generate_uuid()
         },
         "useSeparator": "auto"
     }
 
-    chapter3_column = {
+    return {
         "params": {"content": [chapter3_text, chapter3_question_set]},
         "library": "H5P.Column 1.18",
         "subContentId": utils_booklet.generate_uuid(),
         "metadata": {
-            "contentType": "Column", "license": "U", "title": ch3_data.get("titleForChapter", "Verständnisfragen"),
-            "authors": [], "changes": [], "extraTitle": ch3_data.get("titleForChapter", "Verständnisfragen")
+            "contentType": "Column", "license": "U", "title": chapter.title,
+            "authors": [], "changes": [], "extraTitle": chapter.title
         }
     }
 
+# --- content.json generation ---
+def create_booklet_content_json_structure(data: dict, video_id: str | None, 
+                                          h5p_cover_image_path: str, 
+                                          h5p_qs_image_path: str,
+                                          id_namespace: str | None = None) -> dict:
+    """
+    Creates the Python dictionary for the H5P.InteractiveBook content.json.
+    :param id_namespace: Book name for reproducible subContentIds (see h5p_common/ids.py), random if None.
+    """
+    book = ir.parse_podcast_book(data)
+    
+    cover_image_file_params = {**DEFAULT_H5P_IMAGE_PARAMS_BASE, "path": h5p_cover_image_path}
+    cover_image_full_params = {**DEFAULT_H5P_IMAGE_WRAPPER_PARAMS, "file": cover_image_file_params}
+
+    book_cover = {
+        "coverDescription": book.cover_description,
+        "coverMedium": {
+            "params": cover_image_full_params,
+            "library": "H5P.Image 1.1",
+            "metadata": {**DEFAULT_H5P_IMAGE_METADATA, "title": "Cover Bild"},
+            "subContentId": utils_booklet.generate_uuid()
+        }
+    }
+
+    chapters = RENDERERS.render(book.chapters, {"video_id": video_id, "h5p_qs_image_path": h5p_qs_image_path})
+
     content_structure = {
-        "showCoverPage": book_data.get("showCoverPage", True),
+        "showCoverPage": book.show_cover_page,
         "bookCover": book_cover,
-        "chapters": [chapter1_column, chapter2_column, chapter3_column],
+        "chapters": chapters,
         "behaviour": { 
             "baseColor":"#1768c4","defaultTableOfContents":True,"progressIndicators":True,
             "progressAuto":True,"displaySummary":True,"enableRetry":True
@@ -484,4 +456,7 @@ def create_booklet_content_json_structure(data: dict, video_id: str | None,
         "totalScoreLabel":"Gesamtpunktzahl",
         "a11y":{"progress":"Seite @page von @total.","menu":"Inhaltsverzeichnis ein- bzw. ausschalten"}
     }
+    if id_namespace is not None:
+        ids.assign_deterministic_ids(content_structure, id_namespace)
+
     return content_structure
\ No newline at end of file
@@ -1,11 +1,19 @@
 import streamlit as st
 import json
+import sys
 from pathlib import Path
+
+# h5p_common lives at the repository root; set up here, once, before anything imports it
+_REPO_ROOT = str(Path(__file__).resolve().parent.parent)
+if _REPO_ROOT not in sys.path:
+    sys.path.append(_REPO_ROOT)
+
 import booklet_generator  # Direct import
 import utils_booklet    # Direct import
-import re               # For Markdown parsing
-import io               # For zipping files
-import zipfile          # For zipping files
+from h5p_common import metrics, resources
+import jobs             # Background bulk jobs
+from process_md_folder import RESPONSE_BLOCKS, parse_json_block  # Markdown response blocks
+import time             # For polling bulk jobs
 import traceback        # For detailed error logging
 
 # Define paths (assuming this script is in the same directory as templates/)
@@ -19,78 +27,49 @@ SOURCE_QS_BG_IMAGE_PATH = TEMPLATES_DIR / "img_2.png"
 H5P_INTERNAL_COVER_IMAGE_PATH = "images/img_1.png"
 H5P_INTERNAL_QS_BG_IMAGE_PATH = "images/img_2.png"
 
-def parse_md_file_content(md_content: str) -> tuple[str | None, str | None, str | None, str | None]:
+# Seconds between progress refreshes while a bulk job is running
+JOB_POLL_INTERVAL = 2
+
+
+# A finished job no longer changes, so its download is built once rather than on every rerun and poll
+@resources.cache_resource(max_entries=16)
+def finished_job_download(job_id: str) -> tuple | None:
     """
-    Parses the MD file content to extract the YouTube URL and the three JSON strings.
-    Now looks for ```markdown code blocks.
-    Returns (youtube_url, json_intro_str, json_video_str, json_questions_str)
+    (file name, bytes, number of packages) to offer for a finished job: its only package,
+    or a .zip of all of them. None if the job generated nothing.
     """
-    youtube_url = None
-    json_intro_str = None
-    json_video_str = None
-    json_questions_str = None
-
-    # MODIFIED Regex: Changed from ```json to ```markdown
-    pattern = re.compile(r"## Response Block (\d)\s*```markdown\s*([\s\S]*?)\s*```", re.MULTILINE)
-    matches = pattern.findall(md_content)
-    
-    parsed_blocks = {int(num_str): data_str for num_str, data_str in matches}
-
-    json_intro_str = parsed_blocks.get(1)
-    json_video_str = parsed_blocks.get(2)
-    json_questions_str = parsed_blocks.get(3)
-
-    if json_intro_str:
-        try:
-            # Extract youtubeUrl from the first block's JSON content
-            temp_data = json.loads(json_intro_str)
-            youtube_url = temp_data.get("youtubeUrl")
-        except json.JSONDecodeError:
-            print(f"Warning: Could not parse JSON from Block 1 in MD (for youtubeUrl extraction): {json.JSONDecodeError}")
-            
-    return youtube_url, json_intro_str, json_video_str, json_questions_str
+    results = jobs.job_results(job_id)
+    if not results:
+        return None
+    if len(results) == 1:
+        h5p_name, h5p_bytes = results[0]
+        return h5p_name, h5p_bytes, 1
+    return f"h5p_bulk_generated_booklets_{job_id[:8]}.zip", jobs.job_zip(job_id, results), len(results)
+
 
 def do_h5p_generation(
     youtube_url_override: str | None, 
-    json_input_intro_area_str: str | None,
-    json_input_video_area_str: str | None,
-    json_input_questions_area_str: str | None
+    input_data_intro: dict | None,
+    input_data_video: dict | None,
+    input_data_questions: dict | None
 ):
     """
-    Core H5P generation logic.
+    Core H5P generation logic. Takes the parsed JSON objects of the three blocks (see process_md_folder.parse_md_file_content).
     Returns a tuple: (h5p_package_bytes, download_filename, error_message)
     error_message is None on success.
     """
-    if not json_input_intro_area_str or not json_input_video_area_str or not json_input_questions_area_str:
-        return None, None, "One or more JSON content fields are empty or missing from the MD file."
-
-    input_data_intro = None
-    input_data_video = None
-    input_data_questions = None
-    
-    try:
-        input_data_intro = json.loads(json_input_intro_area_str)
-    except json.JSONDecodeError as e:
-        return None, None, f"JSON format error in Intro JSON (Block 1): {e}"
-    try:
-        input_data_video = json.loads(json_input_video_area_str)
-    except json.JSONDecodeError as e:
-        return None, None, f"JSON format error in Video JSON (Block 2): {e}"
-    try:
-        input_data_questions = json.loads(json_input_questions_area_str)
-    except json.JSONDecodeError as e:
-        return None, None, f"JSON format error in Questions JSON (Block 3): {e}"
+    if input_data_intro is None or input_data_video is None or input_data_questions is None:
+        return None, None, "One or more JSON content blocks are empty or missing."
 
     final_input_data = {
-        "youtubeUrl": youtube_url_override, # Prioritize URL from MD (passed as youtube_url_override)
+        "youtubeUrl": youtube_url_override, # Prioritize the URL entered in the form
         "book": input_data_intro.get("book", {}),
         "chapter1_introduction": input_data_intro.get("chapter1_introduction", {}),
         "chapter2_video": input_data_video.get("chapter2_video", {}), # Expects "chapter2_video" key in JSON from Block 2
         "chapter3_questions": input_data_questions.get("chapter3_questions", {}) # Expects "chapter3_questions" key in JSON from Block 3
     }
     
-    # Fallback for youtubeUrl if not provided by youtube_url_override (already extracted from Block 1's JSON)
-    # and also if the key was missing in Block 1's JSON.
+    # Fallback to the youtubeUrl of Block 1's JSON if no override was given
     if not final_input_data["youtubeUrl"]:
         final_input_data["youtubeUrl"] = input_data_intro.get("youtubeUrl") 
     
@@ -108,11 +87,11 @@ def do_h5p_generation(
             H5P_INTERNAL_COVER_IMAGE_PATH, # Uses global constant
             H5P_INTERNAL_QS_BG_IMAGE_PATH  # Uses global constant
         )
-        content_json_str = json.dumps(content_dict, ensure_ascii=False, indent=2)
+        content_json = utils_booklet.serialize_json(content_dict)
 
         book_overall_title = final_input_data.get("book", {}).get("title", "Generated InteractiveBook")
         h5p_json_dict = booklet_generator.generate_h5p_json_dict(book_overall_title)
-        h5p_json_str = json.dumps(h5p_json_dict, ensure_ascii=False, indent=2)
+        h5p_json = utils_booklet.serialize_json(h5p_json_dict)
 
         images_to_add = [
             (str(SOURCE_COVER_IMAGE_PATH), H5P_INTERNAL_COVER_IMAGE_PATH),
@@ -131,8 +110,8 @@ def do_h5p_generation(
             return None, None, f"H5P Template ZIP file not found: {TEMPLATE_ZIP_PATH}. It must be placed in the `{TEMPLATES_DIR}` folder."
 
         h5p_package_bytes = utils_booklet.create_h5p_package(
-            content_json_str,
-            h5p_json_str,
+            content_json,
+            h5p_json,
             str(TEMPLATE_ZIP_PATH),
             images_to_add
         )
@@ -154,8 +133,16 @@ def do_h5p_generation(
 
 
 def main():
+    # Prometheus metrics, when H5P_METRICS_PORT or H5P_METRICS_TEXTFILE is set (see h5p_common/metrics.py)
+    metrics.enable_from_env()
     st.set_page_config(page_title="H5P InteractiveBook Generator", page_icon="📚")
     st.title("H5P InteractiveBook Generator Utility")
+
+    # Cached templates and resources survive reruns (see h5p_common/resources.py)
+    if st.sidebar.button("🔄 Reload templates & caches"):
+        resources.clear_all()
+        st.sidebar.success("Caches cleared.")
+
     st.markdown("""
         This tool generates H5P interactive book packages from YouTube links and JSON content,
         either manually or by bulk uploading specially formatted Markdown files.
@@ -213,8 +200,8 @@ def main():
                 ```
                 *(Note: The `---` separator between blocks is for clarity in the example; the parser primarily looks for `## Response Block X` followed by the JSON code block.)*
             2.  **Upload:** Use the "Upload Markdown Files" section to select your `.md` files.
-            3.  **Generate:** Click "⚙️ Generate H5P from Uploaded Files".
-            4.  **Download:** Download individual `.h5p` files as they are generated (if many) or a single `.zip` archive containing all successfully generated H5P files.
+            3.  **Generate:** Click "⚙️ Generate H5P from Uploaded Files". The files are converted in the background as a job; the page shows its progress.
+            4.  **Download:** Once the job is finished, download the `.h5p` file or a single `.zip` archive containing all successfully generated H5P files. Results stay available under the job ID, which can be looked up later in "Bulk Jobs".
         """)
     
     # Check for essential template files once at the start
@@ -250,12 +237,19 @@ def main():
     if st.button("👉 3. Generate H5P Booklet (Manual)", key="manual_generate_btn"):
         # Use the youtube_url_input_manual for this specific call
         # If youtube_url_input_manual is empty, do_h5p_generation will try to use the one from Intro JSON
-        h5p_bytes, filename, error = do_h5p_generation(
-            youtube_url_input_manual,
-            json_input_intro_area_manual,
-            json_input_video_area_manual,
-            json_input_questions_area_manual
-        )
+        # Positions in JSON errors refer to the respective text area
+        parsed_inputs = [
+            parse_json_block(text, block_number) if text.strip() else (None, None)
+            for block_number, text in zip(RESPONSE_BLOCKS, (json_input_intro_area_manual,
+                                                           json_input_video_area_manual,
+                                                           json_input_questions_area_manual))
+        ]
+        error = next((error for _, error in parsed_inputs if error), None)
+        if not error:
+            h5p_bytes, filename, error = do_h5p_generation(
+                youtube_url_input_manual,
+                *(data for data, _ in parsed_inputs)
+            )
         if error:
             st.error(f"Manual Generation Error: {error}")
         else:
@@ -277,79 +271,79 @@ def main():
         key="md_uploader"
     )
 
-    if st.button("⚙️ Generate H5P from Uploaded Files", key="bulk_generate_btn") and uploaded_md_files:
-        generated_files_data = [] # List to store {"name": h5p_filename, "data": h5p_bytes, "original_md": uploaded_file.name}
-
-        progress_bar = st.progress(0)
-        status_text = st.empty()
-
-        for i, uploaded_file in enumerate(uploaded_md_files):
-            status_text.text(f"Processing: {uploaded_file.name} ({i+1}/{len(uploaded_md_files)})...")
-            try:
-                md_content_bytes = uploaded_file.getvalue()
-                md_content_str = md_content_bytes.decode("utf-8")
-                
-                md_youtube_url, md_json_intro, md_json_video, md_json_questions = parse_md_file_content(md_content_str)
-
-                if not md_json_intro or not md_json_video or not md_json_questions:
-                    st.error(f"Skipping `{uploaded_file.name}`: Could not parse all required JSON blocks (Intro, Video, Questions). Please check MD file structure.")
-                    continue # Skip to the next file
-                
-                # md_youtube_url might be None if not in Block 1 JSON, do_h5p_generation handles fallback.
-                
-                h5p_bytes, h5p_filename, error = do_h5p_generation(
-                    md_youtube_url, 
-                    md_json_intro,
-                    md_json_video,
-                    md_json_questions
-                )
-
-                if error:
-                    st.error(f"Failed to generate H5P for `{uploaded_file.name}`: {error}")
+    # Job IDs submitted from this browser session, newest first
+    if 'bulk_job_ids' not in st.session_state:
+        st.session_state['bulk_job_ids'] = []
+
+    if st.button("⚙️ Generate H5P from Uploaded Files", key="bulk_generate_btn"):
+        if not uploaded_md_files:
+            st.warning("Please upload at least one Markdown file.")
+        else:
+            # Files are converted by the background worker pool (see jobs.py), the session only polls
+            md_files = [(uploaded_file.name, uploaded_file.getvalue().decode("utf-8", errors="replace"))
+                        for uploaded_file in uploaded_md_files]
+            job_id = jobs.submit_job(md_files)
+            st.session_state['bulk_job_ids'].insert(0, job_id)
+            st.success(f"Submitted job `{job_id}` with {len(md_files)} file(s). "
+                       "Keep the job ID to download the results later, also from another browser session.")
+
+    st.subheader("Bulk Jobs")
+    lookup_job_id = st.text_input("Look up a job by ID", key="bulk_job_lookup").strip()
+    if lookup_job_id and lookup_job_id not in st.session_state['bulk_job_ids']:
+        if jobs.job_status(lookup_job_id) is None:
+            st.error(f"No job with ID `{lookup_job_id}`.")
+        else:
+            st.session_state['bulk_job_ids'].insert(0, lookup_job_id)
+
+    any_running = False
+    for job_id in st.session_state['bulk_job_ids']:
+        status = jobs.job_status(job_id)
+        if status is None:
+            continue
+        counts = status["counts"]
+        processed = counts["done"] + counts["failed"]
+        any_running = any_running or not status["finished"]
+
+        with st.expander(f"Job `{job_id}`: {processed}/{status['total']} processed, "
+                         f"{counts['done']} generated, {counts['failed']} failed",
+                         expanded=not status["finished"]):
+            st.progress(processed / status["total"] if status["total"] else 1.0)
+            for file in status["files"]:
+                if file["status"] == "done":
+                    st.success(f"Generated `{file['h5p_name']}` from `{file['md_name']}`.")
+                elif file["status"] == "failed":
+                    st.error(f"Failed to generate H5P for `{file['md_name']}`: {file['error']}")
                 else:
-                    st.success(f"Successfully generated `{h5p_filename}` from `{uploaded_file.name}`.")
-                    generated_files_data.append({"name": h5p_filename, "data": h5p_bytes, "original_md": uploaded_file.name})
-            
-            except Exception as e:
-                st.error(f"An unexpected error occurred while processing `{uploaded_file.name}`: {e}")
-                st.text(traceback.format_exc())
-            
-            progress_bar.progress((i + 1) / len(uploaded_md_files))
-        
-        status_text.text("Bulk processing complete.")
-
-        if generated_files_data:
-            st.markdown("---")
-            st.subheader("Download Generated H5P Files")
-            if len(generated_files_data) == 1:
-                single_file_info = generated_files_data[0]
-                st.download_button(
-                    label=f"💾 Download {single_file_info['name']}",
-                    data=single_file_info['data'],
-                    file_name=single_file_info['name'],
-                    mime="application/zip",
-                    key=f"single_bulk_download_{single_file_info['original_md'].replace('.', '_')}"
-                )
-            elif len(generated_files_data) > 1:
-                st.write(f"Preparing a ZIP archive for {len(generated_files_data)} generated H5P files...")
-                zip_buffer = io.BytesIO()
-                with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zf:
-                    for file_info in generated_files_data:
-                        zf.writestr(file_info["name"], file_info["data"])
-                zip_buffer.seek(0)
-                
-                st.download_button(
-                    label=f"💾 Download All {len(generated_files_data)} H5P Files (.zip)",
-                    data=zip_buffer,
-                    file_name="h5p_bulk_generated_booklets.zip",
-                    mime="application/zip",
-                    key="bulk_download_zip_btn"
-                )
-        elif uploaded_md_files : # If files were uploaded but none were generated
-             st.warning("No H5P files were successfully generated from the uploaded Markdown files.")
-                
-    elif st.button("⚙️ Generate H5P from Uploaded Files", key="bulk_generate_btn_no_files") and not uploaded_md_files:
-        st.warning("Please upload at least one Markdown file.")
+                    st.info(f"`{file['md_name']}`: {file['status']}")
+
+            if status["finished"]:
+                download = finished_job_download(job_id)
+                if download is not None and download[2] == 1:
+                    h5p_name, h5p_bytes, _ = download
+                    st.download_button(
+                        label=f"💾 Download {h5p_name}",
+                        data=h5p_bytes,
+                        file_name=h5p_name,
+                        mime="application/zip",
+                        key=f"job_download_{job_id}"
+                    )
+                elif download is not None:
+                    zip_name, zip_bytes, n_results = download
+                    st.download_button(
+                        label=f"💾 Download All {n_results} H5P Files (.zip)",
+                        data=zip_bytes,
+                        file_name=zip_name,
+                        mime="application/zip",
+                        key=f"job_download_zip_{job_id}"
+                    )
+                else:
+                    st.warning("No H5P files were successfully generated from the uploaded Markdown files.")
+
+    if any_running:
+        # Poll until every job of this session is finished
+        st.caption("Jobs are running in the background, refreshing…")
+        time.sleep(JOB_POLL_INTERVAL)
+        st.rerun()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
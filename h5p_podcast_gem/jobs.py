@@ -0,0 +1,291 @@
+"""
+Background bulk jobs for the Streamlit bulk app (bulk.py).
+
+A job is one upload of .md files. Submitting it stores the files in a SQLite
+job table and hands each one to a process pool shared by all sessions of the
+server, so a batch keeps running when the browser disconnects and several
+users can convert in parallel:
+
+    job_id = jobs.submit_job([("a.md", md_text), ...])
+    jobs.job_status(job_id)   # progress and per-file results, poll from the UI
+    jobs.job_zip(job_id)      # all generated packages once the job is finished
+
+Generated packages are written to <jobs dir>/<job id>/, so results stay
+downloadable by job ID after a restart. Files still queued or running when the
+server stopped are queued again when the pool starts, and so are those of a pool
+that broke because a worker died (e.g. killed for running out of memory). A file
+whose worker died MAX_ATTEMPTS times is marked failed instead of being retried.
+
+Set H5P_JOBS_DIR to keep the job table elsewhere and H5P_JOB_WORKERS to size
+the pool (default: number of CPUs). Use one server process per jobs directory.
+"""
+import contextlib
+import functools
+import io
+import logging
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_files (
+    job_id TEXT NOT NULL REFERENCES jobs(id),
+    position INTEGER NOT NULL,
+    md_name TEXT NOT NULL,
+    md_content TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',  -- queued, running, done or failed
+    h5p_name TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    updated REAL,
+    PRIMARY KEY (job_id, position)
+);
+"""
+STATUSES = ("queued", "running", "done", "failed")
+# Runs of one file, so a file that kills its worker (OOM, crash in a native library)
+# cannot break every replacement pool in turn
+MAX_ATTEMPTS = 3
+ATTEMPTS_ERROR = "Generation stopped: the worker died on each of {} attempts"
+
+# Created on first use and kept for the lifetime of the server process. Not a
+# resources.py cache: clearing those must not start a second pool on the same jobs.
+_pool = None
+_pool_lock = threading.Lock()
+# Set to the pool a BrokenProcessPool came from, so worker_pool() replaces it
+_broken_pool = None
+
+
+def jobs_dir() -> Path:
+    return Path(os.environ.get("H5P_JOBS_DIR", SCRIPT_DIR / "jobs"))
+
+
+@contextlib.contextmanager
+def _connect():
+    """Transaction on the job table, committed on success. WAL lets the workers write while the UI reads."""
+    directory = jobs_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    connection = sqlite3.connect(directory / "jobs.sqlite3", timeout=30)
+    try:
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(SCHEMA)
+        columns = {row["name"] for row in connection.execute("PRAGMA table_info(job_files)")}
+        if "attempts" not in columns:
+            # Job tables created before attempts were counted
+            connection.execute("ALTER TABLE job_files ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+        with connection:
+            yield connection
+    finally:
+        connection.close()
+
+
+def _set_file_status(job_id: str, position: int, status: str, h5p_name: str = None, error: str = None):
+    with _connect() as connection:
+        connection.execute(
+            "UPDATE job_files SET status = ?, h5p_name = ?, error = ?, updated = ? WHERE job_id = ? AND position = ?",
+            (status, h5p_name, error, time.time(), job_id, position))
+
+
+# --- Worker ---
+def _write_result(directory: Path, filename: str, data: bytes) -> str:
+    """
+    Writes a generated package under filename, or with a counter appended if another
+    file of the job (possibly in another worker) already took that name.
+    :return: The name written.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    path = Path(filename)
+    candidate, counter = filename, 2
+    while True:
+        try:
+            with open(directory / candidate, 'xb') as f_out:
+                f_out.write(data)
+            return candidate
+        except FileExistsError:
+            candidate = f"{path.stem}_{counter}{path.suffix}"
+            counter += 1
+
+
+def _process_file(job_id: str, position: int):
+    """Generates the package of one job file. Runs in a pool process, records its outcome in the job table."""
+    # Imported here so only the workers load the generator
+    import process_md_folder
+
+    with _connect() as connection:
+        # Counted before running, so a run that kills the worker is counted too
+        connection.execute(
+            "UPDATE job_files SET status = 'running', attempts = attempts + 1, updated = ? WHERE job_id = ? AND position = ?",
+            (time.time(), job_id, position))
+        row = connection.execute("SELECT md_name, md_content, attempts FROM job_files WHERE job_id = ? AND position = ?",
+                                 (job_id, position)).fetchone()
+    if row is None:
+        return
+    if row["attempts"] > MAX_ATTEMPTS:
+        logger.error(f"Job {job_id}: giving up on {row['md_name']} after {MAX_ATTEMPTS} attempts")
+        _set_file_status(job_id, position, "failed", error=ATTEMPTS_ERROR.format(MAX_ATTEMPTS))
+        return
+
+    try:
+        md_intro, md_video, md_questions, md_errors = process_md_folder.parse_md_file_content(row["md_content"])
+        if md_errors:
+            _set_file_status(job_id, position, "failed", error="\n".join(md_errors))
+            return
+
+        h5p_bytes, h5p_filename, error = process_md_folder.do_h5p_generation(None, md_intro, md_video, md_questions)
+        if error:
+            _set_file_status(job_id, position, "failed", error=error)
+            return
+
+        h5p_name = _write_result(jobs_dir() / job_id, h5p_filename, h5p_bytes)
+        _set_file_status(job_id, position, "done", h5p_name=h5p_name)
+    except Exception as e:
+        logger.error(f"Job {job_id}: unexpected error in {row['md_name']}: {e}\n{traceback.format_exc()}")
+        _set_file_status(job_id, position, "failed", error=f"Unexpected error: {e}")
+
+
+# --- Pool ---
+def _on_file_done(pool: ProcessPoolExecutor, future):
+    """Replaces the pool when a file failed because its worker died, which breaks the whole pool."""
+    global _broken_pool
+    if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+        _broken_pool = pool
+        # Not from this callback's thread, which belongs to the broken pool
+        threading.Thread(target=worker_pool, name="h5p-jobs-pool-restart", daemon=True).start()
+
+
+def _submit(pool: ProcessPoolExecutor, job_id: str, position: int):
+    pool.submit(_process_file, job_id, position).add_done_callback(functools.partial(_on_file_done, pool))
+
+
+def worker_pool() -> ProcessPoolExecutor:
+    """
+    Process pool shared by every session of the server process.
+    Spawned rather than forked, since the Streamlit server runs threads.
+    A broken pool is replaced, and the files it left queued or running are queued again
+    unless they used up their MAX_ATTEMPTS.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            # Callbacks of an already replaced pool leave _broken_pool pointing at that one
+            if _pool is not _broken_pool:
+                return _pool
+            logger.warning("A job worker died and broke the pool, starting a new one")
+            _pool.shutdown(wait=False, cancel_futures=True)
+        max_workers = int(os.environ.get("H5P_JOB_WORKERS", 0)) or os.cpu_count()
+        _pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+
+        # Resume what a previous server process or a broken pool left unfinished
+        with _connect() as connection:
+            connection.execute(
+                "UPDATE job_files SET status = 'failed', error = ?, updated = ? WHERE status = 'running' AND attempts >= ?",
+                (ATTEMPTS_ERROR.format(MAX_ATTEMPTS), time.time(), MAX_ATTEMPTS))
+            pending = connection.execute(
+                "SELECT job_id, position FROM job_files WHERE status IN ('queued', 'running') ORDER BY rowid").fetchall()
+            connection.execute("UPDATE job_files SET status = 'queued' WHERE status = 'running'")
+        for job_id, position in pending:
+            _submit(_pool, job_id, position)
+        if pending:
+            logger.info(f"Re-queued {len(pending)} unfinished job file(s)")
+        return _pool
+
+
+def submit_job(files: list) -> str:
+    """
+    Stores a bulk job and queues its files.
+
+    :param files: List of (md file name, md file content) tuples.
+    :return: ID of the new job.
+    """
+    global _broken_pool
+    pool = worker_pool()
+    job_id = uuid.uuid4().hex
+    with _connect() as connection:
+        connection.execute("INSERT INTO jobs (id, created) VALUES (?, ?)", (job_id, time.time()))
+        connection.executemany(
+            "INSERT INTO job_files (job_id, position, md_name, md_content) VALUES (?, ?, ?, ?)",
+            [(job_id, position, md_name, md_content) for position, (md_name, md_content) in enumerate(files)])
+    try:
+        for position in range(len(files)):
+            _submit(pool, job_id, position)
+    except BrokenProcessPool:
+        # The replacement pool queues every pending file again, this job's included
+        _broken_pool = pool
+        worker_pool()
+    logger.info(f"Submitted job {job_id} with {len(files)} file(s)")
+    return job_id
+
+
+# --- Results ---
+def job_status(job_id: str) -> dict | None:
+    """
+    Progress of a job, or None if there is no job with that ID.
+
+    :return: {"id", "created", "total", "finished", "counts": {status: n}, "files": [...]},
+             each file as {"md_name", "status", "h5p_name", "error"} in upload order.
+    """
+    with _connect() as connection:
+        job = connection.execute("SELECT id, created FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if job is None:
+            return None
+        rows = connection.execute(
+            "SELECT md_name, status, h5p_name, error FROM job_files WHERE job_id = ? ORDER BY position",
+            (job_id,)).fetchall()
+
+    files = [dict(row) for row in rows]
+    counts = {status: 0 for status in STATUSES}
+    for file in files:
+        counts[file["status"]] += 1
+    return {
+        "id": job["id"],
+        "created": job["created"],
+        "total": len(files),
+        "finished": counts["queued"] + counts["running"] == 0,
+        "counts": counts,
+        "files": files,
+    }
+
+
+def job_results(job_id: str) -> list:
+    """(h5p file name, bytes) of every package the job generated so far."""
+    status = job_status(job_id)
+    if status is None:
+        return []
+    output_dir = jobs_dir() / job_id
+    results = []
+    for file in status["files"]:
+        if file["status"] == "done":
+            try:
+                results.append((file["h5p_name"], (output_dir / file["h5p_name"]).read_bytes()))
+            except OSError as e:
+                logger.error(f"Job {job_id}: result {file['h5p_name']} is missing: {e}")
+    return results
+
+
+def job_zip(job_id: str, results: list = None) -> bytes | None:
+    """All generated packages of a job in one .zip, or None if it has none. Reuses results of job_results() if given."""
+    if results is None:
+        results = job_results(job_id)
+    if not results:
+        return None
+    zip_buffer = io.BytesIO()
+    with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+        for h5p_name, data in results:
+            zf.writestr(h5p_name, data)
+    return zip_buffer.getvalue()
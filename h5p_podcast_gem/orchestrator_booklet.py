@@ -1,8 +1,16 @@
 import streamlit as st
 import json
+import sys
 from pathlib import Path
+
+# h5p_common lives at the repository root; set up here, once, before anything imports it
+_REPO_ROOT = str(Path(__file__).resolve().parent.parent)
+if _REPO_ROOT not in sys.path:
+    sys.path.append(_REPO_ROOT)
+
 import booklet_generator # Direct import
 import utils_booklet   # Direct import
+from h5p_common import metrics
 
 # Define paths (assuming this script is in the same directory as templates/)
 PROJECT_ROOT = Path(__file__).parent
@@ -16,6 +24,9 @@ H5P_INTERNAL_COVER_IMAGE_PATH = "images/img_1.png"
 H5P_INTERNAL_QS_BG_IMAGE_PATH = "images/img_2.png"
 
 
+# Prometheus metrics, when H5P_METRICS_PORT or H5P_METRICS_TEXTFILE is set (see h5p_common/metrics.py)
+metrics.enable_from_env()
+
 st.set_page_config(page_title="H5P InteractiveBook Generator", page_icon="📚")
 
 def main():
@@ -47,6 +58,14 @@ def main():
             - `{TEMPLATE_ZIP_PATH.name}` is used as the template for the H5P InteractiveBook. It must be placed in the `{TEMPLATES_DIR.name}/` folder.
         """)
 
+    # Opt-in: without a namespace every build gets random subContentIds (see h5p_common/ids.py)
+    id_namespace = st.sidebar.text_input(
+        "Stable ID namespace (optional)",
+        help="Derive subContentIds from this name instead of random UUIDs, so reruns reuse unchanged chapters. "
+             "Use a name unique to this book: books sharing a namespace share their ids, which mixes up "
+             "H5P user state and xAPI tracking."
+    ).strip() or None
+
     youtube_url_input = st.text_input("👉 1. Enter YouTube URL", placeholder="Example: https://www.youtube.com/watch?v=your_video_id")
     
     st.subheader("👉 2. Paste JSON Content (Chapters)")
@@ -123,15 +142,16 @@ def main():
                 final_input_data, 
                 video_id,
                 H5P_INTERNAL_COVER_IMAGE_PATH,
-                H5P_INTERNAL_QS_BG_IMAGE_PATH
+                H5P_INTERNAL_QS_BG_IMAGE_PATH,
+                id_namespace=id_namespace
             )
-            content_json_str = json.dumps(content_dict, ensure_ascii=False, indent=2)
+            content_json = utils_booklet.serialize_json(content_dict)
             # st.json(content_dict) # For debugging
 
             st.write("Generating h5p.json structure...")
             book_overall_title = final_input_data.get("book", {}).get("title", "Generated InteractiveBook")
             h5p_json_dict = booklet_generator.generate_h5p_json_dict(book_overall_title)
-            h5p_json_str = json.dumps(h5p_json_dict, ensure_ascii=False, indent=2)
+            h5p_json = utils_booklet.serialize_json(h5p_json_dict)
             # st.json(h5p_json_dict) # For debugging
 
             images_to_add = [
@@ -155,8 +175,8 @@ def main():
 
             st.write("Creating H5P package...")
             h5p_package_bytes = utils_booklet.create_h5p_package(
-                content_json_str,
-                h5p_json_str,
+                content_json,
+                h5p_json,
                 str(TEMPLATE_ZIP_PATH),
                 images_to_add
             )
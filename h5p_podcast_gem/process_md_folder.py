@@ -1,7 +1,14 @@
 import json
+import sys
 from pathlib import Path
 import re
 import traceback
+
+# h5p_common lives at the repository root; set up here, once, before anything imports it
+_REPO_ROOT = str(Path(__file__).resolve().parent.parent)
+if _REPO_ROOT not in sys.path:
+    sys.path.append(_REPO_ROOT)
+
 import booklet_generator  # Requires booklet_generator.py to be accessible
 import utils_booklet    # Requires utils_booklet.py to be accessible
 
@@ -45,67 +52,71 @@ H5P_INTERNAL_COVER_IMAGE_PATH = "images/img_1.png"
 H5P_INTERNAL_QS_BG_IMAGE_PATH = "images/img_2.png"
 
 
-def parse_md_file_content(md_content: str) -> tuple[str | None, str | None, str | None, str | None]:
+# Block number -> name used in messages; every block holds one JSON object
+RESPONSE_BLOCKS = {1: "Intro", 2: "Video", 3: "Questions"}
+RESPONSE_BLOCK_RE = re.compile(r"## Response Block (\d)\s*```markdown\s*([\s\S]*?)\s*```", re.MULTILINE)
+
+
+def parse_json_block(block_str: str, block_number: int, source: str | None = None, offset: int = 0) -> tuple[dict | None, str | None]:
     """
-    Parses the MD file content to extract the YouTube URL and the three JSON strings.
-    Looks for ```markdown code blocks.
-    Returns (youtube_url, json_intro_str, json_video_str, json_questions_str)
+    Parses the JSON object of one response block.
+    :param source: Text block_str was taken from (e.g. the whole MD file), error positions refer to it.
+    :param offset: Start of block_str within source.
+    Returns (data, error_message); error_message is None on success.
     """
-    youtube_url = None
-    json_intro_str = None
-    json_video_str = None
-    json_questions_str = None
+    block_name = f"{RESPONSE_BLOCKS[block_number]} JSON (Block {block_number})"
+    try:
+        data = json.loads(block_str)
+    except json.JSONDecodeError as e:
+        if source is None:
+            return None, f"JSON format error in {block_name} at line {e.lineno}, column {e.colno}: {e.msg}"
+        position = offset + e.pos
+        line = source.count("\n", 0, position) + 1
+        column = position - source.rfind("\n", 0, position)
+        return None, f"JSON format error in {block_name} at line {line}, column {column} of the file: {e.msg}"
+    if not isinstance(data, dict):
+        return None, f"{block_name} must be a JSON object, got {type(data).__name__}."
+    return data, None
 
-    pattern = re.compile(r"## Response Block (\d)\s*```markdown\s*([\s\S]*?)\s*```", re.MULTILINE)
-    matches = pattern.findall(md_content)
-    
-    parsed_blocks = {int(num_str): data_str for num_str, data_str in matches}
+def parse_md_file_content(md_content: str) -> tuple[dict | None, dict | None, dict | None, list[str]]:
+    """
+    Parses the ```markdown code blocks under the '## Response Block X' headings of an MD file.
+    Returns (intro_data, video_data, questions_data, errors): the parsed JSON objects, None for
+    missing or invalid blocks, and one message per problem with its line and column in the file.
+    """
+    parsed_blocks = {}
+    found_blocks = set()
+    errors = []
+    for match in RESPONSE_BLOCK_RE.finditer(md_content):
+        block_number = int(match.group(1))
+        if block_number not in RESPONSE_BLOCKS:
+            continue
+        found_blocks.add(block_number)
+        data, error = parse_json_block(match.group(2), block_number, md_content, match.start(2))
+        if error:
+            errors.append(error)
+        else:
+            parsed_blocks[block_number] = data
 
-    json_intro_str = parsed_blocks.get(1)
-    json_video_str = parsed_blocks.get(2)
-    json_questions_str = parsed_blocks.get(3)
+    for block_number in sorted(RESPONSE_BLOCKS.keys() - found_blocks):
+        errors.append(f"Missing '## Response Block {block_number}' with a ```markdown code block.")
 
-    if json_intro_str:
-        try:
-            temp_data = json.loads(json_intro_str)
-            youtube_url = temp_data.get("youtubeUrl")
-        except json.JSONDecodeError as e:
-            # This warning will print to the console during CLI execution
-            print(f"Warning: Could not parse JSON from Block 1 in MD (for youtubeUrl extraction): {e}")
-            
-    return youtube_url, json_intro_str, json_video_str, json_questions_str
+    return parsed_blocks.get(1), parsed_blocks.get(2), parsed_blocks.get(3), errors
 
 def do_h5p_generation(
     youtube_url_override: str | None, 
-    json_input_intro_area_str: str | None,
-    json_input_video_area_str: str | None,
-    json_input_questions_area_str: str | None
+    input_data_intro: dict | None,
+    input_data_video: dict | None,
+    input_data_questions: dict | None
 ):
     """
-    Core H5P generation logic.
+    Core H5P generation logic. Takes the parsed JSON objects of the three blocks (see parse_md_file_content).
     Returns a tuple: (h5p_package_bytes, internal_h5p_title_filename, error_message)
     error_message is None on success.
     internal_h5p_title_filename is the filename suggested by H5P content title.
     """
-    if not json_input_intro_area_str or not json_input_video_area_str or not json_input_questions_area_str:
-        return None, None, "One or more JSON content fields are empty or missing from the MD file."
-
-    input_data_intro = None
-    input_data_video = None
-    input_data_questions = None
-    
-    try:
-        input_data_intro = json.loads(json_input_intro_area_str)
-    except json.JSONDecodeError as e:
-        return None, None, f"JSON format error in Intro JSON (Block 1): {e}"
-    try:
-        input_data_video = json.loads(json_input_video_area_str)
-    except json.JSONDecodeError as e:
-        return None, None, f"JSON format error in Video JSON (Block 2): {e}"
-    try:
-        input_data_questions = json.loads(json_input_questions_area_str)
-    except json.JSONDecodeError as e:
-        return None, None, f"JSON format error in Questions JSON (Block 3): {e}"
+    if input_data_intro is None or input_data_video is None or input_data_questions is None:
+        return None, None, "One or more JSON content blocks are empty or missing."
 
     final_input_data = {
         "youtubeUrl": youtube_url_override,
@@ -132,11 +143,11 @@ def do_h5p_generation(
             H5P_INTERNAL_COVER_IMAGE_PATH,
             H5P_INTERNAL_QS_BG_IMAGE_PATH
         )
-        content_json_str = json.dumps(content_dict, ensure_ascii=False, indent=2)
+        content_json = utils_booklet.serialize_json(content_dict)
 
         book_overall_title = final_input_data.get("book", {}).get("title", "Generated InteractiveBook")
         h5p_json_dict = booklet_generator.generate_h5p_json_dict(book_overall_title)
-        h5p_json_str = json.dumps(h5p_json_dict, ensure_ascii=False, indent=2)
+        h5p_json = utils_booklet.serialize_json(h5p_json_dict)
 
         images_to_add = [
             (str(SOURCE_COVER_IMAGE_PATH), H5P_INTERNAL_COVER_IMAGE_PATH),
@@ -155,8 +166,8 @@ def do_h5p_generation(
             return None, None, f"H5P Template ZIP file not found: {TEMPLATE_ZIP_PATH}. It must be placed in the `{TEMPLATES_DIR}` folder."
 
         h5p_package_bytes = utils_booklet.create_h5p_package(
-            content_json_str,
-            h5p_json_str,
+            content_json,
+            h5p_json,
             str(TEMPLATE_ZIP_PATH),
             images_to_add
         )
@@ -215,18 +226,21 @@ def run_batch_processor():
         try:
             md_content_str = md_file_path.read_text(encoding="utf-8")
             
-            md_youtube_url, md_json_intro, md_json_video, md_json_questions = parse_md_file_content(md_content_str)
+            md_intro, md_video, md_questions, md_errors = parse_md_file_content(md_content_str)
 
-            if not md_json_intro or not md_json_video or not md_json_questions:
-                print(f"⚠️ Skipping `{md_file_path.name}`: Could not parse all required JSON blocks (Intro, Video, Questions). Please check MD file structure.")
+            if md_errors:
+                print(f"⚠️ Skipping `{md_file_path.name}`: Could not parse all required JSON blocks (Intro, Video, Questions).")
+                for md_error in md_errors:
+                    print(f"   - {md_error}")
                 print(f"   Ensure the file contains `## Response Block 1`, `## Response Block 2`, and `## Response Block 3` headers, each followed by a valid ```markdown ... ``` code block.")
                 continue
             
+            # The YouTube URL comes from Block 1's 'youtubeUrl' field
             h5p_bytes, internal_h5p_metadata_filename, error_msg = do_h5p_generation(
-                md_youtube_url, 
-                md_json_intro,
-                md_json_video,
-                md_json_questions
+                None, 
+                md_intro,
+                md_video,
+                md_questions
             )
 
             if error_msg: